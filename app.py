@@ -1,433 +1,607 @@
+import importlib
+import os
+
 from dash import Dash, dcc, html
 import dash_bootstrap_components as dbc
+from flask import request
 
-from utils.data_loader import load_data
-from utils.indexMentalHealth import indexMentalHealth
-from utils.constants import illness_labels, illness_cols
+from utils.figure_cache import figure_cache
+from utils.lazy import LazyDataset
+from utils.payload import payload_stats, format_payload_report
+from utils.metrics import callback_metrics, format_metrics
+from utils.profiling import install_request_profiler
+from utils.constants import illness_labels, illness_cols, map_cols, correlation_min_year, correlation_max_year
 
 from callbacks.intro_callbacks import register_intro_callbacks
 from callbacks.comparison_callbacks import register_comparison_callbacks
 from callbacks.correlation_callbacks import register_correlation_callbacks
 
-# Load data
-df = load_data(save_as_file=False)
-df = indexMentalHealth(df)
-
-# Set parameters
-min_year = int(df['year'].min())
-max_year = int(df['year'].max())
-
-correlation_min_year = 2000
-correlation_max_year = 2019
-
-default_code = None
-
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-
-app.layout = dbc.Container([
-
-    # ---------------- Global title & intro ----------------
-    dbc.Row([
-        dbc.Col([
-            html.H1('World Mental Health Analysis', className='text-center mt-3 mb-3 fw-bold'),
-            html.P(
-                """
-                This dashboard explores the global evolution of mental health disorders across countries. 
-                It allows users to visualize disorder prevalence over time,
-                compare countries, and identify correlations with socio-economic indicators such as unemployment, human freedom and alcool consumption.
-                The goal is to provide an intuitive exploration of relationships and patterns between different socio-economic indicators and mental health.
-                """,
-                className='text-center mb-4 fs-5',
-                style={'maxWidth': '900px', 'margin': 'auto'}
-            )
-        ])
-    ]),
-
-
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader(html.H4('Indicators')),
-                dbc.CardBody([
-                html.Div([
-                    html.Ul([
-                        html.Li([
-                            html.B("Freedom Index: "),
-                            "Composite index evaluating political rights, civil liberties, and overall democratic freedom. "
-                            "Higher values represent countries where individuals enjoy more personal and societal freedoms."
-                        ]),
-                        html.Li([
-                            html.B("Alcohol Consumption: "),
-                            "Average annual liters of pure alcohol consumed per adult (15+). "
-                            "This is a health and behavioral indicator often correlated with social patterns and well-being."
-                        ]),
-                        html.Li([
-                            html.B("Gender Inequality Index: "),
-                            "Measures inequality in reproductive health, empowerment, and labor market participation. "
-                            "Higher values indicate greater inequality between men and women."
-                        ]),
-                        html.Li([
-                            html.B("Unemployment Rate: "),
-                            "Represents the percentage of the population that is unemployed but actively seeking employment. "
-                            "Higher values indicate a greater share of the population without work."
-                        ]),
-                        html.Li([
-                            html.B("Global Mental Disorders: "),
-                            "The Global Mental Disorders indicator is a composite index that combines the prevalence of several mental health disorders into a single normalized score. "
-                            "It does not represent a real percentage of the population."
-                        ]),
-                    ], style={"fontSize": "14px"})
-                ], className="mb-4")
-            ])
-        ])
-    ], width=12, lg=10, xl=8),
-    ], justify='center', className='mb-4'),
-
-    # ---------------- Intro (map + bar plots) ----------------
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader(html.H4('Mental Health Disorders by Country')),
-                dbc.CardBody([
-
-                    html.P(
-                        """
-                        This section provides a global overview of mental health disorders. 
-                        Select a disorder and a year to explore 
-                        how prevalence varies across countries, continents, and income groups,
-                        as well as its global evolution over time.
-                        """,
-                        className='text-muted'
-                    ),
-
-                    html.Label('Select Disorder:', className='fw-bold mb-2 mt-2'),
-                    dcc.Dropdown(
-                        id='illness-dropdown',
-                        options=[{'label': illness_labels[col], 'value': col} for col in illness_cols],
-                        value=illness_cols[-1],
-                        clearable=False
-                    ),
-
-                    html.Label('Year:', className='fw-bold mb-2 mt-3'),
-                    dcc.Slider(
-                        id='year-slider',
-                        min=min_year,
-                        max=max_year,
-                        value=max_year,
-                        marks={year: str(year) for year in range(min_year, max_year + 1, 5)},
-                        step=1,
-                        tooltip={'placement': 'bottom', 'always_visible': True},
-                        className='mb-4'
-                    ),
-
-                    # Map
-                    html.H5('Global prevalence map', className='mt-3'),
-                    html.P(
-                        """
-                        The map shows the estimated prevalence of the selected mental health disorder 
-                        in each country for the chosen year. Colors represent prevalence levels from low (dark) to high (light).
-                        """,
-                        className='text-muted small'
-                    ),
-                    dcc.Graph(
-                        id='map-graph',
-                        style={'height': '60vh'},
-                        config={'displayModeBar': False}
-                    ),
-
-                    # Continent vs income bars
-                    dbc.Row([
-
-                        dbc.Col([
-                            html.H6('Average by continent', className='mt-3'),
-                            html.P(
-                                """
-                                This bar chart aggregates countries by continent and displays the 
-                                average prevalence of the selected disorder for the chosen year.
-                                """,
-                                className='text-muted small'
-                            ),
-                            dcc.Graph(
-                                id='continent-bar',
-                                style={'height': '400px'},
-                                config={'displayModeBar': False}
-                            )
-                        ], width=6),
-
-                        dbc.Col([
-                            html.H6('Average by income group', className='mt-3'),
-                            html.P(
-                                """
-                                This bar chart groups countries by income level (e.g. low, middle, high income) 
-                                and shows the average disorder prevalence for each group.
-                                """,
-                                className='text-muted small'
-                            ),
-                            dcc.Graph(
-                                id='income-bar',
-                                style={'height': '400px'},
-                                config={'displayModeBar': False}
-                            )
-                        ], width=6)
-
-                    ], justify='center', className='mb-4'),
-                    dcc.Graph(
-                        id='global-evolution-graph',
-                        style={'height': '500px'},
-                        config={'displayModeBar': False}
-                    )
-                ])
+
+def build_dataset(incremental: bool = False):
+    '''
+    Load the data and build every structure derived from it.
+    With incremental=True, the compiled dataset is updated from the changed source files only (utils.ingest).
+    '''
+    from utils.data_loader import load_data
+    from utils.dataset import Dataset
+    from utils.ingest import ingest_updates
+    from utils.memory import compact_frame
+
+    # Load data (WMH_COMPACT=1 for categorical names and float32 indicators)
+    compact = os.environ.get('WMH_COMPACT') == '1'
+    if incremental:
+        df = ingest_updates()[0]
+        df = compact_frame(df) if compact else df
+    else:
+        df = load_data(save_as_file=False, compact=compact)
+    # WMH_SHARED_ARRAYS=1: numeric arrays in memory-mapped files shared by the workers
+    dataset = Dataset(df, shared=os.environ.get('WMH_SHARED_ARRAYS') == '1')
+    return dataset.preload()
+
+
+def activate(dataset, cleanup: bool = True):
+    '''
+    Point the figure cache to the dataset. With cleanup, the files of other datasets (disk tier of the
+    figure cache, shared arrays) are removed: only when no other process still serves them.
+    '''
+    figure_cache.set_fingerprint(dataset.fingerprint, cleanup=False)
+    figure_cache.load_bundle()
+    if cleanup:
+        remove_stale_files()
+    return dataset
+
+
+def remove_stale_files():
+    '''
+    Remove the figure cache and shared arrays of the datasets other than the current one
+    '''
+    from utils.shared import remove_other_fingerprints
+
+    figure_cache.remove_other_fingerprints()
+    remove_other_fingerprints(figure_cache.fingerprint)
+
+
+def load_dataset():
+    '''
+    Under gunicorn (preload_app) this runs once in the master, and the workers share it after fork.
+    '''
+    return activate(build_dataset())
+
+
+def make_layout(dataset=None):
+    '''
+    Layout of the app. Without a dataset, the country options are empty and the year range is
+    the correlation range: enough for Dash to validate the callbacks without loading the data.
+    '''
+    # Set parameters
+    if dataset is not None:
+        min_year = int(dataset.panel.years.min())
+        max_year = int(dataset.panel.years.max())
+        country_options = dataset.countries.options
+    else:
+        min_year, max_year = correlation_min_year, correlation_max_year
+        country_options = []
+
+    return dbc.Container([
+
+        # ---------------- Global title & intro ----------------
+        dbc.Row([
+            dbc.Col([
+                html.H1('World Mental Health Analysis', className='text-center mt-3 mb-3 fw-bold'),
+                html.P(
+                    """
+                    This dashboard explores the global evolution of mental health disorders across countries. 
+                    It allows users to visualize disorder prevalence over time,
+                    compare countries, and identify correlations with socio-economic indicators such as unemployment, human freedom and alcool consumption.
+                    The goal is to provide an intuitive exploration of relationships and patterns between different socio-economic indicators and mental health.
+                    """,
+                    className='text-center mb-4 fs-5',
+                    style={'maxWidth': '900px', 'margin': 'auto'}
+                )
             ])
-        ], width=12, lg=10, xl=8)
-    ], justify='center', className='mb-4'),
-
-    # ---------------- Country Comparison Graphs ----------------
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader(html.H4('Temporal evolution and comparison')),
-                dbc.CardBody([
-
-                    html.P(
-                        """
-                        This section focus on how mental health indicators evolve over time and differ across countries.
-                        It allows both detailed analysis of a single country and direct comparisons between two countries.
-                        """,
-                        className='text-muted'
-                    ),
-
-                    dbc.Row([
-                        dbc.Col([
-                            html.Label('Select country to analyse evolution:', className='fw-semibold mt-2'),
-                            dcc.Dropdown(
-                                id='select-country-dropdown',
-                                options=[
-                                    {
-                                        'label': str(row['country']),
-                                        'value': str(row['code'])
-                                    }
-                                    for _, row in df[['code', 'country']]
-                                    .dropna(subset=['code', 'country'])
-                                    .drop_duplicates()
-                                    .sort_values(by='country')
-                                    .iterrows()
-                                ],
-                                value=None,
-                                placeholder='Select first country',
-                            )
-                        ], md=6),
-
-                        dbc.Col([
-                            html.Label('(Optional) Compare with another country:', className='fw-semibold mt-2'),
-                            dcc.Dropdown(
-                                id='compare-country-dropdown',
-                                options=[
-                                    {
-                                        'label': str(row['country']),
-                                        'value': str(row['code'])
-                                    }
-                                    for _, row in df[['code', 'country']]
-                                    .dropna(subset=['code', 'country'])
-                                    .drop_duplicates()
-                                    .sort_values(by='country')
-                                    .iterrows()
-                                ],
-                                value=None,
-                                placeholder='Select second country',
-                                disabled=True
-                            )
-                        ], md=6)
-                    ], className='mb-3'),
-
-                    html.Div(
-                        id="analysis-section",
-                        children=[
-                            html.Label('Factor(s):', className='fw-semibold'),
-                            html.P(
-                                """
-                                Select one or several mental health indicators to include in the comparison 
-                                (e.g. anxiety disorders, depressive disorders).
-                                """,
-                                className='text-muted small'
-                            ),
-                            dcc.Dropdown(
-                                id='indicators-multi',
-                                options=[{'label': illness_labels[col], 'value': col} for col in illness_cols],
-                                value=['global_mental_disorders'],
-                                multi=True,
-                                clearable=False
-                            ),
-
-                            html.Hr(),
-
-                            html.H5('Time series for selected country(ies)'),
-                            html.Div(id='graphs-container'),
-
-                            html.Hr(),
-
-                            html.H5('Radar chart for a specific year', className='mt-3'),
-                            html.Ul([
-                            "This radar chart compares the global mental health indicator with the external"
-                             " socio-economic indicators. Its purpose is to highlight the overall profile of"
-                              " countries across multiple dimensions. Values are normalized and do not represent absolute values. ",
+        ]),
+
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader(html.H4('Indicators')),
+                    dbc.CardBody([
+                    html.Div([
+                        html.Ul([
+                            html.Li([
+                                html.B("Freedom Index: "),
+                                "Composite index evaluating political rights, civil liberties, and overall democratic freedom. "
+                                "Higher values represent countries where individuals enjoy more personal and societal freedoms."
                             ]),
-                            dcc.Slider(
-                                id='radar-year-slider',
-                                min=correlation_min_year,
-                                max=correlation_max_year,
-                                value=correlation_max_year,
-                                marks={year: str(year) for year in range(correlation_min_year, correlation_max_year + 1, 5)},
-                                step=1,
-                                tooltip={'placement': 'bottom', 'always_visible': True},
-                                className='mb-4'
-                            ),
-
-                            html.Div(id='radar-graphs-container'),
-
-                            html.Div([
-                                html.H6("Additional explanations :", className="mt-3 mb-2"),
-                                html.Ul([
-                                    "For this graph, all indicators are normalized on a scale from 0 to 1."
-                                    "Higher values indicate a higher level of the measured concept, but the interpretation differs by indicator:",
-                                    html.Li([
-                                        html.B("Freedom Index: "),
-                                        "higher values indicate greater human freedom."
-                                    ]),
-                                    html.Li([
-                                        html.B("Alcool Consumption: "),
-                                        "higher values indicate higher alcohol consumption per person."
-                                    ]),
-                                    html.Li([
-                                        html.B("Gender Inequality: "),
-                                        "higher values indicate greater inequality between genders."
-                                    ]),
-                                    html.Li([
-                                        html.B("Unemployment: "),
-                                        "higher values indicate higher unemployment."
-                                    ]),
-                                    html.Li([
-                                        html.B("Mental Disorder: "),
-                                        "higher values indicate a greater overall mental health burden."
-                                    ]),
-
-                            ], style={"fontSize": "14px"})
+                            html.Li([
+                                html.B("Alcohol Consumption: "),
+                                "Average annual liters of pure alcohol consumed per adult (15+). "
+                                "This is a health and behavioral indicator often correlated with social patterns and well-being."
+                            ]),
+                            html.Li([
+                                html.B("Gender Inequality Index: "),
+                                "Measures inequality in reproductive health, empowerment, and labor market participation. "
+                                "Higher values indicate greater inequality between men and women."
+                            ]),
+                            html.Li([
+                                html.B("Unemployment Rate: "),
+                                "Represents the percentage of the population that is unemployed but actively seeking employment. "
+                                "Higher values indicate a greater share of the population without work."
+                            ]),
+                            html.Li([
+                                html.B("Global Mental Disorders: "),
+                                "The Global Mental Disorders indicator is a composite index that combines the prevalence of several mental health disorders into a single normalized score. "
+                                "It does not represent a real percentage of the population."
+                            ]),
+                        ], style={"fontSize": "14px"})
                     ], className="mb-4")
-                        ],
-                        style={"display": "none"}
-                    ),
-
-                    
                 ])
             ])
-        ], width=12, lg=10, xl=8)
-    ], justify='center'),
-    
-    html.Br(),
-    
-    # ---------------- Correlation Analysis ----------------
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader(html.H4('Global Correlations')),
-                dbc.CardBody([
-
-                    html.P(
-                        """
-                        This section explores relationships between mental health indicators and socio-economic variables. 
-                        Use the year slider to update all correlation plots and the correlation matrix.
-                        """,
-                        className='text-muted'
-                    ),
-                    html.Div([
-                    html.Ul([
-                        html.H6("Explanation about the next graphs:", className="mt-3 mb-2"),
+        ], width=12, lg=10, xl=8),
+        ], justify='center', className='mb-4'),
+
+        # ---------------- Intro (map + bar plots) ----------------
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader(html.H4('Mental Health Disorders by Country')),
+                    dbc.CardBody([
+
                         html.P(
-                        """
-                        The following scatter plots show the relations between 2 factors for each countries.
-                        A simple regression line is displayed to highlight overall trends.
-                        """,
-                        className='text-muted'
-                    ),
-                    ], style={"fontSize": "14px"})
-                ], className="mb-4"),
-
-                    html.Label('Year:', className='fw-bold mb-2 mt-2'),
-                    dcc.Slider(
-                        id='correlation-year-slider',
-                        min=correlation_min_year,
-                        max=correlation_max_year,
-                        value=correlation_max_year,
-                        marks={year: str(year) for year in range(correlation_min_year, correlation_max_year + 1, 5)},
-                        step=1,
-                        tooltip={'placement': 'bottom', 'always_visible': True}
-                    ),
-
-                    html.Hr(),
-
-                    dbc.Row([
-                        dbc.Col([
-                            dcc.Graph(id='corr-graph-1', config={'displayModeBar': False})
-                        ], md=6),
-                        dbc.Col([
-                            dcc.Graph(id='corr-graph-2', config={'displayModeBar': False})
-                        ], md=6)
-                    ]),
-                    dbc.Row([
-                        dbc.Col([
-                            dcc.Graph(id='corr-graph-3', config={'displayModeBar': False})
-                        ], md=6),
-                        dbc.Col([
-                            dcc.Graph(id='corr-graph-4', config={'displayModeBar': False})
-                        ], md=6)
-                    ]),
-                    html.Div([
-                    html.Ul([
-                        html.H6("Explanation about the next correlation graphs:", className="mt-3 mb-2"),
+                            """
+                            This section provides a global overview of mental health disorders. 
+                            Select a disorder and a year to explore 
+                            how prevalence varies across countries, continents, and income groups,
+                            as well as its global evolution over time.
+                            """,
+                            className='text-muted'
+                        ),
+
+                        html.Label('Select Disorder:', className='fw-bold mb-2 mt-2'),
+                        dcc.Dropdown(
+                            id='illness-dropdown',
+                            options=[{'label': illness_labels[col], 'value': col} for col in map_cols],
+                            value='global_mental_disorders',
+                            clearable=False
+                        ),
+
+                        html.Label('Year:', className='fw-bold mb-2 mt-3'),
+                        dcc.Store(id='intro-year-store'),
+                        dcc.Slider(
+                            id='year-slider',
+                            min=min_year,
+                            max=max_year,
+                            value=max_year,
+                            marks={year: str(year) for year in range(min_year, max_year + 1, 5)},
+                            step=1,
+                            tooltip={'placement': 'bottom', 'always_visible': True},
+                            className='mb-4'
+                        ),
+
+                        # Map
+                        html.H5('Global prevalence map', className='mt-3'),
                         html.P(
-                        """
-                        The next two graphs display correlation values between pairs of variables across countries. Coefficients range from -1 to +1:
-                        """,
-                        className='text-muted'
-                    ),
-                    html.Li([
-                                html.B("-1 : "),
-                                "Values nearing -1 indicate a strong inversed correlation."
-                            ]),
-                    html.Li([
-                                html.B("0 : "),
-                                "Values nearing 0 indicate poor correlation."
-                            ]),
-                    html.Li([
-                                html.B("1 : "),
-                                "Values nearing 1 indicate a strong correlation."
-                            ]),
+                            """
+                            The map shows the estimated prevalence of the selected mental health disorder 
+                            in each country for the chosen year. Colors represent prevalence levels from low (dark) to high (light).
+                            The percentile view colors the countries by their rank instead (100 for the most affected).
+                            """,
+                            className='text-muted small'
+                        ),
+                        dcc.RadioItems(
+                            id='map-mode',
+                            options=[
+                                {'label': ' Values', 'value': 'value'},
+                                {'label': ' Percentile rank', 'value': 'percentile'}
+                            ],
+                            value='value',
+                            inline=True,
+                            inputStyle={'marginLeft': '12px'}
+                        ),
+                        dcc.Graph(
+                            id='map-graph',
+                            style={'height': '60vh'},
+                            config={'displayModeBar': False}
+                        ),
+
+                        # Continent vs income bars
+                        dbc.Row([
+
+                            dbc.Col([
+                                html.H6('Average by continent', className='mt-3'),
+                                html.P(
+                                    """
+                                    This bar chart aggregates countries by continent and displays the 
+                                    average prevalence of the selected disorder for the chosen year.
+                                    """,
+                                    className='text-muted small'
+                                ),
+                                dcc.Graph(
+                                    id='continent-bar',
+                                    style={'height': '400px'},
+                                    config={'displayModeBar': False}
+                                )
+                            ], width=6),
+
+                            dbc.Col([
+                                html.H6('Average by income group', className='mt-3'),
+                                html.P(
+                                    """
+                                    This bar chart groups countries by income level (e.g. low, middle, high income) 
+                                    and shows the average disorder prevalence for each group.
+                                    """,
+                                    className='text-muted small'
+                                ),
+                                dcc.Graph(
+                                    id='income-bar',
+                                    style={'height': '400px'},
+                                    config={'displayModeBar': False}
+                                )
+                            ], width=6)
+
+                        ], justify='center', className='mb-4'),
+
+                        # Regions of the human freedom index, aggregated from the countries
+                        html.H6('Average by region', className='mt-3'),
+                        html.P(
+                            """
+                            This bar chart averages the countries of each world region (as defined by the Human Freedom Index)
+                            for the selected disorder and year.
+                            """,
+                            className='text-muted small'
+                        ),
+                        dcc.Graph(
+                            id='region-bar',
+                            style={'height': '400px'},
+                            config={'displayModeBar': False}
+                        ),
+
+                        dcc.Graph(
+                            id='global-evolution-graph',
+                            style={'height': '500px'},
+                            config={'displayModeBar': False}
+                        )
+                    ])
+                ])
+            ], width=12, lg=10, xl=8)
+        ], justify='center', className='mb-4'),
+
+        # ---------------- Country Comparison Graphs ----------------
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader(html.H4('Temporal evolution and comparison')),
+                    dbc.CardBody([
+
+                        html.P(
+                            """
+                            This section focus on how mental health indicators evolve over time and differ across countries.
+                            It allows both detailed analysis of a single country and direct comparisons between two countries.
+                            """,
+                            className='text-muted'
+                        ),
+
+                        dbc.Row([
+                            dbc.Col([
+                                html.Label('Select country to analyse evolution:', className='fw-semibold mt-2'),
+                                dcc.Dropdown(
+                                    id='select-country-dropdown',
+                                    options=country_options,
+                                    value=None,
+                                    placeholder='Select first country',
+                                )
+                            ], md=6),
+
+                            dbc.Col([
+                                html.Label('(Optional) Compare with another country:', className='fw-semibold mt-2'),
+                                dcc.Dropdown(
+                                    id='compare-country-dropdown',
+                                    options=country_options,
+                                    value=None,
+                                    placeholder='Select second country',
+                                    disabled=True
+                                )
+                            ], md=6)
+                        ], className='mb-3'),
+
+                        html.Div(
+                            id="analysis-section",
+                            children=[
+                                html.Label('Factor(s):', className='fw-semibold'),
+                                html.P(
+                                    """
+                                    Select one or several mental health indicators to include in the comparison 
+                                    (e.g. anxiety disorders, depressive disorders).
+                                    """,
+                                    className='text-muted small'
+                                ),
+                                dcc.Dropdown(
+                                    id='indicators-multi',
+                                    options=[{'label': illness_labels[col], 'value': col} for col in illness_cols],
+                                    value=['global_mental_disorders'],
+                                    multi=True,
+                                    clearable=False
+                                ),
+
+                                html.Hr(),
+
+                                html.H5('Time series for selected country(ies)'),
+                                html.Div(id='graphs-container'),
+                                dcc.Store(id='comparison-render-state'),
+
+                                html.Hr(),
+
+                                html.H5('Radar chart for a specific year', className='mt-3'),
+                                html.Ul([
+                                "This radar chart compares the global mental health indicator with the external"
+                                 " socio-economic indicators. Its purpose is to highlight the overall profile of"
+                                  " countries across multiple dimensions. Values are normalized and do not represent absolute values. ",
+                                ]),
+                                dcc.Slider(
+                                    id='radar-year-slider',
+                                    min=correlation_min_year,
+                                    max=correlation_max_year,
+                                    value=correlation_max_year,
+                                    marks={year: str(year) for year in range(correlation_min_year, correlation_max_year + 1, 5)},
+                                    step=1,
+                                    tooltip={'placement': 'bottom', 'always_visible': True},
+                                    className='mb-4'
+                                ),
+
+                                html.Div(id='radar-graphs-container', children=[
+                                    dcc.Graph(id='radar-graph')
+                                ]),
+
+                                html.Div([
+                                    html.H6("Additional explanations :", className="mt-3 mb-2"),
+                                    html.Ul([
+                                        "For this graph, all indicators are normalized on a scale from 0 to 1."
+                                        "Higher values indicate a higher level of the measured concept, but the interpretation differs by indicator:",
+                                        html.Li([
+                                            html.B("Freedom Index: "),
+                                            "higher values indicate greater human freedom."
+                                        ]),
+                                        html.Li([
+                                            html.B("Alcool Consumption: "),
+                                            "higher values indicate higher alcohol consumption per person."
+                                        ]),
+                                        html.Li([
+                                            html.B("Gender Inequality: "),
+                                            "higher values indicate greater inequality between genders."
+                                        ]),
+                                        html.Li([
+                                            html.B("Unemployment: "),
+                                            "higher values indicate higher unemployment."
+                                        ]),
+                                        html.Li([
+                                            html.B("Mental Disorder: "),
+                                            "higher values indicate a greater overall mental health burden."
+                                        ]),
+
+                                ], style={"fontSize": "14px"})
+                        ], className="mb-4")
+                            ],
+                            style={"display": "none"}
+                        ),
 
 
-                    ], style={"fontSize": "14px"})
-                ], className="mb-4"),
-                    dbc.Row([
-                        dbc.Col([
-                            dcc.Graph(id='corr-graph-5', config={'displayModeBar': False})
-                        ], md=12)
-                    ]),
-                    dbc.Row([
-                        dbc.Col([
-                            dcc.Graph(id='corr-matrix', config={'displayModeBar': False})
-                        ], md=12)
                     ])
                 ])
-            ])
-        ], width=12, lg=10, xl=8)
-    ], justify='center', className='mb-4')
+            ], width=12, lg=10, xl=8)
+        ], justify='center'),
 
+        html.Br(),
 
+        # ---------------- Correlation Analysis ----------------
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader(html.H4('Global Correlations')),
+                    dbc.CardBody([
+
+                        html.P(
+                            """
+                            This section explores relationships between mental health indicators and socio-economic variables. 
+                            Use the year slider to update all correlation plots and the correlation matrix.
+                            """,
+                            className='text-muted'
+                        ),
+                        html.Div([
+                        html.Ul([
+                            html.H6("Explanation about the next graphs:", className="mt-3 mb-2"),
+                            html.P(
+                            """
+                            The following scatter plots show the relations between 2 factors for each countries.
+                            A simple regression line is displayed to highlight overall trends.
+                            """,
+                            className='text-muted'
+                        ),
+                        ], style={"fontSize": "14px"})
+                    ], className="mb-4"),
+
+                        html.Label('Year:', className='fw-bold mb-2 mt-2'),
+                        dcc.Slider(
+                            id='correlation-year-slider',
+                            min=correlation_min_year,
+                            max=correlation_max_year,
+                            value=correlation_max_year,
+                            marks={year: str(year) for year in range(correlation_min_year, correlation_max_year + 1, 5)},
+                            step=1,
+                            tooltip={'placement': 'bottom', 'always_visible': True}
+                        ),
+
+                        html.Hr(),
+
+                        dbc.Row([
+                            dbc.Col([
+                                dcc.Graph(id='corr-graph-1', config={'displayModeBar': False})
+                            ], md=6),
+                            dbc.Col([
+                                dcc.Graph(id='corr-graph-2', config={'displayModeBar': False})
+                            ], md=6)
+                        ]),
+                        dbc.Row([
+                            dbc.Col([
+                                dcc.Graph(id='corr-graph-3', config={'displayModeBar': False})
+                            ], md=6),
+                            dbc.Col([
+                                dcc.Graph(id='corr-graph-4', config={'displayModeBar': False})
+                            ], md=6)
+                        ]),
+                        html.Div([
+                        html.Ul([
+                            html.H6("Explanation about the next correlation graphs:", className="mt-3 mb-2"),
+                            html.P(
+                            """
+                            The next two graphs display correlation values between pairs of variables across countries. Coefficients range from -1 to +1:
+                            """,
+                            className='text-muted'
+                        ),
+                        html.Li([
+                                    html.B("-1 : "),
+                                    "Values nearing -1 indicate a strong inversed correlation."
+                                ]),
+                        html.Li([
+                                    html.B("0 : "),
+                                    "Values nearing 0 indicate poor correlation."
+                                ]),
+                        html.Li([
+                                    html.B("1 : "),
+                                    "Values nearing 1 indicate a strong correlation."
+                                ]),
 
-], fluid=True, style={'padding': '20px'})
 
-# Register callbacks function
-register_intro_callbacks(app, df, illness_labels)
-register_comparison_callbacks(app, df, illness_labels)
-register_correlation_callbacks(app, df, correlation_min_year, correlation_max_year)
+                        ], style={"fontSize": "14px"})
+                    ], className="mb-4"),
+                        dbc.Row([
+                            dbc.Col([
+                                dcc.Graph(id='corr-graph-5', config={'displayModeBar': False})
+                            ], md=12)
+                        ]),
+                        dbc.Row([
+                            dbc.Col([
+                                dcc.Graph(id='corr-matrix', config={'displayModeBar': False})
+                            ], md=12)
+                        ])
+                    ])
+                ])
+            ], width=12, lg=10, xl=8)
+        ], justify='center', className='mb-4')
+
+
+
+    ], fluid=True, style={'padding': '20px'})
+
+
+def create_app(dataset) -> Dash:
+    '''
+    Dash app of a dataset (or LazyDataset), with its layout and callbacks.
+    The layout is built on the first request that needs it, once per dataset.
+    '''
+    app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+    layouts = {}
+
+    def serve_layout():
+        if dataset.fingerprint not in layouts:
+            layouts.clear()
+            layouts[dataset.fingerprint] = make_layout(dataset)
+        return layouts[dataset.fingerprint]
+
+    # Component ids for the callback validation, so that Dash does not call serve_layout at startup
+    app.validation_layout = make_layout()
+    app.layout = serve_layout
+
+    @app.server.before_request
+    def pin_dataset():
+        # Loaded before the figure cache computes its keys, which include the dataset fingerprint.
+        # The request uses the same dataset from start to end, even if it is swapped meanwhile.
+        if request.path in ('/_dash-update-component', '/_dash-layout'):
+            figure_cache.pin(dataset.pin().fingerprint)
+
+    @app.server.teardown_request
+    def unpin_dataset(exc=None):
+        dataset.unpin()
+        figure_cache.unpin()
+
+    # Register callbacks function
+    # WMH_CLIENTSIDE_YEAR=1: the intro year slider is handled in the browser
+    register_intro_callbacks(app, dataset, illness_labels, clientside=os.environ.get('WMH_CLIENTSIDE_YEAR') == '1')
+    register_comparison_callbacks(app, dataset, illness_labels)
+    register_correlation_callbacks(app, dataset, correlation_min_year, correlation_max_year)
+
+    @app.server.route('/_payload')
+    def payload_report():
+        '''
+        Serialized bytes sent by every callback output of this process since it started
+        '''
+        return format_payload_report(payload_stats.stats()), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+    @app.server.route('/metrics')
+    def metrics():
+        '''
+        Callback latency, compaction and payload histograms and data load timings, in Prometheus text format
+        '''
+        from utils.data_loader import load_report
+        return format_metrics(callback_metrics, load_report()), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    # WMH_PROFILE_RATE=0.01: profile 1% of the callback requests into cache/profiles
+    install_request_profiler(app.server)
+
+    return app
+
+
+def warm_up():
+    '''
+    Load the data, build the layout and import the plotting modules now instead of on the first requests.
+    Called by the gunicorn master before fork (gunicorn.conf.py), so that every worker starts warm.
+    '''
+    importlib.import_module('plotly.express')
+
+    dataset.load()
+    app.layout()
+
+
+def reload_dataset(cleanup: bool = True):
+    '''
+    Rebuild the dataset from the changed source files and swap it in, return it (None when the data
+    did not change). Requests keep using the previous dataset until the new one and all its structures
+    are built, layout and correlation figures are rebuilt per fingerprint. With cleanup=False the files
+    of the previous dataset are kept for the processes still serving it (see remove_stale_files).
+    '''
+    previous = dataset.load()
+    new = build_dataset(incremental=True)
+    if new.fingerprint == previous.fingerprint:
+        return None
+    dataset.swap(new)
+    activate(new, cleanup=cleanup)
+    app.server.logger.info('Dataset %s replaced by %s', previous.fingerprint, new.fingerprint)
+    return new
+
+
+def start_reloader(on_change=None):
+    '''
+    Watch the source files of data/ when WMH_RELOAD_INTERVAL is set (seconds between checks) and call
+    on_change (reload_dataset by default) when they changed. Under gunicorn it runs in the master only,
+    which rebuilds once and replaces the workers (gunicorn.conf.py).
+    '''
+    from utils.data_loader import SOURCE_FILES
+    from utils.reload import SourceWatcher
+
+    interval = float(os.environ.get('WMH_RELOAD_INTERVAL', '0'))
+    if interval <= 0:
+        return None
+    return SourceWatcher(SOURCE_FILES.values(), on_change or reload_dataset, interval).start()
+
+
+# The data is loaded on first use (or by warm_up)
+dataset = LazyDataset(load_dataset)
+app = create_app(dataset)
+
+# WSGI entry point: gunicorn app:server (settings in gunicorn.conf.py)
+server = app.server
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server, WMH_DEBUG=1 for the debug mode (reloader and dev tools)
+    start_reloader()
+    app.run(debug=os.environ.get('WMH_DEBUG') == '1')
@@ -0,0 +1,57 @@
+// Year slider of the intro section, handled in the browser when the app runs with
+// WMH_CLIENTSIDE_YEAR=1: the store holds the figures of one year and the values of every year.
+// Map locations and names are sent once, each year has its z values aligned on them (null when missing).
+// The bars are colored by rank with the palettes of the store, whatever the number of bars of each year.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    intro: {
+        switch_year: function(store, year) {
+            const no_update = window.dash_clientside.no_update;
+            if (!store || !store.years[String(year)]) {
+                return [no_update, no_update, no_update, no_update, no_update];
+            }
+
+            const values = store.years[String(year)];
+            const [map, continent, income, evolution, region] = store.figures;
+
+            // Copy of a figure with new trace values and optionally a new title
+            const withValues = function(figure, traces, title) {
+                const layout = Object.assign({}, figure.layout);
+                if (title !== undefined) {
+                    layout.title = Object.assign({}, layout.title, {text: title});
+                }
+                return {
+                    data: figure.data.map((trace, i) => Object.assign({}, trace, traces[i])),
+                    layout: layout
+                };
+            };
+
+            const bar = function(figure, group, colors) {
+                return withValues(figure, [{
+                    x: group.x,
+                    y: group.y,
+                    marker: Object.assign({}, figure.data[0].marker, {
+                        color: group.x.map((_, i) => colors[i % colors.length])
+                    })
+                }]);
+            };
+
+            // Countries having a value this year
+            const locations = [], z = [], hovertext = [];
+            values.z.forEach((value, i) => {
+                if (value !== null) {
+                    locations.push(store.map.locations[i]);
+                    z.push(value);
+                    hovertext.push(store.map.hovertext[i]);
+                }
+            });
+
+            return [
+                withValues(map, [{locations: locations, z: z, hovertext: hovertext}], store.title + ' - ' + year),
+                bar(continent, values.continent, store.palettes.continent),
+                bar(income, values.income, store.palettes.income),
+                withValues(evolution, [values.top, values.bottom]),
+                bar(region, values.region, store.palettes.region)
+            ];
+        }
+    }
+});
@@ -0,0 +1,279 @@
+'''
+Benchmark the data loading, the mental health index and every callback without a server.
+
+    python benchmark.py [--repeat N] [--only NAME] [--save] [--baseline benchmark-baseline.json] [--tolerance 0.25]
+    python benchmark.py --startup [--budget SECONDS]
+
+Each case runs with fixed inputs and the figure cache disabled, so that every call does the full work.
+Latencies (median, p90, max) and the peak traced memory of one call are compared with the baseline,
+the exit status is 1 when a case is slower or uses more memory than the baseline allows.
+Run with --save on a reference version to write the baseline, the check fails without one.
+The cases after the first render call the callbacks as if an input had changed, to measure their Patch paths.
+The wall time and peak memory of every stage of the pipeline are printed after the cases (traced run).
+
+--startup measures, in fresh processes, the time from the import of the app to its first
+responses (index page, then layout with the data), and fails when the layout takes more than the budget.
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from utils.constants import illness_labels, index_variants, correlation_min_year, correlation_max_year
+from utils.data_loader import build_data, format_report, load_data, load_report
+from utils.dataset import Dataset
+from utils.figure_cache import figure_cache
+from utils.headless import CallbackRecorder, triggered
+from utils.indexMentalHealth import indexMentalHealth
+
+from callbacks.intro_callbacks import register_intro_callbacks
+from callbacks.comparison_callbacks import register_comparison_callbacks
+from callbacks.correlation_callbacks import register_correlation_callbacks
+
+BASELINE = 'benchmark-baseline.json'
+
+# Seconds from the import of the app to its first layout response (data loaded from the cache)
+STARTUP_BUDGET = 3.0
+
+STARTUP_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.server.test_client()
+assert client.get('/').status_code == 200
+index = time.perf_counter()
+assert client.get('/_dash-layout').status_code == 200
+layout = time.perf_counter()
+print(json.dumps({'import': imported - start, 'index': index - start, 'layout': layout - start}))
+'''
+
+# Fixed inputs of every callback: (callback name, inputs)
+CALLBACK_INPUTS = [
+    ('update_map_and_bar_plot', ('global_mental_disorders', 2019, 'value')),
+    ('update_map_and_bar_plot', ('depression_disorders', 1990, 'value')),
+    ('update_map_and_bar_plot', ('global_mental_disorders', 2019, 'percentile')),
+    ('update_global_evolution', ('global_mental_disorders', 2019)),
+    ('update_global_evolution', ('anxiety_disorders', 2005)),
+    ('update_comparison_graphs', ('FRA', None, ['global_mental_disorders'], None)),
+    ('update_comparison_graphs', ('FRA', 'DEU', ['global_mental_disorders', 'anxiety_disorders', 'depression_disorders'], None)),
+    ('update_radar_graphs', ('FRA', None, correlation_max_year)),
+    ('update_radar_graphs', ('USA', 'JPN', 2010)),
+    ('update_correlation_graphs', (correlation_max_year,)),
+    ('update_correlation_graphs', (correlation_min_year,))
+]
+
+# Inputs of the Patch paths taken after the first render: (callback name, triggering component, inputs)
+PATCH_INPUTS = [
+    ('update_map_and_bar_plot', 'year-slider', ('global_mental_disorders', 2010, 'value')),
+    ('update_map_and_bar_plot', 'map-mode', ('global_mental_disorders', 2010, 'percentile')),
+    ('update_global_evolution', 'year-slider', ('global_mental_disorders', 2010)),
+    ('update_radar_graphs', 'radar-year-slider', ('FRA', 'DEU', 2010)),
+    ('update_comparison_graphs', 'indicators-multi', (
+        'FRA', None, ['global_mental_disorders', 'anxiety_disorders'],
+        {'countries': ['FRA', None], 'indicators': ['global_mental_disorders'], 'complete': True}
+    )),
+    ('update_comparison_graphs', 'compare-country-dropdown', (
+        'FRA', 'DEU', ['global_mental_disorders', 'anxiety_disorders'],
+        {'countries': ['FRA', 'ITA'], 'indicators': ['global_mental_disorders', 'anxiety_disorders'], 'complete': True}
+    ))
+]
+
+
+def measure(func, repeat: int, warmup: int = 1) -> dict:
+    '''
+    Latency distribution of `repeat` calls, then peak traced memory of one more call
+    '''
+    for _ in range(warmup):
+        func()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Traced separately, tracemalloc slows the calls down
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - before
+    if not tracing:
+        tracemalloc.stop()
+
+    times = np.array(times)
+    return {
+        'calls': repeat,
+        'median_ms': float(np.median(times) * 1000),
+        'p90_ms': float(np.percentile(times, 90) * 1000),
+        'max_ms': float(times.max() * 1000),
+        'peak_bytes': int(max(peak, 0))
+    }
+
+
+def benchmark_cases(repeat: int):
+    '''
+    (case name, function, number of calls) of every benchmark, in running order
+    '''
+    # The source files are read once more in the loader cases, keep them short
+    load_repeat = max(1, repeat // 10)
+    yield 'load_data[build]', lambda: load_data(save_as_file=False, use_cache=False), load_repeat
+    yield 'load_data[cached]', lambda: load_data(save_as_file=False), repeat
+
+    df = load_data(save_as_file=False)
+    raw = df.drop(columns=list(index_variants))
+    yield 'indexMentalHealth', lambda: indexMentalHealth(raw), repeat
+
+    yield 'Dataset.preload', lambda: Dataset(df).preload(), load_repeat
+
+    dataset = Dataset(df).preload()
+    figure_cache.set_fingerprint(dataset.fingerprint)
+    # Every call is a miss: no disk tier, no bundle and an empty memory tier
+    figure_cache.directory = None
+    figure_cache.max_entries = 0
+
+    recorder = CallbackRecorder()
+    register_intro_callbacks(recorder, dataset, illness_labels)
+    register_comparison_callbacks(recorder, dataset, illness_labels)
+    register_correlation_callbacks(recorder, dataset, correlation_min_year, correlation_max_year)
+
+    for name, args in CALLBACK_INPUTS:
+        callback = recorder[name]
+        yield f"{name}{list(args)}", lambda callback=callback, args=args: callback(*args), repeat
+
+    for name, component_id, args in PATCH_INPUTS:
+        callback = recorder[name]
+
+        def patch_call(callback=callback, component_id=component_id, args=args):
+            with triggered(component_id):
+                return callback(*args)
+
+        yield f"{name}[patch:{component_id}]{list(args)}", patch_call, repeat
+
+
+def run(repeat: int, only: str = None) -> dict:
+    results = {}
+    for case, func, calls in benchmark_cases(repeat):
+        if only and only not in case:
+            continue
+        results[case] = measure(func, calls)
+        print(format_result(case, results[case]), flush=True)
+    return results
+
+
+def stage_report() -> str:
+    '''
+    Wall time and peak traced memory of every stage of one traced pipeline run
+    '''
+    build_data(trace_memory=True)
+    return format_report(load_report())
+
+
+def measure_startup(runs: int) -> dict:
+    '''
+    Median seconds from the import of the app to the end of its import, first index and first layout responses
+    '''
+    # Build the data cache first, a cold cache is not what the budget is about
+    load_data(save_as_file=False)
+
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output=True, text=True, check=True).stdout
+        timings.append(json.loads(output.strip().splitlines()[-1]))
+    return {step: float(np.median([timing[step] for timing in timings])) for step in ('import', 'index', 'layout')}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    '''
+    Regressions of the results against the baseline: (case, metric, baseline value, value)
+    '''
+    regressions = []
+    for case, result in results.items():
+        reference = baseline.get(case)
+        if reference is None:
+            continue
+        for metric in ('median_ms', 'peak_bytes'):
+            if result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append((case, metric, reference[metric], result[metric]))
+    return regressions
+
+
+def format_result(case: str, result: dict) -> str:
+    return (
+        f"{case:<90} {result['median_ms']:9.2f} ms  p90 {result['p90_ms']:9.2f} ms"
+        f"  max {result['max_ms']:9.2f} ms  peak {result['peak_bytes'] / 2**20:7.2f} MiB"
+    )
+
+
+def environment() -> dict:
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the loader, the index and every callback')
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per case')
+    parser.add_argument('--only', help='only run the cases whose name contains this text')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown or memory growth (0.25 = 25%%)')
+    parser.add_argument('--startup', action='store_true', help='only measure the startup time against --budget')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET, help='seconds allowed to the first layout response')
+    args = parser.parse_args()
+
+    if args.startup:
+        startup = measure_startup(max(1, min(args.repeat, 5)))
+        for step, seconds in startup.items():
+            print(f'{step:<10} {seconds * 1000:9.1f} ms')
+        if startup['layout'] > args.budget:
+            print(f"STARTUP OVER BUDGET: {startup['layout']:.2f} s > {args.budget:.2f} s")
+            return 1
+        print(f"Startup within budget ({startup['layout']:.2f} s <= {args.budget:.2f} s)")
+        return 0
+
+    results = run(args.repeat, args.only)
+    if not args.only or args.only in 'load_data[build]':
+        # Traced after the timed cases, tracemalloc would slow them down
+        print(stage_report())
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        # Nothing to compare with is a failure of the check, not a pass
+        print(f'No baseline at {args.baseline}, run with --save to write one')
+        return 1
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != environment():
+        print('Warning: the baseline was measured in another environment', baseline.get('environment'))
+
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for case, metric, reference, value in regressions:
+        print(f'REGRESSION {case} {metric}: {reference:.2f} -> {value:.2f}')
+    if not regressions:
+        print(f'No regression against {args.baseline} (tolerance {args.tolerance:.0%})')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
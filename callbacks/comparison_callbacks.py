@@ -1,16 +1,18 @@
-from dash import Output, Input, State, dcc, html
-import plotly.express as px
-import pandas as pd
+from dash import Output, Input, State, Patch, dcc
 import plotly.graph_objects as go
 
-from utils.helpers import code_to_name
+from utils.figure_cache import figure_cache
+from utils.payload import compacted
+from utils.helpers import is_first_render, triggered_by, unit_of
 
-def register_comparison_callbacks(app, df, illness_labels):
+def register_comparison_callbacks(app, dataset, illness_labels):
+    # dataset.panel and dataset.countries are read in each call: the data is loaded on first use
 
     @app.callback(
         Output("analysis-section", "style"),
         Input("select-country-dropdown", "value")
     )
+    @compacted('show_analysis_section')
     def show_analysis_section(selected_country):
         if not selected_country:
             return {"display": "none"}
@@ -24,26 +26,14 @@ def register_comparison_callbacks(app, df, illness_labels):
         Input("select-country-dropdown", "value"),
         State("compare-country-dropdown", "value")
     )
+    @compacted('update_second_dropdown')
     def update_second_dropdown(selected_country_1, selected_country_2):
         # If first dropdown has no value: disable second one
         if selected_country_1 is None:
             return [], True, None
 
         # Exclude first dropdown value
-        new_options=[
-            {
-                'label': str(row['country']),
-                'value': str(row['code'])
-            }
-            for _, row in (
-                df[['code', 'country']]
-                .dropna(subset=['code', 'country'])
-                .drop_duplicates()
-                .sort_values(by='country')
-                .iterrows()
-            )
-            if row['code'] != selected_country_1
-        ]
+        new_options = dataset.countries.options_excluding(selected_country_1)
 
         # Reset if necessary
         if selected_country_2 == selected_country_1:
@@ -52,140 +42,170 @@ def register_comparison_callbacks(app, df, illness_labels):
         return new_options, False, selected_country_2
 
 
-    @app.callback(
-        Output('graphs-container', 'children'),
-        Input('select-country-dropdown', 'value'),
-        Input('compare-country-dropdown', 'value'),
-        Input('indicators-multi', 'value')
-    )
-    def update_comparison_graphs(selected_country, compare_country, indicators):
+    def build_figure(selected_country, compare_country, indicator: str):
         '''
-        Update and add comparison graphs
+        Create time serie individually, None when no country has data
         '''
+        # Imported on first use, plotly.express is slow to import
+        import pandas as pd
+        import plotly.express as px
+
+        panel = dataset.panel
+        countries = dataset.countries
+        unit_of_measurement = unit_of(indicator)
+
+        df_1 = panel.country_frame(selected_country, [indicator]) if selected_country else pd.DataFrame()
+        df_2 = panel.country_frame(compare_country, [indicator]) if compare_country else pd.DataFrame()
+
+        df_graph = []
+        if not df_1.empty:
+            df_1['Country'] = countries.name(selected_country)
+            df_graph.append(df_1)
+        if not df_2.empty:
+            df_2['Country'] = countries.name(compare_country)
+            df_graph.append(df_2)
+
+        if not df_graph:
+            return None
 
-        graphs = []
+        plot_df = pd.concat(df_graph, ignore_index=True)
+        ymax = float(plot_df[indicator].max()) if not plot_df.empty else 1.0
 
-        if not selected_country or not indicators:
-            return graphs
-
-        def build_figure(indicator: str, unit_of_measurement:str):
-            '''
-            Create time serie individually
-            '''
-
-            df_1 = df[df['code'] == selected_country].sort_values('year') if selected_country else pd.DataFrame()
-            df_2 = df[df['code'] == compare_country].sort_values('year') if compare_country else pd.DataFrame()
-
-            df_graph = []
-            if not df_1.empty:
-                tmp1 = df_1[['year', indicator]].copy()
-                tmp1['Country'] = code_to_name(df, selected_country)
-                df_graph.append(tmp1)
-            if not df_2.empty:
-                tmp2 = df_2[['year', indicator]].copy()
-                tmp2['Country'] = code_to_name(df, compare_country)
-                df_graph.append(tmp2)
-
-            if not df_graph:
-                return dcc.Graph(figure=px.line(), config={'displayModeBar': False})
-
-            plot_df = pd.concat(df_graph, ignore_index=True)
-            ymax = float(plot_df[indicator].max()) if not plot_df.empty else 1.0
-
-            fig = px.line(
-                plot_df,
-                x='year', y=indicator, color='Country',
-                labels={'year': 'Year', indicator: unit_of_measurement},
-                title=illness_labels[indicator]
-            )
-
-            symbols = ["circle", "square"]
-
-            fig.update_traces(
-                mode='lines+markers',
-                hovertemplate=f'Year=%{{x}}<br>{unit_of_measurement}=%{{y:.3f}}<extra>%{{fullData.name}}</extra>'
-            )
-
-            for i, trace in enumerate(fig.data):
-                trace.marker.symbol = symbols[i % len(symbols)]
-
-            fig.update_yaxes(autorange=False, range=[0, ymax * 1.05])
-            fig.update_layout(
-                plot_bgcolor="white",
-                xaxis=dict(
-                    showgrid=True,
-                    gridcolor="lightgrey"
-                ),
-                yaxis=dict(
-                    showgrid=True,
-                    gridcolor="lightgrey"
-                ),
-                margin=dict(l=40, r=20, t=60, b=40)
-            )
-            return dcc.Graph(figure=fig, style={'height': '320px'}, config={'displayModeBar': False})
+        fig = px.line(
+            plot_df,
+            x='year', y=indicator, color='Country',
+            labels={'year': 'Year', indicator: unit_of_measurement},
+            title=illness_labels[indicator]
+        )
 
-        # Loop on selected indactors and create graph
-        for ind in indicators:
-            unit_of_measurement = '% of Population' if ind != 'global_mental_disorders' else 'global score [0,1]'
-            graphs.append(build_figure(ind, unit_of_measurement))
+        symbols = ["circle", "square"]
+
+        fig.update_traces(
+            mode='lines+markers',
+            hovertemplate=f'Year=%{{x}}<br>{unit_of_measurement}=%{{y:.3f}}<extra>%{{fullData.name}}</extra>'
+        )
+
+        for i, trace in enumerate(fig.data):
+            trace.marker.symbol = symbols[i % len(symbols)]
+
+        fig.update_yaxes(autorange=False, range=[0, ymax * 1.05])
+        fig.update_layout(
+            plot_bgcolor="white",
+            xaxis=dict(
+                showgrid=True,
+                gridcolor="lightgrey"
+            ),
+            yaxis=dict(
+                showgrid=True,
+                gridcolor="lightgrey"
+            ),
+            margin=dict(l=40, r=20, t=60, b=40)
+        )
+        return fig
+
+    def build_graph(fig):
+        if fig is None:
+            import plotly.express as px
+            return dcc.Graph(figure=px.line(), config={'displayModeBar': False})
+        return dcc.Graph(figure=fig, style={'height': '320px'}, config={'displayModeBar': False})
 
-        return graphs
-    
     @app.callback(
-        Output('radar-graphs-container', 'children'),
+        Output('graphs-container', 'children'),
+        Output('comparison-render-state', 'data'),
         Input('select-country-dropdown', 'value'),
         Input('compare-country-dropdown', 'value'),
-        Input('radar-year-slider', 'value')
+        Input('indicators-multi', 'value'),
+        State('comparison-render-state', 'data')
     )
-    def update_radar_graphs(selected_country, compare_country, selected_year):
+    @compacted('update_comparison_graphs')
+    def update_comparison_graphs(selected_country, compare_country, indicators, rendered):
         '''
-        Update radar graphs
-        '''
-
-        if not selected_country:
-            return None
-        
-        df_year = df[df['year'] == selected_year].copy()
-
-        c1_row = df_year[df_year['code'] == selected_country]
-        c1 = c1_row.iloc[0]
-
-        pretty_names = {
-            'unemployment_rate': 'Unemployment rate',
-            'gii': 'Gender Inequality Index',
-            'hf_score': 'Human Freedom Index',
-            'alcohol_consumption': 'Alcohol Consumption',
-            'global_mental_disorders': 'Global Mental Disorders'
-        }
-
-        indicators = list(pretty_names.keys())
-        categories = [pretty_names[i] for i in indicators]
-
-        norm_values = {}
-
-        for ind in indicators:
-            min_val = df_year[ind].min()
-            max_val = df_year[ind].max()
-
-            c1_val = (c1[ind] - min_val) / (max_val - min_val)
+        Update and add comparison graphs.
 
-            norm_values[ind] = {'c1': c1_val}
-
-            if compare_country:
-                c2_row = df_year[df_year['code'] == compare_country]
-                c2 = c2_row.iloc[0]
+        'comparison-render-state' describes the graphs currently in the browser, so that only
+        the added graphs, the removed positions or the new traces are sent when possible.
+        '''
 
-                c2_val = (c2[ind] - min_val) / (max_val - min_val)
+        if not selected_country or not indicators:
+            return [], None
+
+        selected = [selected_country, compare_country]
+        state = {'countries': selected, 'indicators': list(indicators), 'complete': True}
+
+        if rendered is None or is_first_render():
+            return full_render(selected_country, compare_country, indicators, state)
+
+        previous = rendered['indicators']
+
+        if rendered['countries'] == selected:
+            # Indicators added at the end: only the new graphs are sent
+            if indicators[:len(previous)] == previous:
+                figures = [build_figure(selected_country, compare_country, ind) for ind in indicators[len(previous):]]
+                state['complete'] = rendered['complete'] and all(fig is not None for fig in figures)
+                graphs = Patch()
+                graphs.extend([build_graph(fig) for fig in figures])
+                return graphs, state
+
+            # Indicators removed: the other graphs are kept as they are
+            kept = iter(previous)
+            if all(ind in kept for ind in indicators):
+                state['complete'] = rendered['complete']
+                graphs = Patch()
+                for i in reversed([i for i, ind in enumerate(previous) if ind not in indicators]):
+                    del graphs[i]
+                return graphs, state
+
+        elif rendered['indicators'] == state['indicators'] and rendered['complete']:
+            # Other countries: the traces and the y range of every graph are replaced
+            figures = [build_figure(selected_country, compare_country, ind) for ind in indicators]
+            if all(fig is not None for fig in figures):
+                graphs = Patch()
+                for i, fig in enumerate(figures):
+                    graphs[i]['props']['figure']['data'] = fig.to_plotly_json()['data']
+                    graphs[i]['props']['figure']['layout']['yaxis']['range'] = fig.layout.yaxis.range
+                return graphs, state
+
+        return full_render(selected_country, compare_country, indicators, state)
+
+    def full_render(selected_country, compare_country, indicators, state):
+        # Loop on selected indactors and create graph
+        figures = [build_figure(selected_country, compare_country, ind) for ind in indicators]
+        state['complete'] = all(fig is not None for fig in figures)
+        return [build_graph(fig) for fig in figures], state
 
-                norm_values[ind]['c2'] = c2_val
+    def radar_trace(code, selected_year):
+        '''
+        Radii and legend name of a country, from the per-year normalized matrix.
+        A country without data that year gets empty radii and says so in the legend.
+        '''
+        radar = dataset.radar
+        values = radar.row(selected_year, code)
+        name = dataset.countries.name(code)
+        if values is None:
+            return [None] * len(radar.indicators), f'{name} (no data in {selected_year})'
+        return values, name
+
+    pretty_names = {
+        'unemployment_rate': 'Unemployment rate',
+        'gii': 'Gender Inequality Index',
+        'hf_score': 'Human Freedom Index',
+        'alcohol_consumption': 'Alcohol Consumption',
+        'global_mental_disorders': 'Global Mental Disorders'
+    }
+
+    @figure_cache.cached('update_radar_graph')
+    def render_radar_graph(selected_country, compare_country, selected_year):
+        categories = [pretty_names[i] for i in dataset.radar.indicators]
+
+        c1_vals, c1_name = radar_trace(selected_country, selected_year)
 
         fig = go.Figure()
 
         fig.add_trace(go.Scatterpolar(
-            r=[norm_values[i]['c1'] for i in pretty_names.keys()],
+            r=c1_vals,
             theta=categories,
             fill='toself',
-            name=code_to_name(df, selected_country),
+            name=c1_name,
             marker_symbol='circle',
             marker_size=8,
             marker_color='#0072B2',
@@ -193,12 +213,12 @@ def register_comparison_callbacks(app, df, illness_labels):
         ))
 
         if compare_country:
-            c2_row = df_year[df_year['code'] == compare_country].iloc[0]
+            c2_vals, c2_name = radar_trace(compare_country, selected_year)
             fig.add_trace(go.Scatterpolar(
-                r=[norm_values[i]['c2'] for i in pretty_names.keys()],
+                r=c2_vals,
                 theta=categories,
                 fill='toself',
-                name=code_to_name(df, compare_country),
+                name=c2_name,
                 marker_symbol='square',
                 marker_size=8,
                 marker_color='#D55E00',
@@ -227,7 +247,31 @@ def register_comparison_callbacks(app, df, illness_labels):
             title=f'Country Comparison Radar - {selected_year}',
             showlegend=True
         )
+        return fig
 
-        return html.Div([
-            dcc.Graph(figure=fig)
-        ])
\ No newline at end of file
+    @app.callback(
+        Output('radar-graph', 'figure'),
+        Input('select-country-dropdown', 'value'),
+        Input('compare-country-dropdown', 'value'),
+        Input('radar-year-slider', 'value')
+    )
+    @compacted('update_radar_graphs')
+    def update_radar_graphs(selected_country, compare_country, selected_year):
+        '''
+        Update radar graphs.
+        A change of year only sends the new radii and title.
+        '''
+
+        if not selected_country:
+            # The section is hidden without a country
+            return {'data': [], 'layout': {}}
+
+        if is_first_render() or not triggered_by('radar-year-slider'):
+            return render_radar_graph(selected_country, compare_country, selected_year)
+
+        fig = Patch()
+        fig['data'][0]['r'], fig['data'][0]['name'] = radar_trace(selected_country, selected_year)
+        if compare_country:
+            fig['data'][1]['r'], fig['data'][1]['name'] = radar_trace(compare_country, selected_year)
+        fig['layout']['title']['text'] = f'Country Comparison Radar - {selected_year}'
+        return fig
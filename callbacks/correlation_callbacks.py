@@ -1,20 +1,44 @@
 from dash import Output, Input
-import plotly.express as px
-import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
 
-def make_scatter(df, x, y, title, labels):
+from utils.figure_cache import figure_cache
+from utils.payload import compacted
+
+def make_scatter(df, x, y, title, labels, fit=None):
+    '''
+    Scatter plot of two indicators, with the regression line of `fit` (see RegressionCube.fit)
+    '''
+    # Imported on first use, plotly.express is slow to import
+    import plotly.express as px
+
     fig = px.scatter(
         df,
         x=x,
         y=y,
         hover_name='country',
-        trendline='ols',
         labels=labels,
         title=title
     )
 
+    if fit is not None:
+        # Same trace as plotly express trendline='ols', without statsmodels
+        x_line = np.sort(df.loc[df[x].notna() & df[y].notna(), x].to_numpy(dtype=np.float64))
+        fig.add_trace(go.Scatter(
+            x=x_line,
+            y=fit['slope'] * x_line + fit['intercept'],
+            mode='lines',
+            name='',
+            legendgroup='',
+            showlegend=False,
+            marker=dict(color=fig.data[0].marker.color, symbol='circle'),
+            hovertemplate=(
+                '<b>OLS trendline</b><br>%s = %g * %s + %g<br>R<sup>2</sup>=%f<br><br>'
+                % (y, fit['slope'], x, fit['intercept'], fit['r2'])
+                + f'{labels.get(x, x)}=%{{x}}<br>{labels.get(y, y)}=%{{y}} <b>(trend)</b><extra></extra>'
+            )
+        ))
+
     fig.update_traces(
         marker=dict(
             size=8,
@@ -37,7 +61,109 @@ def make_scatter(df, x, y, title, labels):
     return fig
 
 
-def register_correlation_callbacks(app, df, correlation_min_year, correlation_max_year):
+def make_correlation_time_figure(complete_correlations, correlation_min_year, correlation_max_year):
+    '''
+    Correlation coefficients over time, without the selected year marker
+    '''
+    import pandas as pd
+
+    # Calculate correlations for each year in the range (years with more than 2 complete rows)
+    pairs = {
+        'unemployment_rate': 'Global Mental Dis. vs Unemployment rate',
+        'hf_score': 'Global Mental Dis. vs Freedom Index',
+        'alcohol_consumption': 'Global Mental Dis. vs Alcohol cons.',
+        'gii': 'Global Mental Dis. vs Gender Inequality Index'
+    }
+    df_corr_time = pd.DataFrame({
+        name: complete_correlations.series('global_mental_disorders', ind, min_rows=2)
+        for ind, name in pairs.items()
+    })
+    df_corr_time = df_corr_time.loc[correlation_min_year:correlation_max_year].rename_axis('year').reset_index()
+
+    fig5 = go.Figure()
+
+    fig5.add_trace(go.Scatter(
+        x=df_corr_time['year'],
+        y=df_corr_time['Global Mental Dis. vs Unemployment rate'],
+        mode='lines+markers',
+        name='Global Mental Dis. vs Unemployment rate',
+        marker_symbol='circle',
+        marker_size=8,
+        marker_color='#0072B2',
+        line=dict(color='#0072B2')
+    ))
+    fig5.add_trace(go.Scatter(
+        x=df_corr_time['year'],
+        y=df_corr_time['Global Mental Dis. vs Freedom Index'],
+        mode='lines+markers',
+        name='Global Mental Dis. vs Freedom Index',
+        marker_symbol='square',
+        marker_size=8,
+        marker_color='#D55E00',
+        line=dict(color='#D55E00')
+    ))
+    fig5.add_trace(go.Scatter(
+        x=df_corr_time['year'],
+        y=df_corr_time['Global Mental Dis. vs Alcohol cons.'],
+        mode='lines+markers',
+        name='Global Mental Dis. vs Alcohol cons.',
+        marker_symbol='triangle-up',
+        marker_size=8,
+        marker_color='#009E73',
+        line=dict(color='#009E73')
+    ))
+    fig5.add_trace(go.Scatter(
+        x=df_corr_time['year'],
+        y=df_corr_time['Global Mental Dis. vs Gender Inequality Index'],
+        mode='lines+markers',
+        name='Global Mental Dis. vs Gender Inequality Index',
+        marker_symbol='diamond',
+        marker_size=8,
+        marker_color='#CC79A7',
+        line=dict(color='#CC79A7')
+    ))
+
+    fig5.add_hline(
+        y=0,
+        line_dash='dash',
+        line_color='black',
+        opacity=0.3
+    )
+    
+    fig5.update_layout(
+        title='Correlation Coefficients Over Time',
+        height=500,
+        xaxis_title='Year',
+        yaxis_title='Correlation Coefficient',
+        margin=dict(l=10, r=10, t=120, b=10),
+        yaxis=dict(range=[-1, 1]),
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        legend=dict(
+            orientation='h',
+            yanchor='bottom',
+            y=1,
+            xanchor='center',
+            x=0.5
+        )
+    )
+
+    return fig5
+
+
+def register_correlation_callbacks(app, dataset, correlation_min_year, correlation_max_year):
+    # The structures of the dataset are read in each call: the data is loaded on first use
+    corr_time_figures = {}
+
+    def correlation_time_figure():
+        # Built once per dataset, the callback only adds the selected year marker
+        if dataset.fingerprint not in corr_time_figures:
+            corr_time_figures.clear()
+            corr_time_figures[dataset.fingerprint] = make_correlation_time_figure(
+                dataset.complete_correlations, correlation_min_year, correlation_max_year
+            )
+        return corr_time_figures[dataset.fingerprint]
+
     @app.callback(
         [Output('corr-graph-1', 'figure'),
         Output('corr-graph-2', 'figure'),
@@ -47,15 +173,23 @@ def register_correlation_callbacks(app, df, correlation_min_year, correlation_ma
         Output('corr-matrix', 'figure')],
         Input('correlation-year-slider', 'value')
     )
+    @compacted('update_correlation_graphs')
+    @figure_cache.cached('update_correlation_graphs')
     def update_correlation_graphs(selected_year):
         '''
         Update all correlation graphs
         '''
+        import plotly.express as px
+
+        panel = dataset.panel
+        correlations = dataset.correlations
+        regressions = dataset.regressions
 
         # Filter data for selected year and valid range
-        df_corr = df[(df['year'] == selected_year) & 
-                    (df['year'] >= correlation_min_year) & 
-                    (df['year'] <= correlation_max_year)].copy()
+        if correlation_min_year <= selected_year <= correlation_max_year:
+            df_corr = panel.year_frame(selected_year)
+        else:
+            df_corr = panel.year_frame(None)
         
         # Drop rows with missing data
         df_corr = df_corr.dropna(subset=['global_mental_disorders', 'unemployment_rate', 'hf_score'])
@@ -65,6 +199,7 @@ def register_correlation_callbacks(app, df, correlation_min_year, correlation_ma
             df_corr,
             x="global_mental_disorders",
             y="unemployment_rate",
+            fit=regressions.fit(selected_year, "unemployment_rate") if not df_corr.empty else None,
             title=f"Global Mental Dis. vs Unemployment ({selected_year})",
             labels={
                 "unemployment_rate": "Unemployment Rate (%)",
@@ -77,6 +212,7 @@ def register_correlation_callbacks(app, df, correlation_min_year, correlation_ma
             df_corr,
             x="global_mental_disorders",
             y="hf_score",
+            fit=regressions.fit(selected_year, "hf_score") if not df_corr.empty else None,
             title=f"Global Mental Dis. vs Freedom ({selected_year})",
             labels={
                 "hf_score": "Human Freedom Index",
@@ -89,6 +225,7 @@ def register_correlation_callbacks(app, df, correlation_min_year, correlation_ma
             df_corr,
             x="global_mental_disorders",
             y="alcohol_consumption",
+            fit=regressions.fit(selected_year, "alcohol_consumption") if not df_corr.empty else None,
             title=f"Global Mental Dis. vs Alcohol cons. ({selected_year})",
             labels={
                 "alcohol_consumption": "Alcohol consumption (liters)",
@@ -101,6 +238,7 @@ def register_correlation_callbacks(app, df, correlation_min_year, correlation_ma
             df_corr,
             x="global_mental_disorders",
             y="gii",
+            fit=regressions.fit(selected_year, "gii") if not df_corr.empty else None,
             title=f"Global Mental Dis. vs Gender Inequality ({selected_year})",
             labels={
                 "gii": "Gender Inequality Index [0,1]",
@@ -108,99 +246,10 @@ def register_correlation_callbacks(app, df, correlation_min_year, correlation_ma
             }
         )
         
-        # Graph 5: Show correlation coefficients over time
-        # Calculate correlations for each year in the range
-        years = range(correlation_min_year, correlation_max_year + 1)
-        correlations = []
-        
-        for year in years:
-            df_year = df[(df['year'] == year)].dropna(subset=['global_mental_disorders', 'unemployment_rate', 'hf_score', 'alcohol_consumption', 'gii'])
-            if len(df_year) > 2:
-                corr_unemp = df_year[['global_mental_disorders', 'unemployment_rate']].corr().iloc[0, 1]
-                corr_freedom = df_year[['global_mental_disorders', 'hf_score']].corr().iloc[0, 1]
-                corr_alcohol = df_year[['global_mental_disorders', 'alcohol_consumption']].corr().iloc[0, 1]
-                corr_gii = df_year[['global_mental_disorders', 'gii']].corr().iloc[0, 1]
-                correlations.append({
-                    'year': year,
-                    'Global Mental Dis. vs Unemployment rate': corr_unemp,
-                    'Global Mental Dis. vs Freedom Index': corr_freedom,
-                    'Global Mental Dis. vs Alcohol cons.': corr_alcohol,
-                    'Global Mental Dis. vs Gender Inequality Index': corr_gii
-                })
-        
-        df_corr_time = pd.DataFrame(correlations)
-        
-        fig5 = go.Figure()
-
-        fig5.add_trace(go.Scatter(
-            x=df_corr_time['year'],
-            y=df_corr_time['Global Mental Dis. vs Unemployment rate'],
-            mode='lines+markers',
-            name='Global Mental Dis. vs Unemployment rate',
-            marker_symbol='circle',
-            marker_size=8,
-            marker_color='#0072B2',
-            line=dict(color='#0072B2')
-        ))
-        fig5.add_trace(go.Scatter(
-            x=df_corr_time['year'],
-            y=df_corr_time['Global Mental Dis. vs Freedom Index'],
-            mode='lines+markers',
-            name='Global Mental Dis. vs Freedom Index',
-            marker_symbol='square',
-            marker_size=8,
-            marker_color='#D55E00',
-            line=dict(color='#D55E00')
-        ))
-        fig5.add_trace(go.Scatter(
-            x=df_corr_time['year'],
-            y=df_corr_time['Global Mental Dis. vs Alcohol cons.'],
-            mode='lines+markers',
-            name='Global Mental Dis. vs Alcohol cons.',
-            marker_symbol='triangle-up',
-            marker_size=8,
-            marker_color='#009E73',
-            line=dict(color='#009E73')
-        ))
-        fig5.add_trace(go.Scatter(
-            x=df_corr_time['year'],
-            y=df_corr_time['Global Mental Dis. vs Gender Inequality Index'],
-            mode='lines+markers',
-            name='Global Mental Dis. vs Gender Inequality Index',
-            marker_symbol='diamond',
-            marker_size=8,
-            marker_color='#CC79A7',
-            line=dict(color='#CC79A7')
-        ))
-
-        # Add vertical line for selected year
+        # Graph 5: correlation coefficients over time, only the selected year marker changes
+        fig5 = go.Figure(correlation_time_figure())
         fig5.add_vline(x=selected_year, line_dash='dash', line_color='red', opacity=0.6)
 
-        fig5.add_hline(
-            y=0,
-            line_dash='dash',
-            line_color='black',
-            opacity=0.3
-        )
-        
-        fig5.update_layout(
-            title='Correlation Coefficients Over Time',
-            height=500,
-            xaxis_title='Year',
-            yaxis_title='Correlation Coefficient',
-            margin=dict(l=10, r=10, t=120, b=10),
-            yaxis=dict(range=[-1, 1]),
-            paper_bgcolor='white',
-            plot_bgcolor='white',
-            legend=dict(
-                orientation='h',
-                yanchor='bottom',
-                y=1,
-                xanchor='center',
-                x=0.5
-            )
-        )
-
         # Create correlation matrix
         pretty_names = {
             'schizo_disorders': 'Schizophrenia',
@@ -215,14 +264,15 @@ def register_correlation_callbacks(app, df, correlation_min_year, correlation_ma
             'global_mental_disorders': 'Global Mental Dis.'
         }
 
-        corr_matrix = df_corr.copy()
-        corr_matrix = corr_matrix.drop('year', axis=1)
-        corr_matrix = corr_matrix.corr(numeric_only=True)
+        if correlation_min_year <= selected_year <= correlation_max_year:
+            corr_matrix = correlations.matrix(selected_year)
+        else:
+            corr_matrix = correlations.matrix(None)
 
         corr_matrix = corr_matrix.rename(index=pretty_names, columns=pretty_names)
 
         diag_mask = np.eye(corr_matrix.shape[0], dtype=bool)
-        corr_matrix.values[diag_mask] = -999  # special code for diagonal
+        corr_matrix = corr_matrix.mask(diag_mask, -999)  # special code for diagonal
 
         custom_scale = [
             [0.00, 'white'],
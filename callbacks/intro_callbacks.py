@@ -1,177 +1,380 @@
-from dash import Output, Input
-import plotly.express as px
+from dash import Output, Input, ClientsideFunction, Patch
+import numpy as np
 import plotly.graph_objects as go
+from plotly.colors import qualitative
+
+from utils.constants import CONTINENTS, INCOME_GROUPS, ranking_size
+from utils.figure_cache import figure_cache
+from utils.payload import compacted
+from utils.helpers import is_first_render, unit_of
+
+
+# Figure cache name of the values of one indicator, year and map mode
+YEAR_VALUES = 'intro_year_values'
+
+# Colors of the bars of each group chart, by rank
+GROUP_PALETTES = {'continent': qualitative.Pastel, 'income': qualitative.Set2, 'region': qualitative.Set3}
+
+
+def map_label(indicator: str, map_mode: str) -> str:
+    return 'Percentile rank' if map_mode == 'percentile' else unit_of(indicator)
+
+
+def map_hovertemplate(indicator: str, map_mode: str) -> str:
+    value = '%{z:.0f}' if map_mode == 'percentile' else '%{z:.2f}'
+    return '<b>%{hovertext}</b><br>' + map_label(indicator, map_mode) + ': ' + value + '<extra></extra>'
+
+
+def year_values(dataset, indicator: str, year, map_mode: str = 'value') -> dict:
+    '''
+    Compact arrays of every intro figure for one indicator and year.
+    With map_mode='percentile' the map shows the percentile rank of the countries instead of the values.
+    '''
+    panel = dataset.panel
+    ranks = dataset.ranks
+
+    df_cont = panel.named_values(year, CONTINENTS, indicator)
+    df_cont = df_cont.sort_values(by=indicator, ascending=False)
+
+    df_income = panel.named_values(year, INCOME_GROUPS, indicator)
+    df_income = df_income.sort_values(by=indicator, ascending=False)
+    df_income['country'] = df_income['country'].str.replace(' countries', '').str.replace('-income', '').str.title()
+
+    # Regions of the human freedom index, from the aggregation cube
+    regions = dataset.groups.group_values('region', year, indicator, 'mean')
+    region_order = sorted(range(len(regions['group'])), key=lambda g: regions['mean'][g], reverse=True)
+
+    # Most/least affected real countries, from the rank index
+    top = ranks.top(indicator, year, ranking_size)
+    bottom = ranks.bottom(indicator, year, ranking_size)
+
+    if map_mode == 'percentile':
+        percentiles = ranks.percentiles(indicator, year)
+        values_map = {'locations': percentiles['code'], 'z': percentiles['percentile'], 'hovertext': percentiles['country']}
+    else:
+        filtered_df = panel.year_frame(year, [indicator])
+        # Groups without ISO code and missing values are not drawn on the map
+        df_map = filtered_df[
+            filtered_df['code'].notna()
+            & ~filtered_df['code'].str.startswith('OWID_', na=False)
+            & filtered_df[indicator].notna()
+        ]
+        values_map = {'locations': df_map['code'].tolist(), 'z': df_map[indicator].tolist(), 'hovertext': df_map['country'].tolist()}
+
+    return {
+        'map': values_map,
+        'continent': {'x': df_cont['country'].tolist(), 'y': df_cont[indicator].tolist()},
+        'income': {'x': df_income['country'].tolist(), 'y': df_income[indicator].tolist()},
+        'region': {'x': [regions['group'][g] for g in region_order], 'y': [regions['mean'][g] for g in region_order]},
+        'top': {'x': top['code'], 'y': top['value'], 'hovertext': top['country']},
+        'bottom': {'x': bottom['code'], 'y': bottom['value'], 'hovertext': bottom['country']}
+    }
+
+
+def cached_year_values(dataset, indicator: str, year, map_mode: str = 'value') -> dict:
+    '''
+    year_values through the figure cache (memory, prerendered bundle, disk): the patches sent when
+    the slider or dropdown moves reuse them. The returned dict is shared, it must not be modified.
+    '''
+    args = (indicator, year, map_mode)
+    key = figure_cache.key(YEAR_VALUES, args)
+    hit, values = figure_cache.get(YEAR_VALUES, key)
+    if hit:
+        return values
+    return figure_cache.put(key, year_values(dataset, *args))
+
+
+def make_map_figure(values: dict, indicator: str, title: str, map_mode: str = 'value'):
+    # Imported on first use, plotly.express is slow to import
+    import pandas as pd
+    import plotly.express as px
+
+    unit_of_measurement = map_label(indicator, map_mode)
+
+    fig_map = px.choropleth(
+        pd.DataFrame({'code': values['locations'], indicator: values['z'], 'country': values['hovertext']}),
+        locations='code',
+        color=indicator,
+        hover_name='country',
+        color_continuous_scale='Viridis',
+        labels={indicator: unit_of_measurement}
+    )
+
+    fig_map.update_traces(hovertemplate=map_hovertemplate(indicator, map_mode))
+
+    fig_map.update_layout(
+        title=title,
+        geo=dict(showframe=False, showcoastlines=True, projection_type='natural earth')
+    )
+    return fig_map
+
+
+def patch_map_figure(values: dict, indicator: str, title: str, map_mode: str = 'value') -> Patch:
+    '''
+    Changes of a map figure made by make_map_figure for another indicator, year or map mode
+    '''
+    unit_of_measurement = map_label(indicator, map_mode)
+
+    fig_map = Patch()
+    fig_map['data'][0]['locations'] = values['locations']
+    fig_map['data'][0]['z'] = values['z']
+    fig_map['data'][0]['hovertext'] = values['hovertext']
+    fig_map['data'][0]['hovertemplate'] = map_hovertemplate(indicator, map_mode)
+    fig_map['layout']['coloraxis']['colorbar']['title']['text'] = unit_of_measurement
+    fig_map['layout']['title']['text'] = title
+    return fig_map
+
+
+def make_group_bar(values: dict, indicator: str, title: str, colors: list):
+    '''
+    One bar per group, colored by rank
+    '''
+    unit_of_measurement = unit_of(indicator)
+
+    fig = go.Figure(go.Bar(
+        x=values['x'],
+        y=values['y'],
+        marker_color=[colors[i % len(colors)] for i in range(len(values['x']))],
+        texttemplate='%{y:.2f}',
+        textposition='auto',
+        hoverinfo='skip'
+    ))
+
+    fig.update_layout(
+        title=title,
+        showlegend=False,
+        plot_bgcolor='rgba(0,0,0,0)',
+        xaxis_title=None,
+        yaxis_title=unit_of_measurement,
+        margin=dict(l=50, r=20, t=50, b=60)
+    )
+    return fig
+
+
+def patch_group_bar(values: dict, indicator: str, colors: list) -> Patch:
+    fig = Patch()
+    fig['data'][0]['x'] = values['x']
+    fig['data'][0]['y'] = values['y']
+    fig['data'][0]['marker']['color'] = [colors[i % len(colors)] for i in range(len(values['x']))]
+    fig['layout']['yaxis']['title']['text'] = unit_of(indicator)
+    return fig
+
+
+def make_evolution_figure(values: dict, indicator: str, title: str):
+    unit_of_measurement = unit_of(indicator)
+
+    fig = go.Figure()
+
+    # --- Top 10 bars ---
+    fig.add_trace(go.Bar(
+        x=values['top']['x'],
+        y=values['top']['y'],
+        name=f'Top {ranking_size} countries',
+        marker_color='rgba(30, 150, 255, 0.6)',
+        showlegend=True,
+        xaxis='x',
+        yaxis='y',
+        hovertext=values['top']['hovertext'],
+        hovertemplate=f'%{{hovertext}}<br>{unit_of_measurement} = %{{y:.3f}}<extra></extra>'
+    ))
+
+    # --- Bottom 10 bars ---
+    fig.add_trace(go.Bar(
+        x=values['bottom']['x'],
+        y=values['bottom']['y'],
+        name=f'Bottom {ranking_size} countries',
+        marker_color='rgba(255, 160, 30, 0.6)',
+        showlegend=True,
+        xaxis='x',
+        yaxis='y',
+        hovertext=values['bottom']['hovertext'],
+        hovertemplate=f'%{{hovertext}}<br>{unit_of_measurement} = %{{y:.3f}}<extra></extra>'
+    ))
+
+    fig.update_layout(
+        title=title,
+
+        yaxis=dict(
+            title=unit_of_measurement,
+            rangemode='tozero'
+        ),
+
+        xaxis=dict(
+            domain=[0, 1],
+            anchor='y',
+            title='Countries',
+            tickangle=30
+        ),
+
+        xaxis2=dict(
+            domain=[0, 1],
+            anchor='y',
+            overlaying='x',
+            side='top',
+            title='',
+            showticklabels=False,
+            showgrid=False,
+            showline=False,
+        ),
+
+        barmode='group',
+        bargap=0.1,
+        legend=dict(orientation='h', y=-0.25),
+        margin=dict(l=50, r=30, t=60, b=60),
+        plot_bgcolor='rgba(255,255,255,1)'
+    )
+    return fig
+
+
+def patch_evolution_figure(values: dict, indicator: str, title: str) -> Patch:
+    unit_of_measurement = unit_of(indicator)
+
+    fig = Patch()
+    for i, group in enumerate(['top', 'bottom']):
+        fig['data'][i]['x'] = values[group]['x']
+        fig['data'][i]['y'] = values[group]['y']
+        fig['data'][i]['hovertext'] = values[group]['hovertext']
+        fig['data'][i]['hovertemplate'] = f'%{{hovertext}}<br>{unit_of_measurement} = %{{y:.3f}}<extra></extra>'
+    fig['layout']['yaxis']['title']['text'] = unit_of_measurement
+    fig['layout']['title']['text'] = title
+    return fig
+
+
+def make_intro_figures(values: dict, indicator: str, year, illness_labels, map_mode: str = 'value'):
+    '''
+    Map, continent bars, income bars, top/bottom countries and region bars figures
+    '''
+    return (
+        make_map_figure(values['map'], indicator, f'{illness_labels[indicator]} - {year}', map_mode),
+        make_group_bar(values['continent'], indicator, 'Average by continent', GROUP_PALETTES['continent']),
+        make_group_bar(values['income'], indicator, 'Average by countries income group', GROUP_PALETTES['income']),
+        make_evolution_figure(values, indicator, f'{illness_labels[indicator]} - Representation of the most/least affected countries'),
+        make_group_bar(values['region'], indicator, 'Average by region', GROUP_PALETTES['region'])
+    )
+
+
+def register_intro_callbacks(app, dataset, illness_labels, clientside: bool = False):
+    '''
+    With clientside=True, the values of every year are sent once per disorder in
+    'intro-year-store' and the year slider is handled in the browser (assets/intro_year.js)
+    '''
+    # The dataset is read in each call: the data is loaded on first use
+
+    if clientside:
+        @app.callback(
+            Output('intro-year-store', 'data'),
+            [Input('illness-dropdown', 'value'),
+            Input('map-mode', 'value')]
+        )
+        @compacted('update_intro_year_store')
+        @figure_cache.cached('update_intro_year_store')
+        def update_intro_year_store(selected_indicator, map_mode):
+            '''
+            Figures of the last year and compact values of every year for the selected disorder and map mode
+            '''
+            years = [int(year) for year in dataset.panel.years]
+            values = {str(year): year_values(dataset, selected_indicator, year, map_mode) for year in years}
+            figures = make_intro_figures(values[str(years[-1])], selected_indicator, years[-1], illness_labels, map_mode)
+
+            # Map locations and names are sent once, each year only has its z values aligned
+            # on them (None where the country has no value that year), rounded by compacted
+            names = {}
+            for year_value in values.values():
+                names.update(zip(year_value['map']['locations'], year_value['map']['hovertext']))
+            locations = sorted(names)
+            position = {code: i for i, code in enumerate(locations)}
+
+            for year_value in values.values():
+                z = np.full(len(locations), np.nan)
+                map_values = year_value.pop('map')
+                z[[position[code] for code in map_values['locations']]] = map_values['z']
+                year_value['z'] = np.where(np.isnan(z), None, z).tolist()
+
+            return {
+                'title': illness_labels[selected_indicator],
+                'figures': [fig.to_plotly_json() for fig in figures],
+                'palettes': GROUP_PALETTES,
+                'map': {'locations': locations, 'hovertext': [names[code] for code in locations]},
+                'years': values
+            }
+
+        app.clientside_callback(
+            ClientsideFunction(namespace='intro', function_name='switch_year'),
+            [Output('map-graph', 'figure'),
+            Output('continent-bar', 'figure'),
+            Output('income-bar', 'figure'),
+            Output('global-evolution-graph', 'figure'),
+            Output('region-bar', 'figure')],
+            [Input('intro-year-store', 'data'),
+            Input('year-slider', 'value')]
+        )
+        return
+
+    @figure_cache.cached('update_map_and_bar_plot')
+    def render_map_and_bar_plot(selected_indicator, selected_year, map_mode):
+        values = cached_year_values(dataset, selected_indicator, selected_year, map_mode)
+
+        fig_map = make_map_figure(values['map'], selected_indicator, f'{illness_labels[selected_indicator]} - {selected_year}', map_mode)
+        fig_cont = make_group_bar(values['continent'], selected_indicator, 'Average by continent', GROUP_PALETTES['continent'])
+        fig_income = make_group_bar(values['income'], selected_indicator, 'Average by countries income group', GROUP_PALETTES['income'])
+        fig_region = make_group_bar(values['region'], selected_indicator, 'Average by region', GROUP_PALETTES['region'])
+
+        return fig_map, fig_cont, fig_income, fig_region
+
+    @figure_cache.cached('update_global_evolution')
+    def render_global_evolution(selected_illness, selected_year):
+        values = cached_year_values(dataset, selected_illness, selected_year)
+
+        return make_evolution_figure(
+            values,
+            selected_illness,
+            f'{illness_labels[selected_illness]} - Representation of the most/least affected countries'
+        )
 
-def register_intro_callbacks(app, df, illness_labels):
     @app.callback(
         [Output('map-graph', 'figure'),
         Output('continent-bar', 'figure'),
-        Output('income-bar', 'figure')],
+        Output('income-bar', 'figure'),
+        Output('region-bar', 'figure')],
         [Input('illness-dropdown', 'value'),
-        Input('year-slider', 'value')]
+        Input('year-slider', 'value'),
+        Input('map-mode', 'value')]
     )
-    def update_map_and_bar_plot(selected_indicator, selected_year):
+    @compacted('update_map_and_bar_plot')
+    def update_map_and_bar_plot(selected_indicator, selected_year, map_mode):
         '''
-        Update map and continent/income bar plots graphs
+        Update map and continent/income/region bar plots graphs.
+        Full figures on first render, then only the values and titles are sent.
         '''
 
-        filtered_df = df[df['year'] == selected_year].copy()
-
-        unit_of_measurement = '% of Population' if selected_indicator != 'global_mental_disorders' else 'global score [0,1]'
-        
-        # --- Map ---
-        fig_map = px.choropleth(
-            filtered_df,
-            locations='code',
-            color=selected_indicator,
-            hover_name='country',
-            color_continuous_scale='Viridis',
-            labels={selected_indicator: unit_of_measurement}
-        )
-        
-        fig_map.update_traces(
-            hovertemplate='<b>%{hovertext}</b><br>' + unit_of_measurement + ': %{z:.2f}<extra></extra>'
-        )
-        
-        fig_map.update_layout(
-            title=f'{illness_labels[selected_indicator]} - {selected_year}',
-            geo=dict(showframe=False, showcoastlines=True, projection_type='natural earth')
-        )
+        if is_first_render():
+            return render_map_and_bar_plot(selected_indicator, selected_year, map_mode)
 
-        # --- Bar plot (continent) ---
-        df_cont = filtered_df[filtered_df['country'].isin(['Africa', 'Asia', 'Europe', 'America'])]
-        df_cont = df_cont.sort_values(by=selected_indicator, ascending=False)
-
-        fig_cont = px.bar(
-            df_cont,
-            x='country', 
-            y=selected_indicator,
-            color='country',
-            text_auto='.2f',
-            color_discrete_sequence=px.colors.qualitative.Pastel,
-            title='Average by continent',
-            labels={selected_indicator: unit_of_measurement, 'country': ''}
-        )
+        values = cached_year_values(dataset, selected_indicator, selected_year, map_mode)
 
-        fig_cont.update_layout(
-            showlegend=False,
-            plot_bgcolor='rgba(0,0,0,0)',
-            xaxis_title=None,
-            yaxis_title=unit_of_measurement,
-            margin=dict(l=50, r=20, t=50, b=60)
-        )
-        fig_cont.update_traces(hoverinfo='skip', hovertemplate=None)
-
-        # --- Bar plot (income) ---
-        income_labels = ['Low-income countries', 'Lower-middle-income countries',
-                        'Upper-middle-income countries', 'High-income countries']
-        df_income = filtered_df[filtered_df['country'].isin(income_labels)]
-        df_income = df_income.sort_values(by=selected_indicator, ascending=False)
-
-        df_income['country'] = df_income['country'].str.replace(' countries', '').str.replace('-income', '').str.title()
-
-        fig_income = px.bar(
-            df_income,
-            x='country',
-            y=selected_indicator,
-            color='country',
-            text_auto='.2f',
-            color_discrete_sequence=px.colors.qualitative.Set2,
-            title='Average by countries income group',
-            labels={'country': '', selected_indicator: unit_of_measurement}
+        return (
+            patch_map_figure(values['map'], selected_indicator, f'{illness_labels[selected_indicator]} - {selected_year}', map_mode),
+            patch_group_bar(values['continent'], selected_indicator, GROUP_PALETTES['continent']),
+            patch_group_bar(values['income'], selected_indicator, GROUP_PALETTES['income']),
+            patch_group_bar(values['region'], selected_indicator, GROUP_PALETTES['region'])
         )
-        
-        fig_income.update_layout(
-            showlegend=False,
-            plot_bgcolor='rgba(0,0,0,0)',
-            yaxis_title=unit_of_measurement,
-            margin=dict(l=50, r=20, t=50, b=60)
-        )
-        fig_income.update_traces(hoverinfo='skip', hovertemplate=None)
-        
-        return fig_map, fig_cont, fig_income
-    
+
     @app.callback(
         Output('global-evolution-graph', 'figure'),
         [Input('illness-dropdown', 'value'),
         Input('year-slider', 'value')]
     )
+    @compacted('update_global_evolution')
     def update_global_evolution(selected_illness, selected_year):
         '''
         Update intro global evolution (top/bottom countries)
         '''
 
-        unit_of_measurement = '% of Population' if selected_illness != 'global_mental_disorders' else 'global score [0,1]'
-        
-        filtered_df = df[df['year'] == selected_year].copy()
+        if is_first_render():
+            return render_global_evolution(selected_illness, selected_year)
 
-        mean_by_country = (
-            filtered_df.groupby(['code', 'country'])[selected_illness]
-            .first()
-            .sort_values(ascending=False)
+        return patch_evolution_figure(
+            cached_year_values(dataset, selected_illness, selected_year),
+            selected_illness,
+            f'{illness_labels[selected_illness]} - Representation of the most/least affected countries'
         )
-        top10 = mean_by_country.head(10).reset_index()
-        bottom10 = mean_by_country.tail(10).reset_index()
-
-        fig = go.Figure()
-
-        # --- Top 10 bars ---
-        fig.add_trace(go.Bar(
-            x=top10['code'],
-            y=top10[selected_illness],
-            name='Top 10 countries',
-            marker_color='rgba(30, 150, 255, 0.6)',
-            showlegend=True,
-            xaxis='x',
-            yaxis='y',
-            hovertext=top10['country'],
-            hovertemplate=f'%{{hovertext}}<br>{unit_of_measurement} = %{{y:.3f}}<extra></extra>'
-        ))
-
-        # --- Bottom 10 bars ---
-        fig.add_trace(go.Bar(
-            x=bottom10['code'],
-            y=bottom10[selected_illness],
-            name='Bottom 10 countries',
-            marker_color='rgba(255, 160, 30, 0.6)',
-            showlegend=True,
-            xaxis='x',
-            yaxis='y',
-            hovertext=bottom10['country'],
-            hovertemplate=f'%{{hovertext}}<br>{unit_of_measurement} = %{{y:.3f}}<extra></extra>'
-        ))
-
-        fig.update_layout(
-            title=f'{illness_labels[selected_illness]} - Representation of the most/least affected countries',
-
-            yaxis=dict(
-                title=unit_of_measurement,
-                rangemode='tozero'
-            ),
-
-            xaxis=dict(
-                domain=[0, 1],
-                anchor='y',
-                title='Countries',
-                tickangle=30
-            ),
-
-            xaxis2=dict(
-                domain=[0, 1],
-                anchor='y',
-                overlaying='x',
-                side='top',
-                title='',
-                showticklabels=False,
-                showgrid=False,
-                showline=False, 
-            ),
-
-            barmode='group', 
-            bargap=0.1,
-            legend=dict(orientation='h', y=-0.25),
-            margin=dict(l=50, r=30, t=60, b=60),
-            plot_bgcolor='rgba(255,255,255,1)'
-        )
-
-        return fig
\ No newline at end of file
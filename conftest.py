@@ -0,0 +1 @@
+# Makes the packages of the repository (utils, callbacks) importable from tests/
@@ -0,0 +1,95 @@
+'''
+Production server: gunicorn -c gunicorn.conf.py
+
+The app module is imported once in the master (preload_app), then warmed up: the data is loaded
+and indexed and the layout built before the workers are forked, and the workers share these pages
+copy-on-write.
+
+Environment:
+    PORT                port to listen on (8050)
+    WEB_CONCURRENCY     number of worker processes (number of cores)
+    WMH_THREADS         threads per worker (4)
+    WMH_TIMEOUT         seconds before a busy worker is restarted (60)
+    WMH_RELOAD_INTERVAL seconds between checks of the data/ files, 0 to disable (0)
+
+Hot reload: the master watches the source files, rebuilds the dataset once and replaces the workers
+by new ones forked from it (as on SIGHUP: the new workers start before the old ones finish their requests).
+Files of the previous dataset are removed once all the workers serving it have exited.
+
+Metrics: the workers write their callback histograms to cache/metrics, and /metrics serves their
+sum whichever worker answers it.
+'''
+import gc
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+wsgi_app = 'app:server'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8050')}"
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('WMH_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WMH_TIMEOUT', '60'))
+
+preload_app = True
+
+
+def when_ready(server):
+    # The app loads its data lazily, load it here once for all the workers
+    sys.modules['app'].warm_up()
+
+    # Set before fork: every worker writes its histograms there, the totals start from zero
+    metrics = sys.modules['utils.metrics']
+    metrics.callback_metrics.directory = metrics.METRICS_DIR
+    metrics.callback_metrics.reset()
+
+    # Objects loaded by the master are moved out of the collected generations, so that
+    # the garbage collector of the workers does not write to (and copy) their pages
+    gc.collect()
+    gc.freeze()
+
+    # Kept on the arbiter: this file is read again on SIGHUP
+    server.wmh_stale_workers = set()
+    server.wmh_stale_lock = threading.Lock()
+    sys.modules['app'].start_reloader(lambda: _reload(server))
+
+
+def _reload(server):
+    '''
+    Runs in the watcher thread of the master
+    '''
+    if sys.modules['app'].reload_dataset(cleanup=False) is None:
+        return
+    gc.collect()
+    gc.freeze()
+
+    with server.wmh_stale_lock:
+        server.wmh_stale_workers.update(server.WORKERS)
+    # New workers forked from the master get the new dataset, the old ones stop gracefully
+    os.kill(os.getpid(), signal.SIGHUP)
+
+
+def worker_exit(server, worker):
+    # Runs in the worker: the calls since its last flush are kept
+    metrics = sys.modules['utils.metrics'].callback_metrics
+    if metrics.directory is not None:
+        metrics.flush()
+
+
+def child_exit(server, worker):
+    sys.modules['utils.metrics'].callback_metrics.retire(worker.pid)
+
+    stale = getattr(server, 'wmh_stale_workers', None)
+    if stale is None:
+        return
+    with server.wmh_stale_lock:
+        if worker.pid not in stale:
+            return
+        stale.discard(worker.pid)
+        done = not stale
+    if done:
+        # No worker serves the previous dataset anymore
+        sys.modules['app'].remove_stale_files()
@@ -0,0 +1,90 @@
+'''
+Render every figure of the intro and correlation sections ahead of time.
+
+    python prerender.py [--workers N] [--output cache/figures-bundle.jsonl.gz]
+
+The app serves these figures from the bundle and only computes the missing ones.
+The bundle is ignored once the dataset changes, run this script again after a data update.
+'''
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from plotly.io.json import to_json_plotly
+
+from utils.constants import map_cols, illness_labels, correlation_min_year, correlation_max_year
+from utils.data_loader import load_data
+from utils.dataset import Dataset
+from utils.figure_cache import FIGURE_BUNDLE, figure_cache, write_bundle
+from utils.headless import CallbackRecorder
+
+from callbacks.intro_callbacks import YEAR_VALUES, register_intro_callbacks, year_values
+from callbacks.correlation_callbacks import register_correlation_callbacks
+
+# Set in every worker process by _init_worker
+_recorder = None
+_dataset = None
+
+
+def _init_worker():
+    global _recorder, _dataset
+    dataset = _dataset = Dataset(load_data(save_as_file=False))
+    figure_cache.set_fingerprint(dataset.fingerprint)
+    # Figures are only kept in the bundle
+    figure_cache.directory = None
+
+    _recorder = CallbackRecorder()
+    register_intro_callbacks(_recorder, dataset, illness_labels)
+    register_correlation_callbacks(_recorder, dataset, correlation_min_year, correlation_max_year)
+
+
+def _render(task):
+    name, args = task
+    if name == YEAR_VALUES:
+        # Values of the patches sent when the intro slider or dropdown moves
+        return figure_cache.key(name, args), to_json_plotly(year_values(_dataset, *args))
+    return figure_cache.key(name, args), to_json_plotly(_recorder.raw(name)(*args))
+
+
+def input_combinations(years):
+    '''
+    (callback name, inputs) of every figure and intro values to prerender
+    '''
+    tasks = []
+    for indicator in map_cols:
+        for year in years:
+            for map_mode in ('value', 'percentile'):
+                tasks.append(('update_map_and_bar_plot', (indicator, year, map_mode)))
+                tasks.append((YEAR_VALUES, (indicator, year, map_mode)))
+            tasks.append(('update_global_evolution', (indicator, year)))
+    for year in range(correlation_min_year, correlation_max_year + 1):
+        tasks.append(('update_correlation_graphs', (year,)))
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prerender the intro and correlation figures')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default=FIGURE_BUNDLE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+
+    # Build the dataset cache once before the workers load it
+    df = load_data(save_as_file=False)
+    fingerprint = df.attrs['fingerprint']
+    years = range(int(df['year'].min()), int(df['year'].max()) + 1)
+    tasks = input_combinations(years)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        entries = list(pool.map(_render, tasks, chunksize=8))
+
+    write_bundle(entries, fingerprint, args.output)
+
+    size = os.path.getsize(args.output)
+    print(f'{len(entries)} figures written to {args.output} ({size / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
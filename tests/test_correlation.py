@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from utils.correlation import CorrelationCube
+from utils.panel import Panel
+
+
+def make_panel():
+    df = pd.DataFrame({
+        'country': ['France', 'France', 'Germany', 'Germany', 'Italy', 'Italy'],
+        'code': ['FRA', 'FRA', 'DEU', 'DEU', 'ITA', 'ITA'],
+        'year': [2000, 2001, 2000, 2001, 2000, 2001],
+        'a': [1.0, 2.0, 3.0, 4.0, 5.0, 7.0],
+        'b': [2.0, 1.0, 6.0, 3.0, 10.0, 8.0]
+    })
+    return Panel(df)
+
+
+def test_matrix_of_known_year():
+    cube = CorrelationCube(make_panel(), ['a', 'b'])
+    matrix = cube.matrix(2000)
+    assert np.isclose(matrix.loc['a', 'b'], 1.0)
+
+
+def test_matrix_of_year_outside_the_data_is_nan():
+    cube = CorrelationCube(make_panel(), ['a', 'b'])
+    assert cube.year_index(None) is None
+    assert cube.year_index(1995) is None
+    for year in (None, 1995):
+        matrix = cube.matrix(year)
+        assert matrix.shape == (2, 2)
+        assert matrix.isna().all().all()
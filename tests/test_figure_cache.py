@@ -0,0 +1,66 @@
+import os
+
+from utils.figure_cache import FigureCache
+
+
+def make_cache(directory, **kwargs) -> FigureCache:
+    cache = FigureCache(directory=str(directory), **kwargs)
+    cache.set_fingerprint('dataset-1')
+    return cache
+
+
+def render(cache: FigureCache, calls: list):
+    @cache.cached('render')
+    def figure(year):
+        calls.append(year)
+        return {'data': [{'type': 'bar', 'y': [year]}], 'layout': {}}
+    return figure
+
+
+def test_memory_hit(tmp_path):
+    cache, calls = make_cache(tmp_path), []
+    figure = render(cache, calls)
+    assert figure(2019) == figure(2019)
+    assert calls == [2019]
+    assert cache.stats()['render'] == {'memory_hits': 1, 'bundle_hits': 0, 'disk_hits': 0, 'misses': 1}
+
+
+def test_disk_hit_from_another_instance(tmp_path):
+    render(make_cache(tmp_path), [])(2019)
+
+    cache, calls = make_cache(tmp_path), []
+    assert render(cache, calls)(2019)['data'][0]['y'] == [2019]
+    assert calls == []
+    assert cache.last_status() == 'disk'
+
+
+def test_miss_after_the_dataset_changed(tmp_path):
+    cache, calls = make_cache(tmp_path), []
+    figure = render(cache, calls)
+    figure(2019)
+    cache.set_fingerprint('dataset-2')
+    figure(2019)
+    assert calls == [2019, 2019]
+    assert cache.last_status() == 'miss'
+    # The files of the previous dataset are removed
+    assert os.listdir(tmp_path) == ['dataset-2']
+
+
+def entries(directory) -> list:
+    return sorted(name for _, _, names in os.walk(directory) for name in names)
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=2000)
+    keys = [cache.key('render', [year]) for year in range(10)]
+    for year, key in enumerate(keys):
+        cache.put(key, {'values': list(range(100)), 'year': year})
+        # Distinct write times, the oldest are deleted first
+        os.utime(cache._path(key), (year, year))
+
+    cache.enforce_limit()
+    remaining = entries(tmp_path)
+    size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(tmp_path) for name in names)
+    assert 0 < len(remaining) < len(keys)
+    assert size <= 2000
+    assert remaining == sorted(f'{key}.json' for key in keys[-len(remaining):])
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from utils.groups import GroupCube
+from utils.panel import Panel
+
+
+def make_panel(weights: bool = True):
+    df = pd.DataFrame({
+        'country': ['France', 'Germany', 'Italy', 'Japan', 'World', 'Europe'],
+        'code': ['FRA', 'DEU', 'ITA', 'JPN', 'OWID_WRL', None],
+        'year': [2000] * 6,
+        'score': [1.0, 2.0, 6.0, 4.0, 100.0, 100.0],
+        'population': [1.0, 1.0, 2.0, 5.0, 1000.0, 1000.0]
+    })
+    if not weights:
+        df = df.drop(columns=['population'])
+    return Panel(df)
+
+
+# Made-up grouping, the aggregate rows are in it but never counted
+GROUPINGS = {'bloc': {'FRA': 'West', 'DEU': 'West', 'ITA': 'West', 'JPN': 'East', 'OWID_WRL': 'West'}}
+
+
+def test_aggregates_of_the_countries_of_each_group():
+    cube = GroupCube(make_panel(), GROUPINGS, ['mean', 'median', 'min', 'max', 'count'], weight='population')
+    assert cube.names('bloc') == ['East', 'West']
+    expected = {'mean': [4.0, 3.0], 'median': [4.0, 2.0], 'min': [4.0, 1.0], 'max': [4.0, 6.0], 'count': [1, 3]}
+    for stat, values in expected.items():
+        assert cube.group_values('bloc', 2000, 'score', stat) == {'group': ['East', 'West'], stat: values}
+    # (1 + 2 + 2 * 6) / 4
+    assert np.allclose(cube.group_values('bloc', 2000, 'score', 'weighted_mean')['weighted_mean'], [4.0, 3.75])
+
+
+def test_weighted_mean_is_skipped_without_the_weight():
+    cube = GroupCube(make_panel(weights=False), GROUPINGS, ['mean', 'count'], weight='population')
+    assert cube.weight is None
+    assert cube.stats == ['mean', 'count']
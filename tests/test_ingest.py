@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.ingest
+from utils.data_loader import SOURCE_FILES, SOURCE_SCHEMAS, build_data, load_data, read_sources
+from utils.ingest import ingest_updates
+
+COUNTRIES = [('France', 'FRA'), ('Germany', 'DEU'), ('Italy', 'ITA')]
+DISORDERS = SOURCE_SCHEMAS['mental']['usecols'][3:]
+
+
+def mental_rows(years, scale: float = 1.0) -> list:
+    rows = []
+    for j, (country, code) in enumerate(COUNTRIES):
+        for year in years:
+            values = [scale * (1.0 + j + 0.1 * (year - 2000) + 0.5 * d) for d in range(len(DISORDERS))]
+            rows.append([country, code, year] + values)
+    return rows
+
+
+def write_mental(rows: list):
+    pd.DataFrame(rows, columns=SOURCE_SCHEMAS['mental']['usecols']).to_csv(SOURCE_FILES['mental'], index=False)
+
+
+def write_gii(value: float):
+    rows = [[country, code, 2000, value + j] for j, (country, code) in enumerate(COUNTRIES)]
+    pd.DataFrame(rows, columns=SOURCE_SCHEMAS['gii']['usecols']).to_csv(SOURCE_FILES['gii'], index=False)
+
+
+def write_sources():
+    os.makedirs('data')
+    write_mental(mental_rows([2000, 2001]))
+    write_gii(0.2)
+
+    # WDI export: four lines before the header, one column per year
+    unemp = pd.DataFrame(
+        [[country, code, 'Unemployment', 'SL', 5.0 + j, 6.0 + j, 7.0 + j] for j, (country, code) in enumerate(COUNTRIES)],
+        columns=['Country Name', 'Country Code', 'Indicator Name', 'Indicator Code', '2000', '2001', '2002']
+    )
+    with open(SOURCE_FILES['unemp'], 'w', encoding='utf-8') as f:
+        f.write('"Data Source","World Development Indicators",\n\n"Last Updated Date","2025-10-07",\n\n')
+        unemp.to_csv(f, index=False)
+
+    hfi = pd.DataFrame(
+        [[year, code, country, 'Western Europe', 8.0 - j] for j, (country, code) in enumerate(COUNTRIES) for year in (2000, 2001, 2002)],
+        columns=SOURCE_SCHEMAS['hfi']['usecols']
+    )
+    hfi.to_csv(SOURCE_FILES['hfi'], index=False)
+
+    alcool = pd.DataFrame(
+        [[country, code, year, 10.0 + j] for j, (country, code) in enumerate(COUNTRIES) for year in (2000, 2001, 2002)],
+        columns=SOURCE_SCHEMAS['alcool']['usecols']
+    )
+    alcool.to_csv(SOURCE_FILES['alcool'], index=False)
+
+
+@pytest.fixture
+def compiled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_sources()
+    return load_data(save_as_file=False)
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    # Sources parsed by ingest_updates, one list per read_sources call
+    calls = []
+
+    def spy(names=None, **kwargs):
+        calls.append(sorted(names))
+        return read_sources(names, **kwargs)
+
+    monkeypatch.setattr(utils.ingest, 'read_sources', spy)
+    return calls
+
+
+def assert_same_as_rebuild(df: pd.DataFrame):
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), build_data()[list(df.columns)], check_dtype=False)
+
+
+def test_unchanged_sources(compiled):
+    df, report = ingest_updates()
+    assert report['mode'] == 'unchanged'
+    assert report['changed_sources'] == []
+    assert len(df) == len(compiled)
+
+
+def test_changed_indicator_source_is_joined_again(compiled, reads):
+    write_gii(0.5)
+    df, report = ingest_updates()
+    assert reads == [['gii']]
+    assert report['mode'] == 'columns'
+    assert report['changed_sources'] == ['gii']
+    assert report['updated_values'] == {'gii': 3}
+    assert report['appended_rows'] == 0
+    assert_same_as_rebuild(df)
+    assert ingest_updates()[1]['mode'] == 'unchanged'
+
+
+def test_corrected_rows_only_read_the_mental_table(compiled, reads):
+    rows = mental_rows([2000, 2001])
+    rows[1][3] += 0.01
+    write_mental(rows)
+
+    df, report = ingest_updates()
+    assert reads == [['mental']]
+    assert report['mode'] == 'rows'
+    assert report['appended_rows'] == 0
+    assert report['updated_values'] == {'schizo_disorders': 1}
+    assert report['index']['recomputed_rows'] == 1
+    assert_same_as_rebuild(df)
+
+
+def test_new_rows_within_the_bounds(compiled, reads):
+    # 2002 repeats the values of 2001: the bounds do not move
+    rows = mental_rows([2000, 2001])
+    rows += [[country, code, 2002] + row[3:] for (country, code), row in zip(COUNTRIES, mental_rows([2001]))]
+    write_mental(rows)
+
+    df, report = ingest_updates()
+    # The other sources are only read to fill the new rows
+    assert reads == [['mental'], ['alcool', 'gii', 'hfi', 'unemp']]
+    assert report['mode'] == 'rows'
+    assert report['appended_rows'] == 3
+    assert report['appended_years'] == [2002]
+    assert report['removed_rows'] == 0
+    assert report['index']['renormalized'] is False
+    assert report['index']['recomputed_rows'] == 3
+    assert report['index']['shifted_rows'] == 0
+    assert report['index']['largest_shifts'] == []
+    # The new rows have the indicators of the sources that did not change
+    new = df[df['year'] == 2002]
+    assert np.allclose(new['unemployment_rate'], [7.0, 8.0, 9.0])
+    assert np.allclose(new['alcohol_consumption'], [10.0, 11.0, 12.0])
+    assert_same_as_rebuild(df)
+
+
+def test_new_rows_moving_the_bounds(compiled):
+    rows = mental_rows([2000, 2001]) + mental_rows([2002], scale=3.0)
+    write_mental(rows)
+
+    df, report = ingest_updates()
+    index = report['index']
+    assert report['mode'] == 'rows'
+    assert report['appended_rows'] == 3
+    assert index['renormalized'] is True
+    assert index['recomputed_rows'] == len(df)
+    assert set(index['bounds']) == {'depression_disorders', 'anxiety_disorders', 'bipolar_disorders', 'eating_disorders', 'schizo_disorders'}
+    # Every historical row shifts with the new maximum, except the row at the minimum of every disorder
+    assert index['shifted_rows'] == len(compiled) - 1
+    shifts = [abs(shift['after'] - shift['before']) for shift in index['largest_shifts']]
+    assert len(shifts) == index['shifted_rows']
+    assert shifts == sorted(shifts, reverse=True)
+    assert np.isclose(shifts[0], index['max_shift'])
+    assert_same_as_rebuild(df)
@@ -0,0 +1,52 @@
+import os
+
+from utils.metrics import CallbackMetrics, format_metrics
+
+# The background flushes never run during a test, the files are written by flush()
+FLUSH_INTERVAL = 3600
+
+
+def observe_calls(metrics: CallbackMetrics, calls: int):
+    for _ in range(calls):
+        metrics.observe('update_map', 0.02, 0.001, 2048, 'miss')
+
+
+def count_of(text: str) -> str:
+    line = next(line for line in text.splitlines() if line.startswith('wmh_callback_duration_seconds_count'))
+    return line.rsplit(' ', 1)[1]
+
+
+def as_other_worker(directory, pid: int):
+    # Files of another worker: the series written by this process, renamed to another pid
+    os.replace(os.path.join(directory, f'{os.getpid()}.json'), os.path.join(directory, f'{pid}.json'))
+
+
+def test_workers_are_summed_without_pid_label(tmp_path):
+    other = CallbackMetrics(str(tmp_path), flush_interval=FLUSH_INTERVAL)
+    observe_calls(other, 3)
+    other.flush()
+    as_other_worker(tmp_path, 1)
+
+    metrics = CallbackMetrics(str(tmp_path), flush_interval=FLUSH_INTERVAL)
+    observe_calls(metrics, 2)
+    text = format_metrics(metrics, [{'stage': 'read', 'seconds': 0.1}])
+    assert count_of(text) == '5'
+    assert 'worker=' not in text
+    assert 'wmh_load_stage_seconds{stage="read"} 0.1' in text
+
+
+def test_retired_workers_are_still_counted(tmp_path):
+    for pid, calls in ((1, 3), (2, 4)):
+        other = CallbackMetrics(str(tmp_path), flush_interval=FLUSH_INTERVAL)
+        observe_calls(other, calls)
+        other.flush()
+        as_other_worker(tmp_path, pid)
+
+    metrics = CallbackMetrics(str(tmp_path), flush_interval=FLUSH_INTERVAL)
+    metrics.retire(1)
+    metrics.retire(2)
+    assert sorted(os.listdir(tmp_path)) == ['retired.json']
+    assert count_of(format_metrics(metrics, [])) == '7'
+
+    metrics.reset()
+    assert os.listdir(tmp_path) == []
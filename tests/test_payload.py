@@ -0,0 +1,54 @@
+import base64
+
+import numpy as np
+import plotly.graph_objects as go
+from dash import Patch
+
+from utils.payload import compact_output
+
+
+def decode(typed: dict) -> list:
+    return np.frombuffer(base64.b64decode(typed['bdata']), dtype=typed['dtype']).tolist()
+
+
+def test_figure_values_are_rounded_and_integers_typed():
+    fig = go.Figure(go.Bar(x=[1990, 2000, 2019], y=[0.123456, 12.345678, None]))
+    trace = compact_output(fig)['data'][0]
+    assert trace['y'] == [0.1235, 12.346, None]
+    assert trace['x']['dtype'] == 'i2'
+    assert decode(trace['x']) == [1990, 2000, 2019]
+
+
+def test_patch_values_are_compacted():
+    patch = Patch()
+    patch['data'][0]['z'] = [0.000123456, 1.23456]
+    patch['data'][0]['x'] = [1, 2, 3]
+    patch['layout']['title']['text'] = 'Title'
+    operations = compact_output(patch)['operations']
+    values = {tuple(operation['location']): operation['params']['value'] for operation in operations}
+    assert values[('data', 0, 'z')] == [0.0001235, 1.235]
+    assert decode(values[('data', 0, 'x')]) == [1, 2, 3]
+    assert values[('layout', 'title', 'text')] == 'Title'
+
+
+def test_store_data_is_rounded_without_typed_arrays():
+    store = {
+        'title': 'Depressive Disorders',
+        'figures': [go.Figure(go.Bar(x=['a', 'b'], y=[1, 2])).to_plotly_json()],
+        'years': {
+            '2019': {
+                'continent': {'x': ['Africa', 'Asia'], 'y': [4.46213, 3.19587]},
+                'z': [4.94512, None, 2.0],
+                'counts': [3, 12]
+            }
+        }
+    }
+    compact = compact_output(store)
+    year = compact['years']['2019']
+    assert compact['title'] == 'Depressive Disorders'
+    assert year['continent'] == {'x': ['Africa', 'Asia'], 'y': [4.462, 3.196]}
+    assert year['z'] == [4.945, None, 2.0]
+    assert year['counts'] == [3, 12]
+    assert all(isinstance(count, int) for count in year['counts'])
+    # Figures in the store are still compacted as figures
+    assert compact['figures'][0]['data'][0]['y']['dtype'] == 'i1'
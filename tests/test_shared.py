@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+
+from utils.shared import ArrayStore
+
+
+def test_share_returns_a_read_only_view(tmp_path):
+    store = ArrayStore('fingerprint', str(tmp_path))
+    view = store.share('panel.values', np.arange(6.0).reshape(2, 3))
+    assert np.array_equal(view, np.arange(6.0).reshape(2, 3))
+    assert not view.flags.writeable
+    assert store.names() == ['panel.values']
+
+
+def test_array_rebuilt_from_the_same_data_is_not_stale(tmp_path):
+    # Same fingerprint and shape, other content (e.g. another configuration of the code)
+    ArrayStore('fingerprint', str(tmp_path)).share('radar.values', np.zeros(4))
+    view = ArrayStore('fingerprint', str(tmp_path)).share('radar.values', np.ones(4))
+    assert np.array_equal(view, np.ones(4))
+
+
+def test_files_of_older_contents_are_removed(tmp_path):
+    ArrayStore('fingerprint', str(tmp_path)).share('radar.values', np.zeros(4))
+    ArrayStore('fingerprint', str(tmp_path)).share('radar.ranks', np.zeros(4))
+    ArrayStore('fingerprint', str(tmp_path)).share('radar.values', np.ones(4))
+    names = sorted(os.listdir(tmp_path / 'fingerprint'))
+    assert [name.split('.')[1] for name in names] == ['ranks', 'values']
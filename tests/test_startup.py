@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_app_does_not_load_pandas_or_plotly_express():
+    # A fresh interpreter: other tests may already have imported pandas
+    script = (
+        'import sys\n'
+        'import app\n'
+        "print(sorted(name for name in ('pandas', 'plotly.express') if name in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = 'cache'
+CACHE_FILE = 'mental_health_merged.npz'
+
+# Bump when the output of load_data changes, so that old artifacts are rebuilt
+CACHE_VERSION = 5
+
+
+def file_fingerprint(path: str, previous: dict = None) -> dict:
+    '''
+    Size, mtime and content hash of a source file.
+    The hash is reused from `previous` when size and mtime did not change.
+    '''
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    if previous and previous.get('size') == fingerprint['size'] and previous.get('mtime') == fingerprint['mtime']:
+        fingerprint['sha1'] = previous['sha1']
+        return fingerprint
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    fingerprint['sha1'] = sha1.hexdigest()
+    return fingerprint
+
+
+def sources_fingerprint(paths, previous: dict = None) -> dict:
+    '''
+    Fingerprint of every source file, keyed by path
+    '''
+    previous = previous or {}
+    return {path: file_fingerprint(path, previous.get(path)) for path in paths}
+
+
+def dataset_key(fingerprints: dict) -> str:
+    '''
+    Short identifier of a dataset built from the given sources (content only, mtime is ignored)
+    '''
+    content = {path: fp['sha1'] for path, fp in sorted(fingerprints.items())}
+    payload = json.dumps({'version': CACHE_VERSION, 'sources': content}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def _read_manifest(npz) -> dict:
+    return json.loads(str(npz['__manifest__']))
+
+
+def save_frame(df: pd.DataFrame, fingerprints: dict, path: str = None):
+    '''
+    Write the frame as a columnar .npz artifact together with the source fingerprints
+    and the country groupings of attrs['groupings']
+    '''
+    path = path or os.path.join(CACHE_DIR, CACHE_FILE)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    arrays = {}
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values):
+            arrays[col] = values.to_numpy()
+            columns.append({'name': col, 'kind': 'numeric'})
+        else:
+            # Fixed-width unicode keeps the artifact pickle free, missing values are stored as a mask
+            mask = values.isna().to_numpy()
+            arrays[col] = values.fillna('').astype(str).to_numpy(dtype=str)
+            arrays[f'__mask__{col}'] = mask
+            columns.append({'name': col, 'kind': 'string'})
+
+    manifest = {
+        'version': CACHE_VERSION,
+        'key': dataset_key(fingerprints),
+        'sources': fingerprints,
+        'columns': columns,
+        'groupings': df.attrs.get('groupings', {})
+    }
+    arrays['__manifest__'] = np.array(json.dumps(manifest))
+
+    # Write then rename, so a concurrent reader never sees a partial file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_frame(paths, path: str = None):
+    '''
+    Return (frame, fingerprints) if the artifact matches the current sources, (None, fingerprints) otherwise
+    '''
+    path = path or os.path.join(CACHE_DIR, CACHE_FILE)
+
+    if not os.path.exists(path):
+        return None, sources_fingerprint(paths)
+
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            manifest = _read_manifest(npz)
+            fingerprints = sources_fingerprint(paths, manifest.get('sources'))
+            if manifest.get('version') != CACHE_VERSION or manifest.get('key') != dataset_key(fingerprints):
+                return None, fingerprints
+            df = _read_columns(npz, manifest)
+    except (OSError, ValueError, KeyError):
+        # Corrupted or incompatible artifact: rebuild it
+        return None, sources_fingerprint(paths)
+
+    return df, fingerprints
+
+
+def read_frame(path: str = None):
+    '''
+    Return (frame, source fingerprints it was built from) even if the sources changed since,
+    (None, None) when there is no usable artifact
+    '''
+    path = path or os.path.join(CACHE_DIR, CACHE_FILE)
+
+    if not os.path.exists(path):
+        return None, None
+
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            manifest = _read_manifest(npz)
+            if manifest.get('version') != CACHE_VERSION:
+                return None, None
+            return _read_columns(npz, manifest), manifest['sources']
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+def _read_columns(npz, manifest: dict) -> pd.DataFrame:
+    data = {}
+    for col in manifest['columns']:
+        name = col['name']
+        values = npz[name]
+        if col['kind'] == 'string':
+            values = pd.Series(values).where(~npz[f'__mask__{name}'])
+        data[name] = values
+
+    df = pd.DataFrame(data)
+    df.attrs['fingerprint'] = manifest['key']
+    df.attrs['groupings'] = manifest['groupings']
+    return df
@@ -1,3 +1,13 @@
+# Aggregate rows of mental-illness.csv shown in the continent and income bars
+CONTINENTS = ['Africa', 'America', 'Asia', 'Europe']
+
+INCOME_GROUPS = [
+    'Low-income countries',
+    'Lower-middle-income countries',
+    'Upper-middle-income countries',
+    'High-income countries'
+]
+
 # Only mental disorders for the main map
 illness_cols = [
     'schizo_disorders',
@@ -15,4 +25,88 @@ illness_labels = {
     illness_cols[3]: 'Bipolar Disorders',
     illness_cols[4]: 'Eating Disorders',
     illness_cols[5]: 'Global Mental Disorders'
-}
\ No newline at end of file
+}
+
+# Variants of the global mental disorders index, one column each (see utils/indexMentalHealth.py):
+# normalization bounds over all years ('global') or per year ('year'), min-max or z-score scaling,
+# weights of the disorders (equal when None) and rows the bounds are computed on ('all' or 'countries')
+index_variants = {
+    'global_mental_disorders': {
+        'label': 'Global Mental Disorders',
+        'unit': 'global score [0,1]',
+        'normalization': 'global', 'scaling': 'minmax', 'weights': None, 'reference': 'all'
+    },
+    'global_mental_disorders_yearly': {
+        'label': 'Global Mental Disorders (normalized per year)',
+        'unit': 'global score [0,1]',
+        'normalization': 'year', 'scaling': 'minmax', 'weights': None, 'reference': 'all'
+    },
+    'global_mental_disorders_countries': {
+        'label': 'Global Mental Disorders (countries only)',
+        'unit': 'global score [0,1]',
+        'normalization': 'global', 'scaling': 'minmax', 'weights': None, 'reference': 'countries'
+    },
+    'global_mental_disorders_zscore': {
+        'label': 'Global Mental Disorders (z-score)',
+        'unit': 'global z-score',
+        'normalization': 'global', 'scaling': 'zscore', 'weights': None, 'reference': 'countries'
+    },
+    'global_mental_disorders_weighted': {
+        'label': 'Global Mental Disorders (depression and anxiety x2)',
+        'unit': 'global score [0,1]',
+        'normalization': 'global', 'scaling': 'minmax', 'reference': 'all',
+        'weights': {
+            'depression_disorders': 2,
+            'anxiety_disorders': 2,
+            'bipolar_disorders': 1,
+            'eating_disorders': 1,
+            'schizo_disorders': 1
+        }
+    }
+}
+
+# Variants other than the main index, only offered on the map
+index_variant_cols = [col for col in index_variants if col != 'global_mental_disorders']
+illness_labels.update({col: variant['label'] for col, variant in index_variants.items() if col in index_variant_cols})
+
+# Indicators of the map dropdown
+map_cols = illness_cols + index_variant_cols
+
+# Number of countries of the most/least affected bars of the intro section
+ranking_size = 10
+
+# Aggregates of the country groupings (utils/groups.py), a mean weighted by the
+# `group_weight` indicator is added when the dataset has it
+group_stats = ['mean', 'median', 'min', 'max', 'count']
+group_weight = 'population'
+
+# Years of the correlation section
+correlation_min_year = 2000
+correlation_max_year = 2019
+
+# Socio-economic indicators compared with the global mental disorders index
+correlation_indicators = [
+    'global_mental_disorders',
+    'unemployment_rate',
+    'hf_score',
+    'alcohol_consumption',
+    'gii'
+]
+
+# Indicators of the radar chart, normalized per year on the min and max of the reference rows
+# ('all' rows of the year, or 'countries' only without the continent and income aggregates)
+radar_indicators = [
+    'unemployment_rate',
+    'gii',
+    'hf_score',
+    'alcohol_consumption',
+    'global_mental_disorders'
+]
+radar_reference = 'all'
+
+# Rows used by the scatter plots and the correlation matrix must have these indicators
+correlation_required = [
+    'global_mental_disorders',
+    'unemployment_rate',
+    'hf_score'
+]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+class CorrelationCube:
+    '''
+    Pearson correlation of every pair of indicators for every year, computed in one vectorized pass.
+
+    Only rows where all `required` indicators are known are used, then each pair uses the rows
+    where both indicators are known (pairwise-complete, like DataFrame.corr).
+    corr and counts have the shape (year, indicator, indicator).
+    '''
+
+    def __init__(self, panel, indicators: list, required: list = None):
+        self.indicators = list(indicators)
+        self.years = panel.years
+        self._year_index = {int(year): i for i, year in enumerate(self.years)}
+
+        cols = [panel.indicator_index(ind) for ind in self.indicators]
+        values = panel.values[:, :, cols].astype(np.float64)
+
+        rows = panel.present.copy()
+        for ind in required or []:
+            rows &= ~np.isnan(panel.indicator_slice(ind))
+
+        valid = (~np.isnan(values) & rows[:, :, None]).astype(np.float64)
+        values = np.where(valid > 0, values, 0.0)
+
+        # Sums over the rows where both indicators of a pair are known
+        n = np.einsum('ynk,ynl->ykl', valid, valid)
+        sum_x = np.einsum('ynk,ynl->ykl', values, valid)
+        sum_xx = np.einsum('ynk,ynl->ykl', values * values, valid)
+        sum_xy = np.einsum('ynk,ynl->ykl', values, values)
+        sum_y = sum_x.transpose(0, 2, 1)
+        sum_yy = sum_xx.transpose(0, 2, 1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = sum_xy - sum_x * sum_y / n
+            var_x = sum_xx - sum_x * sum_x / n
+            var_y = sum_yy - sum_y * sum_y / n
+            corr = cov / np.sqrt(var_x * var_y)
+
+        corr[n < 2] = np.nan
+        self.corr = np.clip(corr, -1.0, 1.0)
+        self.counts = n.astype(np.int64)
+        # Number of rows usable in each year
+        self.rows = rows.sum(axis=1)
+
+    def year_index(self, year) -> int:
+        return self._year_index.get(int(year)) if year is not None else None
+
+    def matrix(self, year) -> pd.DataFrame:
+        '''
+        Correlation matrix of a year (NaN when the year is unknown)
+        '''
+        i = self.year_index(year)
+        values = self.corr[i] if i is not None else np.full((len(self.indicators),) * 2, np.nan)
+        return pd.DataFrame(values.copy(), index=self.indicators, columns=self.indicators)
+
+    def series(self, x: str, y: str, min_rows: int = 0) -> pd.Series:
+        '''
+        Correlation of a pair over the years having more than `min_rows` usable rows
+        '''
+        i = self.indicators.index(x)
+        j = self.indicators.index(y)
+        keep = self.rows > min_rows
+        return pd.Series(self.corr[keep, i, j], index=self.years[keep])
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+from utils.constants import CONTINENTS, INCOME_GROUPS
+
+# Other spellings of the rows of mental-illness.csv, used to match external sources by name
+ALIASES = {
+    'Europe': ['Europe (IHME GBD)'],
+    'Africa': ['Africa (IHME GBD)'],
+    'America': ['America (IHME GBD)'],
+    'Asia': ['Asia (IHME GBD)']
+}
+
+# Codes used by other sources (World Bank) for rows of mental-illness.csv
+EXTERNAL_CODES = {
+    'WLD': 'World',
+    'EUU': 'European Union (27)',
+    'HIC': 'High-income countries',
+    'UMC': 'Upper-middle-income countries',
+    'LMC': 'Lower-middle-income countries',
+    'LIC': 'Low-income countries'
+}
+
+
+def country_kind(name: str, code) -> str:
+    '''
+    'continent', 'income', 'aggregate' (other groups such as World or EU) or 'country'
+    '''
+    if name in CONTINENTS:
+        return 'continent'
+    if name in INCOME_GROUPS:
+        return 'income'
+    if code is None or pd.isna(code) or str(code).startswith('OWID_'):
+        return 'aggregate'
+    return 'country'
+
+
+class CountryRegistry:
+    '''
+    Every row name of the dataset with its code, aliases and kind, with constant time lookups
+    and the dropdown options built once
+    '''
+
+    def __init__(self, df: pd.DataFrame):
+        rows = df[['country', 'code']].drop_duplicates(subset=['country']).sort_values(by='country')
+
+        self.entries = []
+        self._by_code = {}
+        self._by_name = {}
+
+        for name, code in zip(rows['country'], rows['code']):
+            code = None if pd.isna(code) else str(code)
+            entry = {
+                'code': code,
+                'name': str(name),
+                'aliases': ALIASES.get(name, []),
+                'kind': country_kind(name, code)
+            }
+            self.entries.append(entry)
+            self._by_name[entry['name']] = entry
+            for alias in entry['aliases']:
+                self._by_name[alias] = entry
+            if code is not None:
+                self._by_code.setdefault(code, entry)
+
+        # Dropdown options: every row with a code, sorted by name
+        self.options = [
+            {'label': entry['name'], 'value': entry['code']}
+            for entry in self.entries if entry['code'] is not None
+        ]
+        self._option_index = {option['value']: i for i, option in enumerate(self.options)}
+
+    def by_code(self, code: str) -> dict:
+        return self._by_code.get(code)
+
+    def by_name(self, name: str) -> dict:
+        '''
+        Entry of a name or one of its aliases
+        '''
+        return self._by_name.get(name)
+
+    def name(self, code: str) -> str:
+        entry = self._by_code.get(code)
+        return entry['name'] if entry else code
+
+    def names(self, kind: str) -> list:
+        return [entry['name'] for entry in self.entries if entry['kind'] == kind]
+
+    def options_excluding(self, code: str) -> list:
+        '''
+        Dropdown options without the given code
+        '''
+        i = self._option_index.get(code)
+        if i is None:
+            return self.options
+        return self.options[:i] + self.options[i + 1:]
+
+
+class CountryKeys:
+    '''
+    Canonical integer id of every row name of the base table.
+    Other sources are mapped to these ids by ISO3 code first, then by name or alias.
+    '''
+
+    def __init__(self, names: pd.Series, codes: pd.Series):
+        ids, uniques = pd.factorize(names)
+        self.ids = ids.astype(np.int64)
+        self.names = np.asarray(uniques, dtype=object)
+
+        self._by_name = {name: i for i, name in enumerate(self.names)}
+        for name, aliases in ALIASES.items():
+            if name in self._by_name:
+                for alias in aliases:
+                    self._by_name.setdefault(alias, self._by_name[name])
+
+        self._by_code = {}
+        for i, code in zip(self.ids, codes):
+            if not pd.isna(code):
+                self._by_code.setdefault(str(code), int(i))
+        for code, name in EXTERNAL_CODES.items():
+            if name in self._by_name:
+                self._by_code.setdefault(code, self._by_name[name])
+
+    def lookup(self, names: pd.Series, codes: pd.Series = None) -> np.ndarray:
+        '''
+        Id of every row of another source, -1 when it matches no row of the base table
+        '''
+        ids = names.map(self._by_name)
+        if codes is not None:
+            ids = codes.map(self._by_code).fillna(ids)
+        return ids.fillna(-1).to_numpy(dtype=np.int64)
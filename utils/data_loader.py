@@ -1,14 +1,76 @@
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
-def load_data(save_as_file: bool):
-    df_mental = pd.read_csv('data/mental-illness.csv')
-    df_unemp = pd.read_csv('data/unemployment.csv', skiprows=4)
-    df_hfi = pd.read_csv('data/human-freedom-index.csv')
-    df_alcool = pd.read_csv('data/alcohol-consumption.csv')
-    df_gii = pd.read_csv('data/gender-inequality-index.csv')
+from utils.cache import load_frame, save_frame, dataset_key
+from utils.countries import CountryKeys
+from utils.indexMentalHealth import indexMentalHealth
+from utils.memory import compact_frame
+
+SOURCE_FILES = {
+    'mental': 'data/mental-illness.csv',
+    'unemp': 'data/unemployment.csv',
+    'hfi': 'data/human-freedom-index.csv',
+    'alcool': 'data/alcohol-consumption.csv',
+    'gii': 'data/gender-inequality-index.csv'
+}
+
+# Declared schema of every source: only these columns are parsed, with fixed dtypes
+SOURCE_SCHEMAS = {
+    'mental': {
+        'usecols': [
+            'Entity', 'Code', 'Year',
+            'Schizophrenia disorders (share of population) - Sex: Both - Age: Age-standardized',
+            'Depressive disorders (share of population) - Sex: Both - Age: Age-standardized',
+            'Anxiety disorders (share of population) - Sex: Both - Age: Age-standardized',
+            'Bipolar disorders (share of population) - Sex: Both - Age: Age-standardized',
+            'Eating disorders (share of population) - Sex: Both - Age: Age-standardized'
+        ],
+        'dtype': {
+            'Entity': 'str',
+            'Code': 'str',
+            'Year': 'int64',
+            'Schizophrenia disorders (share of population) - Sex: Both - Age: Age-standardized': 'float64',
+            'Depressive disorders (share of population) - Sex: Both - Age: Age-standardized': 'float64',
+            'Anxiety disorders (share of population) - Sex: Both - Age: Age-standardized': 'float64',
+            'Bipolar disorders (share of population) - Sex: Both - Age: Age-standardized': 'float64',
+            'Eating disorders (share of population) - Sex: Both - Age: Age-standardized': 'float64'
+        }
+    },
+    'unemp': {
+        # WDI wide format: one column per year
+        'usecols': lambda col: col in ('Country Name', 'Country Code') or col.isdigit(),
+        'dtype': {'Country Name': 'str', 'Country Code': 'str'},
+        'skiprows': 4
+    },
+    'hfi': {
+        'usecols': ['year', 'iso', 'countries', 'region', 'hf_score'],
+        'dtype': {'year': 'int64', 'iso': 'str', 'countries': 'str', 'region': 'str', 'hf_score': 'float64'}
+    },
+    'alcool': {
+        'usecols': [
+            'Entity', 'Code', 'Year',
+            'Total alcohol consumption per capita (liters of pure alcohol, projected estimates, 15+ years of age)'
+        ],
+        'dtype': {
+            'Entity': 'str',
+            'Code': 'str',
+            'Year': 'int64',
+            'Total alcohol consumption per capita (liters of pure alcohol, projected estimates, 15+ years of age)': 'float64'
+        }
+    },
+    'gii': {
+        'usecols': ['Entity', 'Code', 'Year', 'Gender Inequality Index'],
+        'dtype': {'Entity': 'str', 'Code': 'str', 'Year': 'int64', 'Gender Inequality Index': 'float64'}
+    }
+}
 
-    # rename base datasets columns
-    df_mental = df_mental.rename(columns={
+# Common column names of every source
+SOURCE_RENAMES = {
+    'mental': {
         'Entity': 'country',
         'Code': 'code',
         'Year': 'year',
@@ -17,64 +79,271 @@ def load_data(save_as_file: bool):
         'Bipolar disorders (share of population) - Sex: Both - Age: Age-standardized': 'bipolar_disorders',
         'Eating disorders (share of population) - Sex: Both - Age: Age-standardized': 'eating_disorders',
         'Schizophrenia disorders (share of population) - Sex: Both - Age: Age-standardized': 'schizo_disorders'
-    })
-
-    # rename continent name
-    df_mental.loc[df_mental["country"] == "Europe (IHME GBD)", "country"] = "Europe"
-    df_mental.loc[df_mental["country"] == "Africa (IHME GBD)", "country"] = "Africa"
-    df_mental.loc[df_mental["country"] == "America (IHME GBD)", "country"] = "America"
-    df_mental.loc[df_mental["country"] == "Asia (IHME GBD)", "country"] = "Asia"
-
-    # unpivot unemp dataset from wide to long format
-    df_unemp = df_unemp.melt(
-        id_vars=['Country Name', 'Country Code'],
-        var_name='year',
-        value_name='unemployment_rate'
-    )
-    df_unemp['year'] = df_unemp['year'].astype(str).str.extract(r'(\d{4})')
-    df_unemp = df_unemp.dropna(subset=['year', 'unemployment_rate'])
-    df_unemp['year'] = df_unemp['year'].astype(int)
-    df_unemp = df_unemp[['Country Name', 'year', 'unemployment_rate']]
-    
-    df_unemp['unemployment_rate'] = pd.to_numeric(df_unemp['unemployment_rate'], errors='coerce')
-
-    df_merged = df_mental.merge(
-        df_unemp,
-        left_on=['country', 'year'],
-        right_on=['Country Name', 'year'],
-        how='left'
-    )
-
-    # rename hfi columns
-    df_hfi = df_hfi.rename(columns={
-        'countries': 'country',
-    })
-    df_hfi = df_hfi[['year', 'country', 'hf_score']]
-    df_merged = df_merged.merge(df_hfi, on=['country', 'year'], how='left')
-
-    df_alcool=df_alcool.rename(columns={
+    },
+    'unemp': {'Country Name': 'country', 'Country Code': 'code'},
+    'hfi': {'countries': 'country', 'iso': 'code'},
+    'alcool': {
         'Entity': 'country',
         'Code': 'code',
         'Year': 'year',
-        "Total alcohol consumption per capita (liters of pure alcohol, projected estimates, 15+ years of age)": 'alcohol_consumption'}
-    )
-    df_alcool = df_alcool[['year', 'country', 'alcohol_consumption']]
-    df_merged = df_merged.merge(df_alcool, on=['country', 'year'], how='left')
-
-    df_gii = df_gii.rename(columns={
+        'Total alcohol consumption per capita (liters of pure alcohol, projected estimates, 15+ years of age)': 'alcohol_consumption'
+    },
+    'gii': {
         'Entity': 'country',
         'Code': 'code',
         'Year': 'year',
-        "Gender Inequality Index": 'gii'}
-    )
-    df_gii = df_gii[['year', 'country', 'gii']]
-    df_merged = df_merged.merge(df_gii, on=['country', 'year'], how='left')
+        'Gender Inequality Index': 'gii'
+    }
+}
+
+CONTINENT_NAMES = {
+    'Europe (IHME GBD)': 'Europe',
+    'Africa (IHME GBD)': 'Africa',
+    'America (IHME GBD)': 'America',
+    'Asia (IHME GBD)': 'Asia'
+}
+
+# Indicator joined from every source onto the mental illness table
+JOIN_COLUMNS = {
+    'unemp': 'unemployment_rate',
+    'hfi': 'hf_score',
+    'alcool': 'alcohol_consumption',
+    'gii': 'gii'
+}
+
+# Country groupings taken from the sources: grouping -> (source, group column)
+GROUPING_COLUMNS = {
+    'region': ('hfi', 'region')
+}
 
-    if 'Country Name' in df_merged.columns:
-        df_merged.drop(columns=['Country Name'], inplace=True)
+# Timings of the last pipeline run, see load_report()
+last_report = []
+
+
+def load_data(save_as_file: bool, use_cache: bool = True, compact: bool = False):
+    '''
+    Load the merged and indexed dataset, from the compiled cache when the source files did not change.
+    With compact=True, names are dictionary-encoded, years int16 and indicators float32.
+    '''
+    paths = list(SOURCE_FILES.values())
+
+    if use_cache:
+        with _stage('cache') as info:
+            df_merged, fingerprints = load_frame(paths)
+            info['hit'] = df_merged is not None
+        report = [info]
+        if df_merged is None:
+            df_merged = build_data()
+            df_merged.attrs['fingerprint'] = dataset_key(fingerprints)
+            save_frame(df_merged, fingerprints)
+            report += last_report
+        last_report[:] = report
+    else:
+        df_merged = build_data()
 
     if save_as_file:
         output_path = 'mental_health_merged.csv'
         df_merged.to_csv(output_path, index=False)
 
-    return df_merged
\ No newline at end of file
+    if compact:
+        df_merged = compact_frame(df_merged)
+
+    return df_merged
+
+
+def build_data(trace_memory: bool = False):
+    '''
+    Run the whole pipeline: read -> normalize -> reshape -> join -> index.
+    The country groupings of the sources are kept in attrs['groupings'].
+    Only the wall time of the stages is recorded, unless trace_memory=True: tracemalloc then
+    records their peak memory too, but slows the whole pipeline down.
+    '''
+    report = []
+    tracing = tracemalloc.is_tracing()
+    if trace_memory and not tracing:
+        tracemalloc.start()
+
+    try:
+        with _stage('read') as info:
+            frames, info['sources'] = read_sources()
+        report.append(info)
+
+        with _stage('normalize') as info:
+            frames = normalize_sources(frames)
+        report.append(info)
+
+        with _stage('reshape') as info:
+            frames = reshape_sources(frames)
+        report.append(info)
+
+        with _stage('join') as info:
+            df_merged, info['unmatched'] = join_sources(frames)
+            groupings = source_groupings(frames)
+            info['rows'] = len(df_merged)
+        report.append(info)
+
+        with _stage('index') as info:
+            df_merged = indexMentalHealth(df_merged)
+            df_merged.attrs['groupings'] = groupings
+        report.append(info)
+    finally:
+        if trace_memory and not tracing:
+            tracemalloc.stop()
+
+    last_report[:] = report
+    return df_merged
+
+
+def read_sources(names: list = None, max_workers: int = len(SOURCE_FILES)):
+    '''
+    Parse every source file (or the given ones) concurrently with its declared schema
+    '''
+    names = list(SOURCE_FILES) if names is None else list(names)
+
+    def read(name):
+        start = time.perf_counter()
+        df = pd.read_csv(SOURCE_FILES[name], **SOURCE_SCHEMAS[name])
+        return df, {'seconds': time.perf_counter() - start, 'rows': len(df)}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {name: pool.submit(read, name) for name in names}
+        results = {name: future.result() for name, future in futures.items()}
+
+    frames = {name: result[0] for name, result in results.items()}
+    timings = {name: result[1] for name, result in results.items()}
+    return frames, timings
+
+
+def source_groupings(frames: dict) -> dict:
+    '''
+    Group of every ISO3 code for each grouping of GROUPING_COLUMNS whose source is in the
+    normalized frames (the latest year wins)
+    '''
+    groupings = {}
+    for grouping, (name, group_col) in GROUPING_COLUMNS.items():
+        if name not in frames:
+            continue
+        df = frames[name].dropna(subset=['code', group_col]).sort_values(by='year', ascending=False)
+        df = df.drop_duplicates(subset=['code'])
+        groupings[grouping] = dict(zip(df['code'], df[group_col]))
+    return groupings
+
+
+def normalize_sources(frames: dict) -> dict:
+    '''
+    Rename every source (or the given subset of them) to the common column names (country, code, year, indicators)
+    '''
+    normalized = {name: df.rename(columns=SOURCE_RENAMES[name]) for name, df in frames.items()}
+
+    if 'mental' in normalized:
+        # rename continent name
+        normalized['mental']['country'] = normalized['mental']['country'].replace(CONTINENT_NAMES)
+
+    return normalized
+
+
+def reshape_sources(frames: dict) -> dict:
+    '''
+    Bring every source to the long (country, year) format
+    '''
+    if 'unemp' not in frames:
+        return frames
+
+    # unpivot unemp dataset from wide to long format
+    df_unemp = frames['unemp'].melt(
+        id_vars=['country', 'code'],
+        var_name='year',
+        value_name='unemployment_rate'
+    )
+    df_unemp = df_unemp.dropna(subset=['unemployment_rate'])
+    df_unemp['year'] = df_unemp['year'].astype('int64')
+
+    return {**frames, 'unemp': df_unemp[['country', 'code', 'year', 'unemployment_rate']]}
+
+
+def join_sources(frames: dict):
+    '''
+    Left join every indicator source given onto the mental illness table on integer (country id, year) keys.
+    Return the merged frame and, per source, the countries that matched no row of the table.
+    '''
+    df_mental = frames['mental']
+    keys = CountryKeys(df_mental['country'], df_mental['code'])
+    base_keys = _row_keys(keys.ids, df_mental['year'].to_numpy())
+
+    columns = {col: df_mental[col].to_numpy() for col in df_mental.columns}
+    unmatched = {}
+
+    for name, col in JOIN_COLUMNS.items():
+        if name not in frames:
+            continue
+        df_source = frames[name]
+        ids = keys.lookup(df_source['country'], df_source['code'])
+        matched = ids >= 0
+
+        unmatched_countries = df_source.loc[~matched, 'country'].unique()
+        unmatched[name] = {'rows': int((~matched).sum()), 'countries': sorted(map(str, unmatched_countries))}
+
+        source_keys = pd.Index(_row_keys(ids[matched], df_source['year'].to_numpy()[matched]))
+        values = df_source[col].to_numpy(dtype=np.float64)[matched]
+
+        # First value wins if a source has several rows for the same key
+        first = ~source_keys.duplicated()
+        positions = source_keys[first].get_indexer(base_keys)
+        found = positions >= 0
+
+        joined = np.full(len(base_keys), np.nan)
+        joined[found] = values[first][positions[found]]
+        columns[col] = joined
+
+    return pd.DataFrame(columns), unmatched
+
+
+def _row_keys(country_ids: np.ndarray, years: np.ndarray) -> np.ndarray:
+    return country_ids.astype(np.int64) * 10000 + years.astype(np.int64)
+
+
+def load_report() -> list:
+    '''
+    Stage timings of the last load_data call
+    '''
+    return list(last_report)
+
+
+def format_report(report: list) -> str:
+    lines = []
+    for info in report:
+        line = f"{info['stage']:<10} {info['seconds'] * 1000:8.1f} ms"
+        if info.get('peak_bytes') is not None:
+            line += f"  peak {info['peak_bytes'] / 2**20:7.2f} MiB"
+        lines.append(line)
+        for name, source in info.get('sources', {}).items():
+            lines.append(f"  {name:<8} {source['seconds'] * 1000:8.1f} ms  {source['rows']} rows")
+        for name, missing in info.get('unmatched', {}).items():
+            lines.append(f"  {name:<8} {len(missing['countries'])} unmatched countries ({missing['rows']} rows)")
+    return '\n'.join(lines)
+
+
+class _stage:
+    '''
+    Context manager measuring the wall time and peak traced memory of a pipeline stage
+    '''
+    def __init__(self, name: str):
+        self.info = {'stage': name, 'seconds': None, 'peak_bytes': None}
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self.info
+
+    def __exit__(self, *exc):
+        self.info['seconds'] = time.perf_counter() - self.start
+        if tracemalloc.is_tracing():
+            self.info['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        return False
+
+
+if __name__ == '__main__':
+    # python -m utils.data_loader : rebuild the dataset and print where the time and memory go
+    build_data(trace_memory=True)
+    print(format_report(load_report()))
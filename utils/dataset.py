@@ -0,0 +1,100 @@
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from utils.constants import (
+    correlation_indicators, correlation_required, index_variant_cols, map_cols, radar_indicators, radar_reference,
+    group_stats, group_weight
+)
+from utils.correlation import CorrelationCube
+from utils.countries import CountryRegistry
+from utils.groups import GroupCube
+from utils.panel import Panel
+from utils.radar import RadarMatrix
+from utils.ranking import RankIndex
+from utils.regression import RegressionCube
+from utils.shared import ArrayStore, share_arrays
+
+
+class Dataset:
+    '''
+    Merged frame and the structures derived from it, built once at startup.
+
+    With shared=True, the numeric arrays of the panel and of the cubes are moved to an ArrayStore
+    (memory-mapped files shared by every process) and the merged frame is not kept (df is None):
+    the attributes of the panel and of the cubes are then the shared views themselves.
+    '''
+
+    def __init__(self, df: pd.DataFrame, shared: bool = False):
+        self.df = df
+        self.fingerprint = df.attrs.get('fingerprint')
+        self.groupings = df.attrs.get('groupings', {})
+        self.panel = Panel(df)
+        self.countries = CountryRegistry(df)
+
+        self.arrays = None
+        if shared and self.fingerprint:
+            self.arrays = ArrayStore(self.fingerprint)
+            share_arrays(self.panel, self.arrays, 'panel', ['values', 'present'])
+            self.df = None
+
+    @cached_property
+    def correlations(self) -> CorrelationCube:
+        '''
+        Pairwise correlations of all indicators (the main index only), on rows having the scatter plot indicators
+        '''
+        indicators = [ind for ind in self.panel.indicators if ind not in index_variant_cols]
+        return self._share(CorrelationCube(self.panel, indicators, required=correlation_required), 'correlations')
+
+    @cached_property
+    def complete_correlations(self) -> CorrelationCube:
+        '''
+        Correlations of the socio-economic indicators, on rows where all of them are known
+        '''
+        return self._share(CorrelationCube(self.panel, correlation_indicators, required=correlation_indicators), 'complete_correlations')
+
+    @cached_property
+    def regressions(self) -> RegressionCube:
+        '''
+        Regression of each socio-economic indicator on the global mental disorders index
+        '''
+        return self._share(
+            RegressionCube(self.panel, correlation_indicators[0], correlation_indicators[1:], required=correlation_required),
+            'regressions'
+        )
+
+    @cached_property
+    def radar(self) -> RadarMatrix:
+        '''
+        Radar chart indicators normalized per year
+        '''
+        return self._share(RadarMatrix(self.panel, radar_indicators, reference=radar_reference), 'radar')
+
+    @cached_property
+    def ranks(self) -> RankIndex:
+        '''
+        Rank of the real countries for each map indicator and year
+        '''
+        return self._share(RankIndex(self.panel, map_cols), 'ranks')
+
+    @cached_property
+    def groups(self) -> GroupCube:
+        '''
+        Aggregates of the country groupings of the sources (e.g. the human freedom index regions)
+        '''
+        return self._share(GroupCube(self.panel, self.groupings, group_stats, weight=group_weight), 'groups')
+
+    def preload(self):
+        '''
+        Build the lazy structures now, e.g. before forking the server workers so that they share them
+        '''
+        for name in ('correlations', 'complete_correlations', 'regressions', 'radar', 'ranks', 'groups'):
+            getattr(self, name)
+        return self
+
+    def _share(self, cube, prefix: str):
+        if self.arrays is not None:
+            names = [name for name, value in vars(cube).items() if isinstance(value, np.ndarray) and value.dtype != object]
+            share_arrays(cube, self.arrays, prefix, names)
+        return cube
@@ -0,0 +1,278 @@
+import functools
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+FIGURE_CACHE_DIR = os.path.join('cache', 'figures')
+FIGURE_BUNDLE = os.path.join('cache', 'figures-bundle.jsonl.gz')
+
+# Bump when the figures built by the callbacks change, so that old entries are not served
+FIGURE_CACHE_VERSION = 7
+
+# The disk tier is checked every time this fraction of max_bytes was written by the process,
+# then its least recently used entries are deleted down to EVICT_TO of max_bytes
+CHECK_FRACTION = 0.05
+EVICT_TO = 0.9
+
+
+class FigureCache:
+    '''
+    Memoization of callback outputs keyed by callback name, normalized inputs and dataset fingerprint.
+
+    First tier: bounded in-process LRU of the decoded outputs.
+    Then the read-only bundle written by prerender.py, if one was loaded.
+    Second tier: one JSON file per entry under `directory`, shared by every worker process,
+    at most `max_bytes` (the least recently written or read entries are deleted first).
+    Entries of another dataset fingerprint are never returned.
+    '''
+
+    def __init__(self, max_entries: int = 256, directory: str = FIGURE_CACHE_DIR, max_bytes: int = 256 * 2**20):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fingerprint = None
+        self._written = 0
+        self._evict_lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._bundle = {}
+        self._lock = threading.RLock()
+        self._stats = {}
+        # Outcome of the last lookup of the current thread, see last_status()
+        self._local = threading.local()
+
+    def set_fingerprint(self, fingerprint: str, cleanup: bool = True):
+        '''
+        Switch to another dataset: the memory tier is cleared and, with cleanup, the disk tier of other datasets removed
+        (other processes still serving another dataset need it, see remove_other_fingerprints)
+        '''
+        with self._lock:
+            self.fingerprint = fingerprint
+            self._memory.clear()
+            self._bundle = {}
+
+        if cleanup:
+            self.remove_other_fingerprints()
+            self.enforce_limit()
+
+    def remove_other_fingerprints(self):
+        '''
+        Remove the disk tier of the datasets other than the current one
+        '''
+        fingerprint = self.fingerprint
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name != fingerprint:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def pin(self, fingerprint: str):
+        '''
+        Use the fingerprint of the dataset a request is served from (see LazyDataset.pin) for the keys of this thread,
+        so that a request still running on a replaced dataset never stores its figures under the new fingerprint
+        '''
+        self._local.fingerprint = fingerprint
+
+    def unpin(self):
+        self._local.fingerprint = None
+
+    def current_fingerprint(self) -> str:
+        return getattr(self._local, 'fingerprint', None) or self.fingerprint
+
+    def key(self, name: str, args) -> str:
+        payload = json.dumps([FIGURE_CACHE_VERSION, self.current_fingerprint(), name, list(args)], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def get(self, name: str, key: str):
+        '''
+        (True, value) on a hit, (False, None) on a miss
+        '''
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count(name, 'memory_hits')
+                return True, self._memory[key]
+
+        serialized = self._bundle.get(key)
+        if serialized is not None:
+            value = json.loads(serialized)
+            self._remember(key, value)
+            self._count(name, 'bundle_hits')
+            return True, value
+
+        path = self._path(key)
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    value = json.load(f)
+                # Recently read entries are evicted last
+                os.utime(path)
+            except (OSError, ValueError):
+                value = None
+            else:
+                self._remember(key, value)
+                self._count(name, 'disk_hits')
+                return True, value
+
+        self._count(name, 'misses')
+        return False, None
+
+    def put(self, key: str, value):
+        '''
+        Serialize the value once, store it in both tiers and return its decoded form
+        '''
+        serialized = to_json_plotly(value)
+        decoded = json.loads(serialized)
+        self._remember(key, decoded)
+
+        path = self._path(key)
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(serialized)
+            os.replace(tmp_path, path)
+            self._wrote(len(serialized))
+        return decoded
+
+    def cached(self, name: str):
+        '''
+        Decorator memoizing a callback function
+        '''
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = self.key(name, args)
+                hit, value = self.get(name, key)
+                if hit:
+                    return value
+                return self.put(key, func(*args))
+            return wrapper
+        return decorator
+
+    def load_bundle(self, path: str = FIGURE_BUNDLE) -> int:
+        '''
+        Serve the entries of a prerendered bundle (see write_bundle), if it matches the dataset.
+        Return the number of entries loaded.
+        '''
+        if not os.path.exists(path):
+            return 0
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('fingerprint') != self.fingerprint:
+                return 0
+            bundle = {}
+            for line in f:
+                key, serialized = line.rstrip('\n').split('\t', 1)
+                bundle[key] = serialized
+
+        with self._lock:
+            self._bundle = bundle
+        return len(bundle)
+
+    def stats(self) -> dict:
+        '''
+        Hit and miss counts per callback
+        '''
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def reset_status(self):
+        self._local.status = None
+
+    def last_status(self) -> str:
+        '''
+        'memory', 'bundle', 'disk' or 'miss' for the last lookup made by this thread since reset_status(),
+        None when there was none
+        '''
+        return getattr(self._local, 'status', None)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.directory and self.fingerprint:
+            shutil.rmtree(os.path.join(self.directory, self.fingerprint), ignore_errors=True)
+
+    def enforce_limit(self):
+        '''
+        Delete the least recently written or read entries of the disk tier (every dataset) once it holds
+        more than max_bytes, down to EVICT_TO of it
+        '''
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        # One scan at a time per process, the other threads go on
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            files = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        finally:
+            self._evict_lock.release()
+
+    def _wrote(self, size: int):
+        with self._lock:
+            self._written += size
+            if self._written < self.max_bytes * CHECK_FRACTION:
+                return
+            self._written = 0
+        self.enforce_limit()
+
+    def _remember(self, key: str, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _count(self, name: str, counter: str):
+        self._local.status = 'miss' if counter == 'misses' else counter[:-len('_hits')]
+        with self._lock:
+            counts = self._stats.setdefault(name, {'memory_hits': 0, 'bundle_hits': 0, 'disk_hits': 0, 'misses': 0})
+            counts[counter] += 1
+
+    def _path(self, key: str):
+        fingerprint = self.current_fingerprint()
+        if not self.directory or not fingerprint:
+            return None
+        return os.path.join(self.directory, fingerprint, key[:2], f'{key}.json')
+
+
+def write_bundle(entries, fingerprint: str, path: str = FIGURE_BUNDLE):
+    '''
+    Write (key, serialized output) pairs as a gzipped bundle: a JSON header line, then one `key\tjson` line per entry
+    '''
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'fingerprint': fingerprint}) + '\n')
+        for key, serialized in entries:
+            f.write(f'{key}\t{serialized}\n')
+    os.replace(tmp_path, path)
+
+
+# Shared by every callback module, WMH_FIGURE_CACHE_MAX_MB bounds the disk tier (256)
+figure_cache = FigureCache(max_bytes=int(float(os.environ.get('WMH_FIGURE_CACHE_MAX_MB', '256')) * 2**20))
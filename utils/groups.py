@@ -0,0 +1,124 @@
+import warnings
+
+import numpy as np
+
+from utils.countries import country_kind
+
+
+class GroupCube:
+    '''
+    Aggregates of every indicator and year for the groups of any country grouping, built once.
+
+    groupings maps a grouping name to the group of each ISO3 code (e.g. {'region': {'FRA': 'Western Europe'}}),
+    only real countries of the panel are counted. values has the shape (stat, year, group, indicator), groups
+    of all the groupings side by side: a new grouping needs no source row and no groupby per request.
+    With `weight` (an indicator of the panel, e.g. the population), a weighted mean is added to the stats;
+    it is skipped when the panel has no such indicator.
+    '''
+
+    def __init__(self, panel, groupings: dict, stats: list, weight: str = None):
+        self.indicators = list(panel.indicators)
+        self.years = panel.years
+        self.weight = weight if weight in panel.indicators else None
+        self.stats = list(stats) + (['weighted_mean'] if self.weight else [])
+        self._year_index = {int(year): i for i, year in enumerate(self.years)}
+        self._indicator_index = {ind: k for k, ind in enumerate(self.indicators)}
+        self._stat_index = {stat: s for s, stat in enumerate(self.stats)}
+
+        self.groups = []
+        members = []
+        for grouping, membership in groupings.items():
+            by_group = {}
+            for code, group in membership.items():
+                j = panel.country_index(code)
+                if j is not None and country_kind(panel.countries[j], code) == 'country':
+                    by_group.setdefault(group, []).append(j)
+            for group in sorted(by_group):
+                self.groups.append((grouping, group))
+                members.append(np.array(by_group[group], dtype=np.int64))
+        self._group_index = {key: g for g, key in enumerate(self.groups)}
+
+        values = panel.values.astype(np.float64)
+        self.values = np.full((len(self.stats), len(self.years), len(self.groups), len(self.indicators)), np.nan)
+
+        # One pass per group, vectorized over years and indicators (empty groups give NaN silently)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for g, rows in enumerate(members):
+                group_values = values[:, rows, :]
+                for s, stat in enumerate(self.stats):
+                    self.values[s, :, g, :] = self._aggregate(stat, group_values)
+
+    def _aggregate(self, stat: str, group_values: np.ndarray) -> np.ndarray:
+        '''
+        (year x indicator) aggregate of the (year x member x indicator) values of a group
+        '''
+        if stat == 'mean':
+            return np.nanmean(group_values, axis=1)
+        if stat == 'median':
+            return np.nanmedian(group_values, axis=1)
+        if stat == 'min':
+            return np.nanmin(group_values, axis=1)
+        if stat == 'max':
+            return np.nanmax(group_values, axis=1)
+        if stat == 'count':
+            return (~np.isnan(group_values)).sum(axis=1)
+        if stat == 'weighted_mean':
+            weights = group_values[:, :, [self._indicator_index[self.weight]]]
+            known = ~np.isnan(group_values) & ~np.isnan(weights)
+            total = np.where(known, group_values * weights, 0.0).sum(axis=1)
+            return total / np.where(known, weights, 0.0).sum(axis=1)
+        raise ValueError(f'Unknown aggregate: {stat}')
+
+    def names(self, grouping: str) -> list:
+        return [group for name, group in self.groups if name == grouping]
+
+    def group_values(self, grouping: str, year, indicator: str, stat: str = 'mean') -> dict:
+        '''
+        Aggregate of every group of a grouping in one year, groups without value left out
+        '''
+        i = self._year_index.get(int(year)) if year is not None else None
+        if i is None:
+            return {'group': [], stat: []}
+        s, k = self._stat_index[stat], self._indicator_index[indicator]
+        positions = [g for g, (name, _) in enumerate(self.groups) if name == grouping]
+        values = self.values[s, i, positions, k]
+        known = ~np.isnan(values)
+        return {
+            'group': [self.groups[g][1] for g, ok in zip(positions, known) if ok],
+            stat: values[known].tolist()
+        }
+
+    def group_series(self, grouping: str, group: str, indicator: str, stat: str = 'mean'):
+        '''
+        (years, values) of one group over time, None for the years without value
+        '''
+        g = self._group_index.get((grouping, group))
+        if g is None:
+            return self.years.tolist(), [None] * len(self.years)
+        values = self.values[self._stat_index[stat], :, g, self._indicator_index[indicator]]
+        return self.years.tolist(), [None if np.isnan(v) else float(v) for v in values]
+
+
+if __name__ == '__main__':
+    # python -m utils.groups GROUPING INDICATOR YEAR : aggregates of every group
+    import argparse
+
+    from utils.data_loader import load_data
+    from utils.dataset import Dataset
+
+    parser = argparse.ArgumentParser(description='Aggregates of the countries of a grouping')
+    parser.add_argument('grouping', nargs='?', default='region')
+    parser.add_argument('indicator', nargs='?', default='global_mental_disorders')
+    parser.add_argument('year', nargs='?', type=int, default=2019)
+    args = parser.parse_args()
+
+    cube = Dataset(load_data(save_as_file=False)).groups
+    columns = {stat: cube.group_values(args.grouping, args.year, args.indicator, stat) for stat in cube.stats}
+    print(f"{'group':<35}" + ''.join(f'{stat:>14}' for stat in cube.stats))
+    for name in cube.names(args.grouping):
+        row = []
+        for stat, values in columns.items():
+            found = dict(zip(values['group'], values[stat]))
+            row.append(f'{found[name]:14.4f}' if name in found else f"{'-':>14}")
+        print(f'{name:<35}' + ''.join(row))
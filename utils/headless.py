@@ -0,0 +1,47 @@
+import contextlib
+import inspect
+
+
+class CallbackRecorder:
+    '''
+    Stand-in for the Dash app given to the register_*_callbacks functions.
+    Callbacks are recorded by function name so that they can be called without a server.
+    '''
+
+    def __init__(self):
+        self.callbacks = {}
+
+    def callback(self, *args, **kwargs):
+        def decorator(func):
+            self.callbacks[func.__name__] = func
+            return func
+        return decorator
+
+    def __getitem__(self, name: str):
+        return self.callbacks[name]
+
+    def raw(self, name: str):
+        '''
+        Callback without its decorators (e.g. the figure cache)
+        '''
+        return inspect.unwrap(self.callbacks[name])
+
+    def clientside_callback(self, *args, **kwargs):
+        # Runs in the browser, nothing to record
+        pass
+
+
+@contextlib.contextmanager
+def triggered(component_id: str, prop: str = 'value'):
+    '''
+    Run callbacks as if `component_id` had just changed in the browser: they take their Patch paths
+    instead of the first render (see utils.helpers.is_first_render)
+    '''
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    token = context_value.set(AttributeDict(triggered_inputs=[{'prop_id': f'{component_id}.{prop}', 'value': None}]))
+    try:
+        yield
+    finally:
+        context_value.reset(token)
@@ -1,3 +1,46 @@
-def code_to_name(df, code: str) -> str:
-    row = df[df['code'] == code].head(1)
-    return row['country'].iloc[0] if not row.empty else code
\ No newline at end of file
+from dash import ctx
+from dash.exceptions import MissingCallbackContextException
+
+from utils.constants import index_variants
+
+
+def unit_of(indicator: str) -> str:
+    '''
+    Unit of an indicator shown in the axis titles and hovers
+    '''
+    return index_variants[indicator]['unit'] if indicator in index_variants else '% of Population'
+
+
+def is_first_render() -> bool:
+    '''
+    True on the initial call of a callback (or outside of a request), when the output
+    has no value yet in the browser and cannot be patched
+    '''
+    try:
+        return ctx.triggered_id is None
+    except MissingCallbackContextException:
+        return True
+
+
+def triggered_by(component_id: str) -> bool:
+    try:
+        return ctx.triggered_id == component_id
+    except MissingCallbackContextException:
+        return False
+
+
+def output_ids():
+    '''
+    'id.property' of the outputs of the current callback: a list when the outputs are given
+    as a list (even of one), a string for a single output, None outside of a request
+    '''
+    try:
+        outputs = ctx.outputs_list
+    except MissingCallbackContextException:
+        return None
+    if not outputs:
+        # Context without outputs, e.g. utils.headless.triggered
+        return None
+    if isinstance(outputs, dict):
+        return f"{outputs['id']}.{outputs['property']}"
+    return [f"{output['id']}.{output['property']}" for output in outputs]
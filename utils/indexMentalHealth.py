@@ -1,17 +1,116 @@
+import numpy as np
 import pandas as pd
 
-def indexMentalHealth(df: pd.DataFrame):
+from utils.constants import index_variants
+from utils.countries import country_kind
 
-    cols = [
+# Disorders combined in the global mental disorders index
+index_cols = [
     "depression_disorders",
     "anxiety_disorders",
     "bipolar_disorders",
     "eating_disorders",
     "schizo_disorders"
-    ]
+]
 
-    df_norm = (df[cols] - df[cols].min()) / (df[cols].max() - df[cols].min())
 
-    df["global_mental_disorders"] = df_norm.sum(axis=1)/5
+def index_bounds(df: pd.DataFrame):
+    '''
+    (min, max) of every disorder over all rows, the normalization of the main index
+    '''
+    # Always computed in float64, so that compact frames give the same index
+    values = df[index_cols].astype(np.float64)
+    return values.min(), values.max()
 
-    return df
\ No newline at end of file
+
+def index_values(df: pd.DataFrame, bounds) -> pd.Series:
+    '''
+    Main index of the rows of df, normalized with the given bounds
+    '''
+    low, high = bounds
+    values = df[index_cols].astype(np.float64)
+    df_norm = (values - low) / (high - low)
+    return df_norm.sum(axis=1)/5
+
+
+def _group_stats(values: np.ndarray, groups: np.ndarray, n_groups: int, reference: np.ndarray) -> dict:
+    '''
+    min, max, mean and standard deviation of every column per group, over the reference rows (NaN skipped)
+    '''
+    values = values[reference]
+    groups = groups[reference]
+    known = ~np.isnan(values)
+    filled = np.where(known, values, 0.0)
+
+    low = np.full((n_groups, values.shape[1]), np.inf)
+    high = np.full((n_groups, values.shape[1]), -np.inf)
+    np.fmin.at(low, groups, values)
+    np.fmax.at(high, groups, values)
+
+    count = np.zeros((n_groups, values.shape[1]))
+    total = np.zeros((n_groups, values.shape[1]))
+    squares = np.zeros((n_groups, values.shape[1]))
+    np.add.at(count, groups, known)
+    np.add.at(total, groups, filled)
+    np.add.at(squares, groups, filled * filled)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean * mean, 0.0))
+
+    empty = count == 0
+    low[empty] = np.nan
+    high[empty] = np.nan
+    return {'min': low, 'max': high, 'mean': mean, 'std': std}
+
+
+def index_variant_values(df: pd.DataFrame, variants: dict = None) -> dict:
+    '''
+    Column of every index variant (see constants.index_variants), without modifying df.
+
+    The disorders matrix is read once; the statistics of each (normalization, reference) pair are
+    computed once for all the variants sharing it, then every variant is a weighted sum of columns.
+    Missing disorders count as 0, as in the original index.
+    '''
+    variants = index_variants if variants is None else variants
+    values = df[index_cols].to_numpy(dtype=np.float64)
+
+    year_codes, years = pd.factorize(df['year'], sort=True)
+    groups = {'global': (np.zeros(len(df), dtype=np.int64), 1), 'year': (year_codes, len(years))}
+
+    countries = np.array([country_kind(name, code) == 'country' for name, code in zip(df['country'], df['code'])], dtype=bool)
+    references = {'all': np.ones(len(df), dtype=bool), 'countries': countries}
+
+    stats = {}
+    columns = {}
+    for name, variant in variants.items():
+        key = (variant['normalization'], variant['reference'])
+        if key not in stats:
+            codes, n_groups = groups[variant['normalization']]
+            group_stats = _group_stats(values, codes, n_groups, references[variant['reference']])
+            stats[key] = {stat: array[codes] for stat, array in group_stats.items()}
+        row_stats = stats[key]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if variant['scaling'] == 'zscore':
+                norm = (values - row_stats['mean']) / row_stats['std']
+            else:
+                norm = (values - row_stats['min']) / (row_stats['max'] - row_stats['min'])
+
+        weights = variant.get('weights') or {}
+        weights = np.array([weights.get(col, 1.0) for col in index_cols], dtype=np.float64)
+        columns[name] = np.nansum(norm * weights, axis=1) / weights.sum()
+
+    return columns
+
+
+def indexMentalHealth(df: pd.DataFrame, compact: bool = False):
+    '''
+    Copy of df with one column per index variant (global_mental_disorders is the main index)
+    '''
+    columns = index_variant_values(df)
+
+    if compact:
+        columns = {name: values.astype(np.float32) for name, values in columns.items()}
+
+    return df.assign(**columns)
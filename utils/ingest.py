@@ -0,0 +1,232 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import read_frame, save_frame, sources_fingerprint, dataset_key
+from utils.data_loader import (
+    SOURCE_FILES, JOIN_COLUMNS, load_data, read_sources, normalize_sources, reshape_sources, join_sources, source_groupings
+)
+from utils.constants import index_variants, index_variant_cols
+from utils.indexMentalHealth import index_cols, index_bounds, index_values, index_variant_values
+
+INDEX_COLUMN = 'global_mental_disorders'
+
+# Number of the largest index shifts listed in the report
+REPORTED_SHIFTS = 20
+
+
+def ingest_updates():
+    '''
+    Bring the compiled dataset up to date with the source files without a full rebuild.
+
+    Only the changed sources are read: their indicator columns are joined again onto the compiled
+    rows. When the mental illness table changed, the rows already compiled keep their indicators
+    (their disorders are taken from the new table) and only its new (country, year) rows are joined
+    with the sources that did not change, read for these rows only. The main index is then only
+    recomputed for the new and corrected rows, unless the normalization bounds moved: then every row
+    is recomputed and the historical values that shifted are reported.
+    The other index variants (per-year or z-score normalization...) are recomputed in one pass.
+
+    Return (frame, report), the frame is saved as the new compiled dataset.
+    '''
+    start = time.perf_counter()
+    paths = list(SOURCE_FILES.values())
+
+    previous, previous_sources = read_frame()
+    if previous is None:
+        df = load_data(save_as_file=False)
+        return df, {'mode': 'full', 'changed_sources': list(SOURCE_FILES), 'seconds': time.perf_counter() - start}
+
+    fingerprints = sources_fingerprint(paths, previous_sources)
+    changed = [
+        name for name, path in SOURCE_FILES.items()
+        if (previous_sources.get(path) or {}).get('sha1') != fingerprints[path]['sha1']
+    ]
+    report = {'mode': 'unchanged', 'changed_sources': changed}
+    if not changed:
+        report['seconds'] = time.perf_counter() - start
+        return previous, report
+
+    frames = reshape_sources(normalize_sources(read_sources(changed)[0]))
+    groupings = source_groupings(frames)
+
+    if 'mental' in changed:
+        base = _merge_rows(previous, frames.pop('mental'), changed)
+    else:
+        base = previous
+    columns = [JOIN_COLUMNS[name] for name in changed if name in JOIN_COLUMNS]
+    frames['mental'] = base.drop(columns=columns)
+    df, report['unmatched'] = join_sources(frames)
+    report.update(_compare_rows(previous, df))
+
+    if 'mental' in changed:
+        df[INDEX_COLUMN], report['index'] = _update_index(previous, df)
+        variants = {name: index_variants[name] for name in index_variant_cols}
+        for name, values in index_variant_values(df, variants).items():
+            df[name] = values
+        report['index']['variants_recomputed'] = list(variants)
+        report['mode'] = 'rows'
+    else:
+        report['index'] = {'recomputed_rows': 0, 'renormalized': False}
+        report['mode'] = 'columns'
+
+    df = df[list(previous.columns)]
+    df.attrs['fingerprint'] = dataset_key(fingerprints)
+    # Groupings of the sources not read again are kept
+    df.attrs['groupings'] = {**previous.attrs['groupings'], **groupings}
+    save_frame(df, fingerprints)
+
+    report['seconds'] = time.perf_counter() - start
+    return df, report
+
+
+def _merge_rows(previous: pd.DataFrame, mental: pd.DataFrame, changed: list) -> pd.DataFrame:
+    '''
+    Rows of the new mental illness table, in its order: the compiled rows already there with the
+    disorders of the new table, and the new rows joined with the sources that did not change
+    '''
+    positions = _matching_rows(previous, mental)
+    found = positions >= 0
+
+    kept = previous.iloc[positions[found]].reset_index(drop=True)
+    for col in mental.columns:
+        kept[col] = mental[col].to_numpy()[found]
+
+    appended = mental.loc[~found].reset_index(drop=True)
+    unchanged = [name for name in JOIN_COLUMNS if name not in changed]
+    if len(appended) and unchanged:
+        frames = reshape_sources(normalize_sources(read_sources(unchanged)[0]))
+        appended, _ = join_sources({**frames, 'mental': appended})
+
+    merged = pd.concat([kept, appended], ignore_index=True)
+    order = np.concatenate([np.flatnonzero(found), np.flatnonzero(~found)])
+    return merged.iloc[np.argsort(order)].reset_index(drop=True)
+
+
+def _row_index(df: pd.DataFrame) -> pd.MultiIndex:
+    return pd.MultiIndex.from_arrays([df['country'].astype(str).to_numpy(), df['year'].to_numpy(dtype=np.int64)])
+
+
+def _same(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # NaN equals NaN: a value still missing is not a change
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+def _matching_rows(previous: pd.DataFrame, df: pd.DataFrame):
+    '''
+    Positions in `previous` of the rows of `df` (-1 for new rows)
+    '''
+    previous_keys = _row_index(previous)
+    return previous_keys.get_indexer(_row_index(df))
+
+
+def _compare_rows(previous: pd.DataFrame, df: pd.DataFrame) -> dict:
+    '''
+    Appended and removed (country, year) rows, and number of changed values per indicator on the other rows
+    '''
+    positions = _matching_rows(previous, df)
+    found = positions >= 0
+    removed = np.ones(len(previous), dtype=bool)
+    removed[positions[found]] = False
+
+    updated = {}
+    for col in df.columns:
+        if col in ('country', 'code', 'year') or col in index_variants or col not in previous.columns:
+            continue
+        old = previous[col].to_numpy(dtype=np.float64)[positions[found]]
+        new = df[col].to_numpy(dtype=np.float64)[found]
+        count = int((~_same(old, new)).sum())
+        if count:
+            updated[col] = count
+
+    appended = df.loc[~found, 'year']
+    return {
+        'appended_rows': int((~found).sum()),
+        'appended_years': sorted(int(year) for year in appended.unique()),
+        'removed_rows': int(removed.sum()),
+        'updated_values': updated
+    }
+
+
+def _update_index(previous: pd.DataFrame, df: pd.DataFrame):
+    '''
+    Index of the rows of df and what changed: only new and corrected rows are computed
+    when the normalization bounds did not move
+    '''
+    old_low, old_high = index_bounds(previous)
+    low, high = index_bounds(df)
+    moved = [col for col in index_cols if not (_same(old_low[col], low[col]) and _same(old_high[col], high[col]))]
+
+    positions = _matching_rows(previous, df)
+    found = positions >= 0
+
+    old_index = np.full(len(df), np.nan)
+    old_index[found] = previous[INDEX_COLUMN].to_numpy(dtype=np.float64)[positions[found]]
+
+    # Rows whose disorder values are new or were corrected
+    inputs_changed = ~found
+    for col in index_cols:
+        old = np.full(len(df), np.nan)
+        old[found] = previous[col].to_numpy(dtype=np.float64)[positions[found]]
+        inputs_changed |= ~_same(old, df[col].to_numpy(dtype=np.float64))
+
+    if moved:
+        index = index_values(df, (low, high)).to_numpy()
+        recomputed = len(df)
+    else:
+        index = old_index.copy()
+        index[inputs_changed] = index_values(df.loc[inputs_changed], (low, high)).to_numpy()
+        recomputed = int(inputs_changed.sum())
+
+    report = {
+        'recomputed_rows': recomputed,
+        'renormalized': bool(moved),
+        'bounds': {
+            col: {'before': [float(old_low[col]), float(old_high[col])], 'after': [float(low[col]), float(high[col])]}
+            for col in moved
+        }
+    }
+
+    # Historical values changed by the renormalization only (their own inputs did not change)
+    shifted = found & ~inputs_changed & ~_same(old_index, index)
+    shift = np.abs(index - old_index)
+    report['shifted_rows'] = int(shifted.sum())
+    report['max_shift'] = float(shift[shifted].max()) if shifted.any() else 0.0
+    largest = np.flatnonzero(shifted)[np.argsort(-shift[shifted])[:REPORTED_SHIFTS]]
+    report['largest_shifts'] = [
+        {
+            'country': str(df['country'].iat[i]),
+            'year': int(df['year'].iat[i]),
+            'before': float(old_index[i]),
+            'after': float(index[i])
+        }
+        for i in largest
+    ]
+
+    return index, report
+
+
+def format_ingest_report(report: dict) -> str:
+    lines = [f"mode: {report['mode']} ({report['seconds'] * 1000:.1f} ms)"]
+    lines.append(f"changed sources: {', '.join(report['changed_sources']) or 'none'}")
+    if report['mode'] in ('rows', 'columns'):
+        lines.append(f"appended rows: {report['appended_rows']} (years {report['appended_years']})")
+        lines.append(f"removed rows: {report['removed_rows']}")
+        for col, count in report['updated_values'].items():
+            lines.append(f'  {col:<25} {count} historical values updated')
+
+        index = report['index']
+        lines.append(f"index: {index['recomputed_rows']} rows recomputed")
+        if index['renormalized']:
+            for col, bounds in index['bounds'].items():
+                lines.append(f"  {col:<25} bounds {bounds['before']} -> {bounds['after']}")
+            lines.append(f"  {index['shifted_rows']} historical values shifted by the renormalization (max {index['max_shift']:.6f})")
+            for shift in index['largest_shifts']:
+                lines.append(f"    {shift['country']:<40} {shift['year']}  {shift['before']:.6f} -> {shift['after']:.6f}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # python -m utils.ingest : update the compiled dataset with the changed source files
+    print(format_ingest_report(ingest_updates()[1]))
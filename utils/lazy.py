@@ -0,0 +1,57 @@
+import threading
+
+
+class LazyDataset:
+    '''
+    Stand-in for the Dataset built by `loader` on first use of one of its attributes,
+    so that the app can be imported and answer its first requests before the data is loaded.
+    load() builds it ahead of time (e.g. in the gunicorn master before fork).
+
+    swap() replaces it by another, fully built, dataset. A request pins the current dataset
+    (pin/unpin) so that all of its attribute reads see the same one, even during a swap.
+    '''
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._dataset = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def loaded(self) -> bool:
+        return self._dataset is not None
+
+    def load(self):
+        pinned = getattr(self._local, 'dataset', None)
+        if pinned is not None:
+            return pinned
+        if self._dataset is None:
+            with self._lock:
+                if self._dataset is None:
+                    self._dataset = self._loader()
+        return self._dataset
+
+    def pin(self):
+        '''
+        Keep serving the current dataset to this thread until unpin()
+        '''
+        self._local.dataset = None
+        self._local.dataset = self.load()
+        return self._local.dataset
+
+    def unpin(self):
+        self._local.dataset = None
+
+    def swap(self, dataset):
+        '''
+        Serve another dataset from now on (pinned requests finish with the previous one), return the previous one
+        '''
+        with self._lock:
+            previous, self._dataset = self._dataset, dataset
+        return previous
+
+    def __getattr__(self, name: str):
+        # Only called for the attributes of the Dataset (the ones above are found normally)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+ID_COLUMNS = ['country', 'code']
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Copy of the merged frame with dictionary-encoded names, int16 years and float32 indicators
+    '''
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if col in ID_COLUMNS:
+            values = values.astype('category')
+        elif col == 'year':
+            values = values.astype(np.int16)
+        elif pd.api.types.is_float_dtype(values):
+            values = values.astype(np.float32)
+        columns[col] = values
+
+    compact = pd.DataFrame(columns, index=df.index)
+    compact.attrs = dict(df.attrs)
+    return compact
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> dict:
+    '''
+    Bytes used by every column (strings included) before and after compaction
+    '''
+    usage_before = before.memory_usage(deep=True, index=False)
+    usage_after = after.memory_usage(deep=True, index=False)
+
+    report = {
+        col: {
+            'dtype_before': str(before[col].dtype),
+            'dtype_after': str(after[col].dtype),
+            'bytes_before': int(usage_before[col]),
+            'bytes_after': int(usage_after[col])
+        }
+        for col in before.columns if col in after.columns
+    }
+    report['total'] = {
+        'dtype_before': '',
+        'dtype_after': '',
+        'bytes_before': int(usage_before.sum()),
+        'bytes_after': int(usage_after.sum())
+    }
+    return report
+
+
+def format_memory_report(report: dict) -> str:
+    lines = [f"{'column':<25} {'before':>22} {'after':>22}"]
+    for col, info in report.items():
+        before = f"{info['bytes_before'] / 1024:8.1f} KiB {info['dtype_before']:<8}"
+        after = f"{info['bytes_after'] / 1024:8.1f} KiB {info['dtype_after']:<8}"
+        lines.append(f'{col:<25} {before:>22} {after:>22}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # python -m utils.memory : footprint of the merged frame in both modes
+    from utils.data_loader import load_data
+
+    df = load_data(save_as_file=False)
+    print(format_memory_report(memory_report(df, compact_frame(df))))
@@ -0,0 +1,277 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Under gunicorn every worker writes its series there, /metrics sums the files of all the workers
+METRICS_DIR = os.path.join('cache', 'metrics')
+RETIRED_FILE = 'retired.json'
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+BYTES_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+
+class Histogram:
+    '''
+    Cumulative histogram of observations per label values, in the Prometheus sense
+    '''
+
+    def __init__(self, name: str, help: str, labels: list, buckets: list):
+        self.name = name
+        self.help = help
+        self.labels = list(labels)
+        self.buckets = list(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0})
+            series['counts'][i] += 1
+            series['sum'] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> dict:
+        '''
+        [bucket counts, sum] of every series, keyed by label values
+        '''
+        with self._lock:
+            return {key: [list(value['counts']), value['sum']] for key, value in self._series.items()}
+
+    def lines(self, series: dict = None) -> list:
+        '''
+        Exposition of the given series (snapshot format), of this process by default
+        '''
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        series = self.snapshot() if series is None else series
+
+        for key, (counts, total) in sorted(series.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f'{self.name}_sum{_labels(labels)} {total!r}')
+            lines.append(f'{self.name}_count{_labels(labels)} {cumulative}')
+        return lines
+
+
+class CallbackMetrics:
+    '''
+    Latency, compaction time, output bytes and figure cache outcome of every callback call.
+
+    With a directory, every process writes its series to <directory>/<pid>.json (at most every
+    flush_interval seconds) and collect() sums the files of all the processes, so that any gunicorn
+    worker answers /metrics with the totals of the server. The series of the exited workers are
+    folded into one file by retire(), so that the totals never go back.
+    '''
+
+    def __init__(self, directory: str = None, flush_interval: float = 1.0):
+        self.duration = Histogram(
+            'wmh_callback_duration_seconds',
+            'Wall time of a callback call, compaction of its outputs included (Dash serializes them afterwards).',
+            ['callback', 'cache'], LATENCY_BUCKETS
+        )
+        self.compaction = Histogram(
+            'wmh_callback_compaction_seconds',
+            'Time spent compacting the outputs of a callback call (rounding, typed arrays).',
+            ['callback'], LATENCY_BUCKETS
+        )
+        self.output_bytes = Histogram(
+            'wmh_callback_output_bytes',
+            'Serialized bytes of all the outputs of the sampled callback calls.',
+            ['callback'], BYTES_BUCKETS
+        )
+        self.histograms = [self.duration, self.compaction, self.output_bytes]
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._observations = 0
+        self._flusher_pid = None
+        self._start_lock = threading.Lock()
+        self._flusher_lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, compaction_seconds: float, output_bytes: int, cache: str = None):
+        '''
+        cache is the figure cache outcome ('memory', 'bundle', 'disk', 'miss'), None when the call did not use it.
+        output_bytes is None when the size of the call was not measured (see PayloadStats)
+        '''
+        self.duration.observe(seconds, callback=name, cache=cache or 'none')
+        self.compaction.observe(compaction_seconds, callback=name)
+        if output_bytes is not None:
+            self.output_bytes.observe(output_bytes, callback=name)
+        self._observations += 1
+        if self.directory is not None:
+            self._start_flusher()
+
+    def clear(self):
+        for histogram in self.histograms:
+            histogram.clear()
+
+    def _start_flusher(self):
+        # Threads do not survive a fork: each worker starts its own on its first call
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._start_lock:
+            if self._flusher_pid != pid:
+                self._flusher_pid = pid
+                threading.Thread(target=self._flush_loop, name='wmh-metrics', daemon=True).start()
+
+    def _flush_loop(self):
+        flushed = None
+        while True:
+            time.sleep(self.flush_interval)
+            if self._observations != flushed:
+                flushed = self._observations
+                self.flush()
+
+    def flush(self):
+        '''
+        Write the series of this process to the directory
+        '''
+        with self._flusher_lock:
+            _write_json(self._path(os.getpid()), {histogram.name: _encode(histogram.snapshot()) for histogram in self.histograms})
+
+    def collect(self) -> dict:
+        '''
+        Series of every histogram, summed over the processes writing to the directory (this one included)
+        '''
+        totals = {histogram.name: histogram.snapshot() for histogram in self.histograms}
+        if self.directory is None or not os.path.isdir(self.directory):
+            return totals
+
+        own = f'{os.getpid()}.json'
+        processes = {}
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') and name[:-5].isdigit() and name != own:
+                data = _read_json(os.path.join(self.directory, name))
+                if data is not None:
+                    processes[int(name[:-5])] = data
+
+        # Read last: a worker retired meanwhile is counted once, from its file or from the retired ones
+        retired = _read_json(os.path.join(self.directory, RETIRED_FILE)) or {'pids': [], 'histograms': {}}
+        for pid, data in processes.items():
+            if pid not in retired['pids']:
+                _merge(totals, data)
+        _merge(totals, retired['histograms'])
+        return totals
+
+    def retire(self, pid: int):
+        '''
+        Fold the series of an exited process into the retired file (called by the gunicorn master)
+        '''
+        if self.directory is None:
+            return
+        path = self._path(pid)
+        data = _read_json(path)
+        if data is None:
+            return
+
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        retired = _read_json(retired_path) or {'pids': [], 'histograms': {}}
+        histograms = {name: _decode(series) for name, series in retired['histograms'].items()}
+        _merge(histograms, data)
+        pids = [other for other in retired['pids'] if os.path.exists(self._path(other))] + [pid]
+        _write_json(retired_path, {'pids': pids, 'histograms': {name: _encode(series) for name, series in histograms.items()}})
+        os.remove(path)
+
+    def reset(self):
+        '''
+        Remove the series of the previous runs of the server
+        '''
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'{pid}.json')
+
+
+def format_metrics(callback_metrics: CallbackMetrics, load_report: list) -> str:
+    '''
+    Prometheus text exposition of the callback histograms (summed over the workers, see CallbackMetrics)
+    and of the stages of the last data load (loaded once by the gunicorn master, the same in every worker)
+    '''
+    series = callback_metrics.collect()
+    lines = []
+    for histogram in callback_metrics.histograms:
+        lines += histogram.lines(series[histogram.name])
+
+    lines += [
+        '# HELP wmh_load_stage_seconds Wall time of each stage of the last data load.',
+        '# TYPE wmh_load_stage_seconds gauge'
+    ]
+    for info in load_report:
+        lines.append(f"wmh_load_stage_seconds{_labels({'stage': info['stage']})} {info['seconds']!r}")
+
+    lines += [
+        '# HELP wmh_load_stage_peak_bytes Peak traced memory of each stage of the last data load, when traced.',
+        '# TYPE wmh_load_stage_peak_bytes gauge'
+    ]
+    for info in load_report:
+        if info.get('peak_bytes') is not None:
+            lines.append(f"wmh_load_stage_peak_bytes{_labels({'stage': info['stage']})} {info['peak_bytes']}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def _encode(series: dict) -> list:
+    return [[list(key), counts, total] for key, (counts, total) in series.items()]
+
+
+def _decode(series: list) -> dict:
+    return {tuple(key): [counts, total] for key, counts, total in series}
+
+
+def _merge(totals: dict, histograms: dict):
+    '''
+    Add histograms (name -> encoded or decoded series) to the decoded totals
+    '''
+    for name, series in histograms.items():
+        if isinstance(series, list):
+            series = _decode(series)
+        target = totals.setdefault(name, {})
+        for key, (counts, total) in series.items():
+            if key not in target:
+                target[key] = [list(counts), total]
+            else:
+                target[key][0] = [a + b for a, b in zip(target[key][0], counts)]
+                target[key][1] += total
+
+
+def _read_json(path: str):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data):
+    # Write then rename, so that a concurrent reader never sees a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _labels(labels: dict) -> str:
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+# Shared by every callback module
+callback_metrics = CallbackMetrics()
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+
+class Panel:
+    '''
+    Dense year x country x indicator cube built once from the merged frame.
+
+    Countries are indexed by their name (continent and income aggregates have no code),
+    years and indicators by their position. Slices returned by year_slice, country_slice
+    and indicator_slice are numpy views, they are never copied.
+    '''
+
+    def __init__(self, df: pd.DataFrame, indicators: list = None):
+        if indicators is None:
+            indicators = [col for col in df.columns if col not in ('country', 'code', 'year')]
+
+        df = df.drop_duplicates(subset=['country', 'year'])
+
+        country_codes, countries = pd.factorize(df['country'], sort=True)
+        year_codes, years = pd.factorize(df['year'], sort=True)
+
+        self.indicators = list(indicators)
+        self.countries = np.asarray(countries, dtype=object)
+        self.years = np.asarray(years, dtype=np.int64)
+
+        codes = np.full(len(self.countries), None, dtype=object)
+        code_values = df['code'].to_numpy(dtype=object)
+        has_code = df['code'].notna().to_numpy()
+        codes[country_codes[has_code]] = code_values[has_code]
+        self.codes = codes
+
+        # Keep the precision of the frame (float32 for compact frames)
+        dtype = np.result_type(*df[self.indicators].dtypes)
+        self.values = np.full((len(self.years), len(self.countries), len(self.indicators)), np.nan, dtype=dtype)
+        self.values[year_codes, country_codes, :] = df[self.indicators].to_numpy(dtype=dtype)
+
+        self.present = np.zeros((len(self.years), len(self.countries)), dtype=bool)
+        self.present[year_codes, country_codes] = True
+
+        self._year_index = {int(year): i for i, year in enumerate(self.years)}
+        self._name_index = {name: i for i, name in enumerate(self.countries)}
+        self._code_index = {code: i for i, code in enumerate(self.codes) if code is not None}
+        self._indicator_index = {ind: i for i, ind in enumerate(self.indicators)}
+
+    # ---------------- Index lookups ----------------
+    def year_index(self, year) -> int:
+        return self._year_index.get(int(year)) if year is not None else None
+
+    def country_index(self, code: str) -> int:
+        return self._code_index.get(code)
+
+    def name_index(self, name: str) -> int:
+        return self._name_index.get(name)
+
+    def indicator_index(self, indicator: str) -> int:
+        return self._indicator_index[indicator]
+
+    # ---------------- Views ----------------
+    def year_slice(self, year) -> np.ndarray:
+        '''
+        (country x indicator) values of a year, NaN rows for countries absent that year
+        '''
+        i = self.year_index(year)
+        if i is None:
+            return np.full((len(self.countries), len(self.indicators)), np.nan)
+        return self.values[i]
+
+    def country_slice(self, code: str) -> np.ndarray:
+        '''
+        (year x indicator) values of a country
+        '''
+        j = self.country_index(code)
+        if j is None:
+            return np.full((len(self.years), len(self.indicators)), np.nan)
+        return self.values[:, j, :]
+
+    def indicator_slice(self, indicator: str) -> np.ndarray:
+        '''
+        (year x country) values of an indicator
+        '''
+        return self.values[:, :, self.indicator_index(indicator)]
+
+    # ---------------- Small frames for plotting ----------------
+    def year_frame(self, year, indicators: list = None) -> pd.DataFrame:
+        '''
+        Rows of the given year (only countries present that year)
+        '''
+        indicators = indicators or self.indicators
+        i = self.year_index(year)
+        if i is None:
+            return pd.DataFrame(columns=['country', 'code', 'year'] + list(indicators))
+
+        rows = self.present[i]
+        cols = [self.indicator_index(ind) for ind in indicators]
+        frame = pd.DataFrame(self.values[i][rows][:, cols], columns=indicators)
+        frame.insert(0, 'year', int(self.years[i]))
+        frame.insert(0, 'code', self.codes[rows])
+        frame.insert(0, 'country', self.countries[rows])
+        return frame
+
+    def country_frame(self, code: str, indicators: list = None) -> pd.DataFrame:
+        '''
+        Rows of the given country, sorted by year
+        '''
+        indicators = indicators or self.indicators
+        j = self.country_index(code)
+        if j is None:
+            return pd.DataFrame(columns=['year'] + list(indicators))
+
+        rows = self.present[:, j]
+        cols = [self.indicator_index(ind) for ind in indicators]
+        frame = pd.DataFrame(self.values[:, j, :][rows][:, cols], columns=indicators)
+        frame.insert(0, 'year', self.years[rows])
+        return frame
+
+    def named_values(self, year, names: list, indicator: str) -> pd.DataFrame:
+        '''
+        Value of one indicator for a few named rows (e.g. continents) in a given year
+        '''
+        i = self.year_index(year)
+        k = self.indicator_index(indicator)
+        rows = [self.name_index(name) for name in names]
+        rows = [j for j in rows if j is not None and i is not None and self.present[i, j]]
+        return pd.DataFrame({
+            'country': self.countries[rows],
+            indicator: self.values[i, rows, k] if rows else np.array([], dtype=np.float64)
+        })
@@ -0,0 +1,320 @@
+import base64
+import functools
+import os
+import threading
+import time
+
+import numpy as np
+from plotly.basedatatypes import BaseFigure
+from plotly.io.json import to_json_plotly
+from dash import Patch
+from dash.development.base_component import Component
+
+from utils.figure_cache import figure_cache
+from utils.helpers import output_ids
+from utils.metrics import callback_metrics
+
+# Precision kept in the figure values: the decimals of the most precise hover/text format of the app
+# (%{y:.3f}), and at least DISPLAY_DIGITS significant digits for the small values
+DISPLAY_DECIMALS = 3
+DISPLAY_DIGITS = 4
+
+# Trace attributes dropped when they have the plotly.js default value
+DEFAULT_TRACE_ATTRIBUTES = {'xaxis': 'x', 'yaxis': 'y', 'legendgroup': ''}
+
+# Template layout entries only used by the traces of these types
+TEMPLATE_SUBPLOTS = {
+    'geo': {'choropleth', 'scattergeo'},
+    'polar': {'scatterpolar', 'scatterpolargl', 'barpolar'},
+    'ternary': {'scatterternary'},
+    'scene': {'scatter3d', 'surface', 'mesh3d', 'cone', 'streamtube', 'volume', 'isosurface'}
+}
+
+INTEGER_DTYPES = [('i1', np.int8), ('i2', np.int16), ('i4', np.int32)]
+
+
+def round_display(values: np.ndarray, decimals: int = DISPLAY_DECIMALS, digits: int = DISPLAY_DIGITS) -> np.ndarray:
+    '''
+    Values rounded to `decimals` decimals, or more for the values needing them to keep `digits` significant digits
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    magnitude[~np.isfinite(magnitude)] = 0
+    factor = 10.0 ** np.maximum(decimals, digits - 1 - magnitude)
+    return np.round(values * factor) / factor
+
+
+def _numeric_array(value):
+    '''
+    float64 array of a numeric list, typed array or ndarray, None for anything else
+    '''
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float64) if value.dtype.kind in 'iuf' else None
+    if isinstance(value, dict) and 'bdata' in value and 'dtype' in value:
+        array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+        if 'shape' in value:
+            shape = value['shape']
+            array = array.reshape([int(n) for n in shape.split(',')] if isinstance(shape, str) else shape)
+        return array.astype(np.float64)
+    if isinstance(value, list) and value:
+        if not all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in value):
+            return None
+        if all(v is None for v in value):
+            return None
+        return np.array([np.nan if v is None else v for v in value], dtype=np.float64)
+    return None
+
+
+def compact_array(value, typed: bool = True):
+    '''
+    Integer arrays become typed arrays of the smallest dtype, float arrays are rounded
+    to the display precision. Other values are returned as they are.
+    '''
+    if isinstance(value, list) and value and all(isinstance(row, list) for row in value):
+        # 2D values of a decoded figure (e.g. heatmap z), rounded row by row
+        return [compact_array(row, typed=False) for row in value]
+
+    array = _numeric_array(value)
+    if array is None:
+        return value
+
+    finite = np.isfinite(array)
+    if typed and array.ndim == 1 and finite.all() and np.array_equal(array, np.rint(array)):
+        for dtype, numpy_dtype in INTEGER_DTYPES:
+            info = np.iinfo(numpy_dtype)
+            if array.size == 0 or (array.min() >= info.min and array.max() <= info.max):
+                encoded = base64.b64encode(array.astype(numpy_dtype).tobytes()).decode('ascii')
+                return {'dtype': dtype, 'bdata': encoded}
+
+    rounded = round_display(array)
+    if np.array_equal(rounded[finite], np.rint(rounded[finite])):
+        # Whole numbers are sent without decimal part
+        rounded = np.where(finite, rounded, 0).astype(np.int64)
+    rounded = rounded.astype(object)
+    rounded[~finite] = None
+    return rounded.tolist()
+
+
+def compact_trace(trace: dict) -> dict:
+    compact = {}
+    for key, value in trace.items():
+        if isinstance(value, str) and DEFAULT_TRACE_ATTRIBUTES.get(key) == value:
+            continue
+        if isinstance(value, dict) and 'bdata' not in value:
+            compact[key] = compact_trace(value)
+        else:
+            compact[key] = compact_array(value)
+    return compact
+
+
+def compact_template(template: dict, trace_types: set) -> dict:
+    '''
+    Template restricted to the trace types and subplots used by the figure
+    '''
+    layout = {
+        key: value for key, value in template.get('layout', {}).items()
+        if key not in TEMPLATE_SUBPLOTS or TEMPLATE_SUBPLOTS[key] & trace_types
+    }
+    data = {key: value for key, value in template.get('data', {}).items() if key in trace_types}
+    return {'data': data, 'layout': layout}
+
+
+def is_figure(value) -> bool:
+    return isinstance(value, dict) and isinstance(value.get('data'), list) and isinstance(value.get('layout'), dict)
+
+
+def compact_figure(fig: dict) -> dict:
+    '''
+    Figure with rounded values, typed integer arrays, default trace attributes dropped
+    and a template reduced to what its traces use
+    '''
+    data = [compact_trace(trace) for trace in fig['data']]
+    layout = dict(fig['layout'])
+    if isinstance(layout.get('template'), dict):
+        trace_types = {trace.get('type', 'scatter') for trace in fig['data']}
+        layout['template'] = compact_template(layout['template'], trace_types)
+    return {**fig, 'data': data, 'layout': layout}
+
+
+def _compact_operation(operation: dict) -> dict:
+    '''
+    Patch operation with its trace values compacted, the location tells what the value is
+    '''
+    location = operation['location']
+    params = operation['params']
+    if 'value' not in params:
+        return operation
+    if 'data' not in location:
+        # e.g. graphs appended to a list of children
+        return {**operation, 'params': {**params, 'value': compact_output(params['value'])}}
+
+    depth = len(location) - location.index('data') - 1
+    value = params['value']
+    if depth == 0 and isinstance(value, list):
+        value = [compact_trace(trace) if isinstance(trace, dict) else trace for trace in value]
+    elif depth == 1 and isinstance(value, dict):
+        value = compact_trace(value)
+    elif depth >= 2:
+        value = compact_trace(value) if isinstance(value, dict) else compact_array(value)
+    return {**operation, 'params': {**params, 'value': value}}
+
+
+def compact_output(value):
+    '''
+    Callback output with every figure compacted: plotly figures, figure dicts, figures of
+    dcc.Graph components, Patch operations, and lists, tuples or dicts of them
+    '''
+    if isinstance(value, BaseFigure):
+        return compact_figure(value.to_plotly_json())
+    if isinstance(value, Patch):
+        patch = value.to_plotly_json()
+        return {**patch, 'operations': [_compact_operation(operation) for operation in patch['operations']]}
+    if is_figure(value):
+        return compact_figure(value)
+    if isinstance(value, Component):
+        for prop in ('figure', 'children'):
+            if getattr(value, prop, None) is not None:
+                setattr(value, prop, compact_output(getattr(value, prop)))
+        return value
+    if isinstance(value, tuple):
+        return tuple(compact_output(v) for v in value)
+    if isinstance(value, list):
+        return [compact_output(v) for v in value]
+    if isinstance(value, dict):
+        return {key: _compact_data(v) for key, v in value.items()}
+    return value
+
+
+def _compact_data(value):
+    '''
+    Value of a plain dict output (e.g. the data of a dcc.Store): numeric lists are rounded to the
+    display precision but stay plain lists, clientside callbacks read them as arrays
+    '''
+    if isinstance(value, list) and (_numeric_array(value) is not None or (value and all(isinstance(row, list) for row in value))):
+        return compact_array(value, typed=False)
+    if isinstance(value, list):
+        return [_compact_data(v) for v in value]
+    return compact_output(value)
+
+
+class PayloadStats:
+    '''
+    Serialized bytes of every callback output, i.e. what is sent to the browser.
+
+    Measuring a size serializes the output once more than Dash does, so only the first call of
+    each callback and then one call in `sample_every` are measured (1 measures every call).
+    '''
+
+    def __init__(self, sample_every: int = 1):
+        self.sample_every = max(1, sample_every)
+        self._lock = threading.Lock()
+        self._outputs = {}
+        self._calls = {}
+
+    def record(self, name: str, value) -> int:
+        '''
+        Record the serialized size of every output and return their total, None when the call is not sampled
+        '''
+        with self._lock:
+            calls = self._calls.get(name, 0)
+            self._calls[name] = calls + 1
+        if calls % self.sample_every:
+            return None
+
+        ids = output_ids()
+        if isinstance(ids, list):
+            outputs = list(zip(ids, value))
+        else:
+            # Outside of a request the outputs are not known, the whole value is measured
+            outputs = [(ids or 'output', value)]
+
+        sizes = [(label, len(to_json_plotly(v).encode('utf-8'))) for label, v in outputs]
+        with self._lock:
+            for label, size in sizes:
+                counts = self._outputs.setdefault(f'{name}:{label}', {'calls': 0, 'bytes': 0, 'max_bytes': 0, 'last_bytes': 0})
+                counts['calls'] += 1
+                counts['bytes'] += size
+                counts['max_bytes'] = max(counts['max_bytes'], size)
+                counts['last_bytes'] = size
+        return sum(size for _, size in sizes)
+
+    def stats(self) -> dict:
+        '''
+        measured calls, total, max and last serialized bytes per callback output
+        '''
+        with self._lock:
+            return {output: dict(counts) for output, counts in self._outputs.items()}
+
+    def clear(self):
+        with self._lock:
+            self._outputs.clear()
+            self._calls.clear()
+
+
+def format_payload_report(stats: dict) -> str:
+    lines = [f"{'callback:output':<70} {'calls':>6} {'mean':>10} {'max':>10}"]
+    for output, counts in sorted(stats.items(), key=lambda item: -item[1]['bytes']):
+        mean = counts['bytes'] / counts['calls'] / 1024 if counts['calls'] else 0.0
+        lines.append(f"{output:<70} {counts['calls']:>6} {mean:>6.1f} KiB {counts['max_bytes'] / 1024:>6.1f} KiB")
+    return '\n'.join(lines)
+
+
+def compacted(name: str):
+    '''
+    Decorator compacting the output of a callback and recording its serialized size,
+    latency and figure cache outcome
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            start = time.perf_counter()
+            figure_cache.reset_status()
+            value = func(*args)
+            compaction_start = time.perf_counter()
+            value = compact_output(value)
+            end = time.perf_counter()
+            # Measured after the timings, the sampled calls serialize their outputs once more
+            size = payload_stats.record(name, value)
+            callback_metrics.observe(name, end - start, end - compaction_start, size, figure_cache.last_status())
+            return value
+        return wrapper
+    return decorator
+
+
+# Shared by every callback module, WMH_PAYLOAD_SAMPLE=N measures one call in N of each callback
+payload_stats = PayloadStats(int(os.environ.get('WMH_PAYLOAD_SAMPLE', '10')))
+
+
+if __name__ == '__main__':
+    # python -m utils.payload : bytes of every figure output before and after compaction
+    from utils.constants import illness_labels, correlation_min_year, correlation_max_year
+    from utils.data_loader import load_data
+    from utils.dataset import Dataset
+    from utils.headless import CallbackRecorder
+    from callbacks.intro_callbacks import register_intro_callbacks
+    from callbacks.comparison_callbacks import register_comparison_callbacks
+    from callbacks.correlation_callbacks import register_correlation_callbacks
+
+    dataset = Dataset(load_data(save_as_file=False))
+    figure_cache.set_fingerprint(dataset.fingerprint)
+    figure_cache.directory = None
+
+    recorder = CallbackRecorder()
+    register_intro_callbacks(recorder, dataset, illness_labels)
+    register_comparison_callbacks(recorder, dataset, illness_labels)
+    register_correlation_callbacks(recorder, dataset, correlation_min_year, correlation_max_year)
+
+    samples = [
+        ('update_map_and_bar_plot', ('global_mental_disorders', 2019, 'value')),
+        ('update_global_evolution', ('global_mental_disorders', 2019)),
+        ('update_comparison_graphs', ('FRA', 'DEU', ['global_mental_disorders', 'anxiety_disorders'], None)),
+        ('update_radar_graphs', ('FRA', 'DEU', 2019)),
+        ('update_correlation_graphs', (correlation_max_year,))
+    ]
+    print(f"{'callback':<30} {'raw':>10} {'compact':>10}")
+    for name, args in samples:
+        value = recorder.raw(name)(*args)
+        raw = len(to_json_plotly(value).encode('utf-8'))
+        compact = len(to_json_plotly(compact_output(value)).encode('utf-8'))
+        print(f'{name:<30} {raw / 1024:>6.1f} KiB {compact / 1024:>6.1f} KiB')
@@ -0,0 +1,170 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import request
+
+PROFILE_DIR = os.path.join('cache', 'profiles')
+DASH_UPDATE_PATH = '/_dash-update-component'
+
+
+class SamplingProfiler:
+    '''
+    Samples the stack of one thread every `interval` seconds from a background thread,
+    and counts the stacks in the folded format of flamegraph.pl / speedscope (root;...;leaf count)
+    '''
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='wmh-profiler', daemon=True)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> float:
+        '''
+        Stop sampling and return the profiled wall time
+        '''
+        self._stop.set()
+        self._thread.join()
+        return time.perf_counter() - self.start_time
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_folded_stack(frame)] += 1
+
+    def folded(self, root: str = None) -> str:
+        prefix = f'{_frame_name(root)};' if root else ''
+        return ''.join(f'{prefix}{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    '''
+    Profile a random fraction of the Dash callback requests of a Flask server.
+
+    Every profile is written to `directory` as <time>_<output>.folded (root frame: the callback
+    outputs) with a .json of the same name holding the outputs, inputs and duration.
+    The oldest profiles are deleted once the directory holds more than `max_bytes`.
+    '''
+
+    def __init__(self, rate: float, directory: str = PROFILE_DIR, max_bytes: int = 50 * 2**20, interval: float = 0.005):
+        self.rate = rate
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self, server):
+        server.before_request(self._before_request)
+        server.teardown_request(self._teardown_request)
+        return self
+
+    def _before_request(self):
+        self._local.profiler = None
+        if request.path != DASH_UPDATE_PATH or random.random() >= self.rate:
+            return
+        self._local.profiler = SamplingProfiler(threading.get_ident(), self.interval).start()
+
+    def _teardown_request(self, exc=None):
+        profiler = getattr(self._local, 'profiler', None)
+        if profiler is None:
+            return
+        self._local.profiler = None
+        seconds = profiler.stop()
+
+        body = request.get_json(silent=True) or {}
+        output = body.get('output', 'unknown')
+        info = {
+            'output': output,
+            'inputs': {_input_name(item): item.get('value') for item in body.get('inputs', []) + body.get('state', []) if isinstance(item, dict)},
+            'seconds': seconds,
+            'samples': sum(profiler.stacks.values()),
+            'interval': self.interval,
+            'error': repr(exc) if exc is not None else None
+        }
+        self.write(profiler.folded(root=f'callback {output}'), info)
+
+    def write(self, folded: str, info: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}_{_slug(info['output'])}"
+        path = os.path.join(self.directory, name)
+        with open(f'{path}.folded', 'w', encoding='utf-8') as f:
+            f.write(folded)
+        with open(f'{path}.json', 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=2, default=str)
+        self._enforce_limit()
+        return f'{path}.folded'
+
+    def _enforce_limit(self):
+        with self._lock:
+            files = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+
+def install_request_profiler(server):
+    '''
+    Profile the callback requests of the server when WMH_PROFILE_RATE is set (fraction of the requests, e.g. 0.01).
+    WMH_PROFILE_DIR (cache/profiles) and WMH_PROFILE_MAX_MB (50) set where and how much is kept.
+    '''
+    rate = float(os.environ.get('WMH_PROFILE_RATE', '0'))
+    if rate <= 0:
+        return None
+    return RequestProfiler(
+        rate,
+        directory=os.environ.get('WMH_PROFILE_DIR', PROFILE_DIR),
+        max_bytes=int(float(os.environ.get('WMH_PROFILE_MAX_MB', '50')) * 2**20)
+    ).install(server)
+
+
+def _frame_name(name: str) -> str:
+    # ';' separates the frames and the last space the count in the folded format
+    return name.replace(';', ':').replace(' ', '_')
+
+
+def _folded_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(_frame_name(f'{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}'))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _input_name(item: dict) -> str:
+    component_id = item.get('id')
+    if isinstance(component_id, dict):
+        component_id = json.dumps(component_id, sort_keys=True)
+    return f"{component_id}.{item.get('property')}"
+
+
+def _slug(output: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_-]+', '-', output).strip('-')[:80] or 'callback'
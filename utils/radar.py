@@ -0,0 +1,50 @@
+import numpy as np
+
+from utils.countries import country_kind
+
+
+class RadarMatrix:
+    '''
+    Indicators of every country normalized to [0, 1] by the min and max of each year, built once.
+
+    The bounds of a year are computed on the `reference` rows present that year: 'all' (countries
+    and aggregates) or 'countries' only. values has the shape (year, country, indicator), a country
+    absent in a year has a NaN row, so that a radar is two row lookups.
+    '''
+
+    def __init__(self, panel, indicators: list, reference: str = 'all'):
+        if reference not in ('all', 'countries'):
+            raise ValueError(f'Unknown reference set: {reference}')
+
+        self.indicators = list(indicators)
+        self.reference = reference
+        self.years = panel.years
+        self.present = panel.present
+        self._year_index = {int(year): i for i, year in enumerate(self.years)}
+        self._code_index = {code: j for j, code in enumerate(panel.codes) if code is not None}
+
+        cols = [panel.indicator_index(ind) for ind in self.indicators]
+        values = panel.values[:, :, cols].astype(np.float64)
+
+        if reference == 'countries':
+            rows = np.array([country_kind(name, code) == 'country' for name, code in zip(panel.countries, panel.codes)], dtype=bool)
+        else:
+            rows = np.ones(len(panel.countries), dtype=bool)
+        reference_values = np.where(rows[None, :, None], values, np.nan)
+
+        # fmin/fmax skip NaN, a year without any value gives NaN bounds
+        low = np.fmin.reduce(reference_values, axis=1, keepdims=True)
+        high = np.fmax.reduce(reference_values, axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.values = (values - low) / (high - low)
+
+    def row(self, year, code: str) -> list:
+        '''
+        Normalized values of a country in a year (None for unknown indicators),
+        None when the country or the year is unknown or the country has no row that year
+        '''
+        i = self._year_index.get(int(year)) if year is not None else None
+        j = self._code_index.get(code) if code else None
+        if i is None or j is None or not self.present[i, j]:
+            return None
+        return [None if np.isnan(v) else float(v) for v in self.values[i, j]]
@@ -0,0 +1,166 @@
+import numpy as np
+
+from utils.countries import country_kind
+
+
+class RankIndex:
+    '''
+    Rank of every real country (no continent, income group or other aggregate) for each
+    indicator and year, built once with one vectorized argsort.
+
+    order has the shape (year, indicator, country): positions of the panel countries from the
+    highest value to the lowest, the counts[year, indicator] ranked countries first (missing values
+    are not ranked). ranks has the shape (year, country, indicator), 0 for the highest value, -1 when
+    the country is not ranked. Ranks returned by the methods start at 1.
+    '''
+
+    def __init__(self, panel, indicators: list):
+        self.indicators = list(indicators)
+        self.years = panel.years
+        self.countries = panel.countries
+        self.codes = panel.codes
+        self._year_index = {int(year): i for i, year in enumerate(self.years)}
+        self._code_index = {code: j for j, code in enumerate(self.codes) if code is not None}
+        self._indicator_index = {ind: k for k, ind in enumerate(self.indicators)}
+
+        cols = [panel.indicator_index(ind) for ind in self.indicators]
+        self.values = panel.values[:, :, cols].astype(np.float64)
+
+        real = np.array([country_kind(name, code) == 'country' for name, code in zip(self.countries, self.codes)], dtype=bool)
+        ranked = real[None, :, None] & ~np.isnan(self.values)
+
+        # Descending order with the unranked rows last, ties keep the name order
+        order = np.argsort(np.where(ranked, -self.values, np.inf), axis=1, kind='stable')
+        positions = np.broadcast_to(np.arange(len(self.countries))[None, :, None], order.shape)
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, positions, axis=1)
+
+        self.order = np.ascontiguousarray(order.transpose(0, 2, 1), dtype=np.int32)
+        self.ranks = np.where(ranked, ranks, -1).astype(np.int32)
+        self.counts = ranked.sum(axis=1).astype(np.int32)
+
+    def _lookup(self, indicator: str, year):
+        i = self._year_index.get(int(year)) if year is not None else None
+        k = self._indicator_index.get(indicator)
+        return (None, None) if i is None or k is None else (i, k)
+
+    def _entries(self, i: int, k: int, positions: np.ndarray) -> dict:
+        return {
+            'code': self.codes[positions].tolist(),
+            'country': self.countries[positions].tolist(),
+            'value': self.values[i, positions, k].tolist(),
+            'rank': (self.ranks[i, positions, k] + 1).tolist()
+        }
+
+    def top(self, indicator: str, year, n: int) -> dict:
+        '''
+        The n highest countries, from the highest: lists of code, country, value and rank
+        '''
+        i, k = self._lookup(indicator, year)
+        if i is None:
+            return self._entries(0, 0, np.array([], dtype=np.int32))
+        return self._entries(i, k, self.order[i, k, :min(n, self.counts[i, k])])
+
+    def bottom(self, indicator: str, year, n: int) -> dict:
+        '''
+        The n lowest countries, still from the highest (the end of the ranking)
+        '''
+        i, k = self._lookup(indicator, year)
+        if i is None:
+            return self._entries(0, 0, np.array([], dtype=np.int32))
+        count = self.counts[i, k]
+        return self._entries(i, k, self.order[i, k, max(count - n, 0):count])
+
+    def percentiles(self, indicator: str, year) -> dict:
+        '''
+        Percentile rank of every ranked country, 100 for the highest value and 0 for the lowest
+        '''
+        i, k = self._lookup(indicator, year)
+        if i is None:
+            return {'code': [], 'country': [], 'value': [], 'percentile': []}
+        count = self.counts[i, k]
+        positions = self.order[i, k, :count]
+        entries = self._entries(i, k, positions)
+        del entries['rank']
+        entries['percentile'] = (100.0 * (count - 1 - np.arange(count)) / max(count - 1, 1)).tolist()
+        return entries
+
+    def rank_history(self, indicator: str, code: str):
+        '''
+        (years, ranks) of a country, None for the years it is not ranked
+        '''
+        j = self._code_index.get(code)
+        k = self._indicator_index.get(indicator)
+        if j is None or k is None:
+            return self.years.tolist(), [None] * len(self.years)
+        ranks = self.ranks[:, j, k]
+        return self.years.tolist(), [int(rank) + 1 if rank >= 0 else None for rank in ranks]
+
+    def rank_change(self, indicator: str, code: str, start_year, end_year):
+        '''
+        Places gained by a country between two years (negative when it went down the ranking),
+        None when it is not ranked in one of them
+        '''
+        i0, k = self._lookup(indicator, start_year)
+        i1, _ = self._lookup(indicator, end_year)
+        j = self._code_index.get(code)
+        if i0 is None or i1 is None or j is None:
+            return None
+        start, end = self.ranks[i0, j, k], self.ranks[i1, j, k]
+        if start < 0 or end < 0:
+            return None
+        return int(start - end)
+
+    def movers(self, indicator: str, start_year, end_year, n: int) -> dict:
+        '''
+        The n countries ranked in both years whose rank changed the most, with their ranks and change
+        '''
+        i0, k = self._lookup(indicator, start_year)
+        i1, _ = self._lookup(indicator, end_year)
+        if i0 is None or i1 is None:
+            return {'code': [], 'country': [], 'start': [], 'end': [], 'change': []}
+
+        start, end = self.ranks[i0, :, k], self.ranks[i1, :, k]
+        both = np.flatnonzero((start >= 0) & (end >= 0))
+        change = start[both] - end[both]
+        n = min(n, len(both))
+        if n < len(both):
+            # Only the n largest changes are sorted
+            largest = np.argpartition(-np.abs(change), n - 1)[:n]
+        else:
+            largest = np.arange(len(both))
+        largest = largest[np.argsort(-np.abs(change[largest]), kind='stable')]
+        positions = both[largest]
+        return {
+            'code': self.codes[positions].tolist(),
+            'country': self.countries[positions].tolist(),
+            'start': (start[positions] + 1).tolist(),
+            'end': (end[positions] + 1).tolist(),
+            'change': change[largest].tolist()
+        }
+
+
+if __name__ == '__main__':
+    # python -m utils.ranking INDICATOR START END : top countries and largest rank changes
+    import argparse
+
+    from utils.data_loader import load_data
+    from utils.dataset import Dataset
+
+    parser = argparse.ArgumentParser(description='Ranking of the countries for an indicator')
+    parser.add_argument('indicator', nargs='?', default='global_mental_disorders')
+    parser.add_argument('start', nargs='?', type=int, default=1990)
+    parser.add_argument('end', nargs='?', type=int, default=2019)
+    parser.add_argument('-n', type=int, default=10, help='number of countries listed')
+    args = parser.parse_args()
+
+    index = Dataset(load_data(save_as_file=False)).ranks
+    top = index.top(args.indicator, args.end, args.n)
+    print(f'Top {args.n} in {args.end}:')
+    for rank, country, value in zip(top['rank'], top['country'], top['value']):
+        print(f'  {rank:>4} {country:<40} {value:.4f}')
+
+    movers = index.movers(args.indicator, args.start, args.end, args.n)
+    print(f'Largest rank changes {args.start} -> {args.end}:')
+    for country, start, end, change in zip(movers['country'], movers['start'], movers['end'], movers['change']):
+        print(f'  {country:<40} {start:>4} -> {end:<4} ({change:+d})')
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class RegressionCube:
+    '''
+    Closed-form OLS fit y = slope * x + intercept of several indicators against one x indicator,
+    for every year, computed in one vectorized pass.
+
+    Only rows where all `required` indicators are known are used, then each fit uses the rows
+    where both x and y are known. slope, intercept, r2 and counts have the shape (year, y indicator).
+    '''
+
+    def __init__(self, panel, x: str, ys: list, required: list = None):
+        self.x = x
+        self.ys = list(ys)
+        self.years = panel.years
+        self._year_index = {int(year): i for i, year in enumerate(self.years)}
+
+        rows = panel.present.copy()
+        for ind in required or []:
+            rows &= ~np.isnan(panel.indicator_slice(ind))
+
+        x_values = panel.indicator_slice(x).astype(np.float64)[:, :, None]
+        y_values = panel.values[:, :, [panel.indicator_index(y) for y in self.ys]].astype(np.float64)
+
+        valid = rows[:, :, None] & ~np.isnan(x_values) & ~np.isnan(y_values)
+        x_values = np.where(valid, x_values, 0.0)
+        y_values = np.where(valid, y_values, 0.0)
+
+        n = valid.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_x = x_values.sum(axis=1) / n
+            mean_y = y_values.sum(axis=1) / n
+            dx = np.where(valid, x_values - mean_x[:, None, :], 0.0)
+            dy = np.where(valid, y_values - mean_y[:, None, :], 0.0)
+
+            sxx = (dx * dx).sum(axis=1)
+            sxy = (dx * dy).sum(axis=1)
+            syy = (dy * dy).sum(axis=1)
+
+            self.slope = sxy / sxx
+            self.intercept = mean_y - self.slope * mean_x
+            self.r2 = sxy * sxy / (sxx * syy)
+
+        too_small = n < 2
+        self.slope[too_small] = np.nan
+        self.intercept[too_small] = np.nan
+        self.r2[too_small] = np.nan
+        self.counts = n
+
+    def fit(self, year, y: str) -> dict:
+        '''
+        slope, intercept, r2 and number of points of a fit, None when it is not defined
+        '''
+        i = self._year_index.get(int(year))
+        if i is None:
+            return None
+        j = self.ys.index(y)
+        if np.isnan(self.slope[i, j]):
+            return None
+        return {
+            'slope': float(self.slope[i, j]),
+            'intercept': float(self.intercept[i, j]),
+            'r2': float(self.r2[i, j]),
+            'n': int(self.counts[i, j])
+        }
+
+    def line(self, year, y: str, x_values) -> tuple:
+        '''
+        Fitted values at the given x, sorted (None if the fit is not defined)
+        '''
+        fit = self.fit(year, y)
+        if fit is None:
+            return None
+        x_values = np.sort(np.asarray(x_values, dtype=np.float64))
+        x_values = x_values[~np.isnan(x_values)]
+        return x_values, fit['slope'] * x_values + fit['intercept']
@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class SourceWatcher:
+    '''
+    Polls the size and mtime of the source files from a daemon thread and calls `on_change`
+    once they changed and then stayed the same for one more interval (a file being copied is not read).
+    on_change runs in the watcher thread, its errors are logged and the next change is still watched.
+    '''
+
+    def __init__(self, paths, on_change, interval: float = 5.0):
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def state(self) -> dict:
+        state = {}
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                state[path] = None
+            else:
+                state[path] = (stat.st_size, stat.st_mtime_ns)
+        return state
+
+    def start(self):
+        self._last = self.state()
+        self._thread = threading.Thread(target=self._run, name='wmh-source-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        pending = None
+        while not self._stop.wait(self.interval):
+            state = self.state()
+            if state == self._last:
+                pending = None
+                continue
+            if state != pending or None in state.values():
+                # Changed since the last poll (or a file is missing): wait until it is stable
+                pending = state
+                continue
+
+            self._last = state
+            pending = None
+            try:
+                self.on_change()
+            except Exception:
+                logger.exception('Reload after a change of the source files failed')
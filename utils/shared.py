@@ -0,0 +1,91 @@
+import hashlib
+import os
+import re
+import shutil
+
+import numpy as np
+
+SHARED_DIR = os.path.join('cache', 'arrays')
+
+
+class ArrayStore:
+    '''
+    Numeric arrays of one dataset in read-only memory-mapped .npy files under `directory`/<fingerprint>.
+
+    Every process mapping the same file shares the same physical pages, so the memory used by
+    these arrays does not grow with the number of workers, and nothing (refcounts, pandas
+    block copies) can turn them into private copies after fork.
+    '''
+
+    def __init__(self, fingerprint: str, directory: str = SHARED_DIR):
+        self.fingerprint = fingerprint
+        self.directory = os.path.join(directory, fingerprint)
+        self._paths = {}
+        self._views = {}
+
+    def share(self, name: str, array: np.ndarray) -> np.ndarray:
+        '''
+        Write the array (once per content) and return its shared view.
+
+        The file name holds a hash of the content: arrays built by another version of the code
+        or configuration from the same data get their own file, a stale file is never served.
+        The files of older contents of the array are removed (processes mapping them keep their pages).
+        '''
+        array = np.ascontiguousarray(array)
+        digest = hashlib.sha1(f'{array.dtype.str}{array.shape}'.encode())
+        digest.update(array.data)
+        path = os.path.join(self.directory, f'{name}.{digest.hexdigest()[:16]}.npy')
+
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(tmp_path, path)
+            self._remove_other_contents(name, path)
+
+        self._paths[name] = path
+        self._views.pop(name, None)
+        return self.view(name)
+
+    def view(self, name: str) -> np.ndarray:
+        '''
+        Read-only view of an array shared by this process, mapped once and backed by the page cache (no copy)
+        '''
+        if name not in self._views:
+            self._views[name] = np.load(self._paths[name], mmap_mode='r').view(np.ndarray)
+        return self._views[name]
+
+    def names(self) -> list:
+        return sorted(self._paths)
+
+    def nbytes(self) -> int:
+        return sum(self.view(name).nbytes for name in self.names())
+
+    def _remove_other_contents(self, name: str, path: str):
+        pattern = re.compile(re.escape(name) + r'\.[0-9a-f]{16}\.npy')
+        for other in os.listdir(self.directory):
+            if pattern.fullmatch(other) and os.path.join(self.directory, other) != path:
+                try:
+                    os.remove(os.path.join(self.directory, other))
+                except OSError:
+                    pass
+
+
+def remove_other_fingerprints(fingerprint: str, directory: str = SHARED_DIR):
+    '''
+    Remove the arrays of the datasets other than `fingerprint`, once no process maps them anymore
+    '''
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name != fingerprint:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def share_arrays(obj, store: ArrayStore, prefix: str, attributes: list):
+    '''
+    Replace numeric array attributes of an object (e.g. Panel.values) by their shared views
+    '''
+    for attribute in attributes:
+        setattr(obj, attribute, store.share(f'{prefix}.{attribute}', getattr(obj, attribute)))
+    return obj